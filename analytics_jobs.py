@@ -0,0 +1,242 @@
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import CancelledError, ThreadPoolExecutor
+
+import streamlit as st
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+MAX_WORKERS = 4  # NumPy, Arrow and SQLite release the GIL, so threads overlap well
+KEEP_FINISHED = 64  # finished jobs kept so a repeated submission returns at once
+KEEP_LATEST = 256  # last results kept per (session, slot); sessions that went away drop out, oldest first
+POLL_INTERVAL = 0.5  # seconds between status checks while a job runs
+SESSION_IDLE = 1800  # seconds a session may go without asking for its jobs before its slots are dropped
+SWEEP_INTERVAL = 60.0  # seconds between checks for ended or idle sessions
+
+
+class Job:
+    """One unit of background work, identified by the key of its inputs.
+
+    The work function receives the job and may call report() with a progress
+    fraction and a partial result, and should check cancelled() between steps
+    so a job nobody waits for any more stops early.
+    """
+
+    def __init__(self, key):
+        self.key = key
+        self.future = None
+        self.progress = 0.0
+        self.partial = None
+        self.owners = set()  # (session, slot) pairs waiting for this job
+        self._cancel = threading.Event()
+
+    def report(self, progress, partial=None):
+        self.progress = progress
+        if partial is not None:
+            self.partial = partial
+
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    def check_cancelled(self):
+        if self._cancel.is_set():
+            raise CancelledError(self.key)
+
+    def cancel(self):
+        self._cancel.set()
+        self.future.cancel()
+
+    def done(self):
+        return self.future.done()
+
+    def failed(self):
+        return self.done() and not self.future.cancelled() and self.future.exception() is not None
+
+    def result(self):
+        # The result once finished, otherwise None
+        if not self.done() or self.future.cancelled() or self.future.exception() is not None:
+            return None
+        return self.future.result()
+
+
+class JobRunner:
+    """Bounded thread pool shared by all sessions of the process.
+
+    Jobs are keyed by their inputs, so the same work submitted again (by a
+    rerun or by another session) joins the job already running or finished.
+    Each session waits on at most one job per slot; submitting a different
+    key to a slot releases the old job, which is cancelled once no session
+    waits for it. The slots of a session that ended (is_active(session)
+    returns False) or went idle_seconds without a call are dropped the same
+    way, at most every SWEEP_INTERVAL seconds.
+    """
+
+    def __init__(self, max_workers=MAX_WORKERS, keep_finished=KEEP_FINISHED, keep_latest=KEEP_LATEST,
+                 idle_seconds=SESSION_IDLE, is_active=None):
+        self.keep_finished = keep_finished
+        self.keep_latest = keep_latest
+        self.idle_seconds = idle_seconds
+        self.is_active = is_active
+        self._executor = ThreadPoolExecutor(max_workers, thread_name_prefix='analytics')
+        self._jobs = OrderedDict()  # key -> Job
+        self._slots = {}  # (session, slot) -> key
+        self._latest = OrderedDict()  # (session, slot) -> last finished result, least recently updated first
+        self._seen = {}  # session -> last call (monotonic)
+        self._last_sweep = time.monotonic()
+        # Reentrant: a job that is already done runs its callback (_finished) inside submit()
+        self._lock = threading.RLock()
+
+    def submit(self, session, slot, key, work):
+        with self._lock:
+            self._visit(session)
+            owner = (session, slot)
+            previous = self._slots.get(owner)
+            if previous is not None and previous != key:
+                self._release(owner, previous)
+            job = self._jobs.get(key)
+            if job is None or job.cancelled() or job.failed():
+                job = self._jobs[key] = Job(key)
+                job.future = self._executor.submit(self._run, job, work)
+                job.future.add_done_callback(lambda _, job=job: self._finished(job))
+            self._jobs.move_to_end(key)
+            job.owners.add(owner)
+            self._slots[owner] = key
+            if job.done():
+                self._remember(job)
+            return job
+
+    def current(self, session, slot):
+        # The job the slot waits for, if any
+        with self._lock:
+            self._visit(session)
+            key = self._slots.get((session, slot))
+            return self._jobs.get(key) if key is not None else None
+
+    def clear(self, session, slot):
+        with self._lock:
+            self._visit(session)
+            key = self._slots.pop((session, slot), None)
+            if key is not None:
+                self._release((session, slot), key)
+
+    def latest(self, session, slot):
+        # Last finished result of the slot, shown while a newer job is still running
+        return self._latest.get((session, slot))
+
+    def _visit(self, session):
+        # Under _lock: note the session as active, and now and then drop the slots of ended or idle ones
+        now = time.monotonic()
+        self._seen[session] = now
+        if now - self._last_sweep >= SWEEP_INTERVAL:
+            self.sweep(now)
+
+    def sweep(self, now=None):
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            self._last_sweep = now
+            gone = {session for session, seen in self._seen.items() if now - seen > self.idle_seconds or
+                    (self.is_active is not None and session is not None and not self.is_active(session))}
+            if not gone:
+                return
+            for owner, key in list(self._slots.items()):
+                if owner[0] in gone:
+                    del self._slots[owner]
+                    self._release(owner, key)
+            for owner in [owner for owner in self._latest if owner[0] in gone]:
+                del self._latest[owner]
+            for session in gone:
+                del self._seen[session]
+
+    def _run(self, job, work):
+        job.check_cancelled()
+        return work(job)
+
+    def _release(self, owner, key):
+        job = self._jobs.get(key)
+        if job is None:
+            return
+        job.owners.discard(owner)
+        if not job.owners and not job.done():
+            job.cancel()
+            del self._jobs[key]
+
+    def _finished(self, job):
+        with self._lock:
+            self._remember(job)
+            finished = [key for key, j in self._jobs.items() if j.done()]
+            for key in finished[:max(0, len(finished) - self.keep_finished)]:
+                del self._jobs[key]
+
+    def _remember(self, job):
+        result = job.result()
+        if result is not None:
+            for owner in job.owners:
+                if self._slots.get(owner) == job.key:
+                    self._latest[owner] = result
+                    self._latest.move_to_end(owner)
+            while len(self._latest) > self.keep_latest:
+                self._latest.popitem(last=False)
+
+
+def _session_active(session):
+    # Sessions end when their browser tab closes; outside `streamlit run` (AppTest, scripts) none are tracked
+    from streamlit import runtime
+    return not runtime.exists() or runtime.get_instance().is_active_session(session)
+
+
+@st.cache_resource
+def get_job_runner():
+    return JobRunner(is_active=_session_active)
+
+
+def _session_id():
+    ctx = get_script_run_ctx()
+    return ctx.session_id if ctx is not None else None
+
+
+def submit_job(slot, key, work):
+    # Run work(job) in the background for this session, joining an identical job if one exists
+    return get_job_runner().submit(_session_id(), slot, key, work)
+
+
+def current_job(slot):
+    return get_job_runner().current(_session_id(), slot)
+
+
+def clear_job(slot):
+    get_job_runner().clear(_session_id(), slot)
+
+
+def latest_result(slot):
+    return get_job_runner().latest(_session_id(), slot)
+
+
+def show_job(job, render, render_pending=None, slot=None, interval=POLL_INTERVAL):
+    """Render a job's result, or a placeholder that polls until it is ready.
+
+    While the job runs, render_pending(job, previous) draws progress or a
+    partial result; by default the slot's previous result is rendered if
+    there is one, else a progress bar. A small fragment re-checks the job
+    every `interval` seconds and reruns the app once it finishes.
+    """
+    if job.done():
+        if job.failed():
+            st.error(f'{type(job.future.exception()).__name__}: {job.future.exception()}')
+        else:
+            render(job.result())
+        return
+
+    previous = latest_result(slot) if slot is not None else None
+
+    @st.fragment(run_every=interval)
+    def poll():
+        if job.done():
+            st.rerun()
+        if render_pending is not None:
+            render_pending(job, previous)
+        elif previous is not None:
+            render(previous)
+        else:
+            st.progress(min(1.0, job.progress))
+
+    poll()
@@ -0,0 +1,99 @@
+"""Memory per expense of the in-memory ledger representations.
+
+Builds the same synthetic expenses (names drawn from CATEGORIES) as
+
+    dicts           a list of {'name', 'amount', 'date'} dicts, as the pages
+                    originally kept them in st.session_state
+    arrow           an Arrow table with a plain string name column, as
+                    UserLedger kept it before ExpenseColumns
+    columns         ExpenseColumns: dictionary-encoded names, NumPy columns
+
+and reports bytes per expense and MB per 100k expenses. Python and NumPy
+allocations are measured with tracemalloc, Arrow buffers with
+pyarrow.total_allocated_bytes().
+
+Usage:
+    python benchmarks/expense_memory.py
+    python benchmarks/expense_memory.py --rows 1000000
+"""
+import argparse
+import gc
+import sys
+import tracemalloc
+from datetime import datetime, timedelta
+
+import numpy as np
+import pyarrow as pa
+
+from rerun_latency import CATEGORIES, REPO_ROOT
+
+
+def synthetic_rows(rows, seed=0):
+    rng = np.random.default_rng(seed)
+    names = rng.choice(CATEGORIES, rows).tolist()
+    amounts = np.round(rng.gamma(2.0, 60.0, rows), 2).tolist()
+    start = int(np.datetime64('2024-01-01', 'ms').astype(np.int64))
+    dates = (start + np.sort(rng.integers(0, 365 * 86_400_000, rows))).tolist()
+    return names, amounts, dates
+
+
+def build_dicts(names, amounts, dates):
+    epoch = datetime(1970, 1, 1)
+    return [{'name': name, 'amount': amount, 'date': epoch + timedelta(milliseconds=date)}
+            for name, amount, date in zip(names, amounts, dates)]
+
+
+def build_arrow(names, amounts, dates):
+    from expense_ledger import SCHEMA
+
+    return pa.table({
+        'name': pa.array(names, pa.string()),
+        'amount': pa.array(amounts, pa.float64()),
+        'date': pa.array(np.asarray(dates, np.int64).astype('datetime64[ms]')),
+    }, schema=SCHEMA)
+
+
+def build_columns(names, amounts, dates):
+    from expense_columns import ExpenseColumns
+
+    columns = ExpenseColumns()
+    for name, amount, date in zip(names, amounts, dates):
+        columns.append(name, amount, date)  # one at a time, as expenses arrive
+    return columns
+
+
+def measure(build, rows):
+    # Bytes held by the built structure, excluding its inputs; a small warm-up run keeps imports out of the count
+    build(*(column[:100] for column in rows))
+    gc.collect()
+    tracemalloc.start()
+    arrow_before = pa.total_allocated_bytes()
+    result = build(*rows)
+    gc.collect()
+    python_bytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    total = python_bytes + pa.total_allocated_bytes() - arrow_before
+    del result
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=100_000)
+    args = parser.parse_args()
+    sys.path.insert(0, REPO_ROOT)
+
+    names, amounts, dates = synthetic_rows(args.rows)
+    # Names read back from SQLite or a form are separate str objects, not one shared 'Rent'
+    rows = [(name + ' ')[:-1] for name in names], amounts, dates
+    results = {}
+    for name, build in (('dicts', build_dicts), ('arrow', build_arrow), ('columns', build_columns)):
+        total = measure(build, rows)
+        results[name] = total
+        print(f'{name:<8} {total / args.rows:8.1f} B/expense  {total / args.rows * 100_000 / 2**20:8.2f} MB per 100k')
+    print(f"columns vs dicts: {results['dicts'] / results['columns']:.1f}x smaller, "
+          f"vs arrow: {results['arrow'] / results['columns']:.1f}x smaller")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,182 @@
+"""Cold-start and import-time report for the dashboard entry points.
+
+Every cold start is a fresh `python -X importtime` subprocess that renders
+the Dashboard page once with Streamlit's AppTest over a ledger seeded with
+the given number of expenses, then opens the Graphs page. Reported:
+
+    first_render    first run of the script (Dashboard page)
+    graphs_page     first switch to the Graphs page
+    heavy           cumulative import time of pandas, NumPy and pyarrow,
+                    with the page that first imported them
+    top_imports     slowest top-level imports during the first render
+
+Usage:
+    python benchmarks/import_time.py                        # all scripts, sizes 0 and 1000
+    python benchmarks/import_time.py --repeat 5 --top 20
+    python benchmarks/import_time.py --compare benchmarks/results/import-<old>.json
+
+Results are written as JSON to benchmarks/results/import-<commit>.json (or --output).
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from rerun_latency import REPO_ROOT, RESULTS_DIR, SCRIPTS, git_commit, seed_ledger
+
+SIZES = [0, 1_000]
+HEAVY = ['pandas', 'numpy', 'pyarrow', 'pyarrow.compute']  # Plotly is already imported by Streamlit itself
+MARKER = 'import-time-phase'  # written to stderr between phases so importtime lines can be attributed
+
+
+def _phase(name):
+    print(f'{MARKER} {name}', file=sys.stderr, flush=True)
+
+
+def run_worker(script):
+    # FINANCE_DB was seeded by the parent and FINANCE_LEDGER_DIR is empty, so nothing is imported here before
+    # the first render
+    sys.path.insert(0, REPO_ROOT)
+
+    from streamlit.testing.v1 import AppTest
+
+    at = AppTest.from_file(os.path.join(REPO_ROOT, script), default_timeout=600)
+    _phase('dashboard')
+    started = time.perf_counter()
+    at.run()
+    first_render = time.perf_counter() - started
+    _phase('graphs')
+    at.sidebar.button[1].click()
+    started = time.perf_counter()
+    at.run()
+    graphs_page = time.perf_counter() - started
+    _phase('end')
+    return {'first_render': first_render, 'graphs_page': graphs_page, 'errors': [e.value for e in at.exception][:5]}
+
+
+def parse_importtime(stderr):
+    # {phase: [(name, depth, self_us, cumulative_us)]} from `-X importtime` output
+    phases, phase = {}, None
+    for line in stderr.splitlines():
+        if line.startswith(MARKER):
+            phase = line.split()[1]
+            phases[phase] = []
+        elif line.startswith('import time:') and phase is not None and '|' in line:
+            self_us, cumulative_us, name = line[len('import time:'):].split('|')
+            if not self_us.strip().isdigit():
+                continue  # the header line
+            depth = (len(name) - len(name.lstrip()) - 1) // 2
+            phases[phase].append((name.strip(), depth, int(self_us), int(cumulative_us)))
+    return phases
+
+
+def summarize(phases, top):
+    heavy = {}
+    for phase in ('dashboard', 'graphs'):
+        for name, _, _, cumulative_us in phases.get(phase, []):
+            if name in HEAVY and name not in heavy:
+                heavy[name] = {'page': phase, 'ms': cumulative_us / 1000}
+    roots = sorted((entry for entry in phases.get('dashboard', []) if entry[1] == 0), key=lambda e: -e[3])
+    return {
+        'heavy': heavy,
+        'dashboard_import_ms': sum(e[3] for e in phases.get('dashboard', []) if e[1] == 0) / 1000,
+        'top_imports': [{'module': name, 'ms': cumulative_us / 1000} for name, _, _, cumulative_us in roots[:top]],
+    }
+
+
+def measure(script, size, repeat, top):
+    ledger_dir = tempfile.mkdtemp(prefix='bench-ledger-')
+    db_path = os.path.join(ledger_dir, 'finance.db')
+    seed_ledger(db_path, size)
+    runs = []
+    for _ in range(repeat):
+        completed = subprocess.run(
+            [sys.executable, '-X', 'importtime', os.path.abspath(__file__), '--worker', script],
+            capture_output=True, text=True, cwd=REPO_ROOT, env={**os.environ, 'FINANCE_DB': db_path, 'FINANCE_LEDGER_DIR': ledger_dir})
+        if completed.returncode != 0:
+            print(completed.stderr[-4000:], file=sys.stderr)
+            raise SystemExit(f'{script} with {size} expenses failed')
+        runs.append((json.loads(completed.stdout.strip().splitlines()[-1]), parse_importtime(completed.stderr)))
+
+    # Import breakdown of the median run; render times over all runs
+    runs.sort(key=lambda run: run[0]['first_render'])
+    timings, phases = runs[len(runs) // 2]
+    return {
+        'script': script,
+        'size': size,
+        'errors': timings['errors'],
+        'timings_ms': {
+            name: {'median': statistics.median(run[0][name] for run in runs) * 1000,
+                   'min': min(run[0][name] for run in runs) * 1000, 'runs': len(runs)}
+            for name in ('first_render', 'graphs_page')
+        },
+        **summarize(phases, top),
+    }
+
+
+def compare(current, baseline_path):
+    with open(baseline_path, encoding='utf-8') as f:
+        baseline = json.load(f)
+    previous = {(r['script'], r['size']): r for r in baseline['results']}
+    print(f"\nChange vs {baseline.get('commit', baseline_path)} (median):")
+    for result in current['results']:
+        old = previous.get((result['script'], result['size']))
+        if old is None:
+            continue
+        for name, stats in result['timings_ms'].items():
+            if old['timings_ms'].get(name, {}).get('median'):
+                change = (stats['median'] / old['timings_ms'][name]['median'] - 1) * 100
+                print(f"  {result['script']:<24} {result['size']:>7}  {name:<14} {change:+7.1f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--scripts', nargs='+', default=SCRIPTS)
+    parser.add_argument('--sizes', nargs='+', type=int, default=SIZES)
+    parser.add_argument('--repeat', type=int, default=3, help='cold starts per scenario')
+    parser.add_argument('--top', type=int, default=10, help='slowest imports listed per scenario')
+    parser.add_argument('--output', help='JSON file to write (default: benchmarks/results/import-<commit>.json)')
+    parser.add_argument('--compare', help='earlier results file to compare against')
+    parser.add_argument('--worker', metavar='SCRIPT', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(run_worker(args.worker)))
+        return
+
+    import streamlit
+
+    report = {
+        'commit': git_commit(),
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'streamlit': streamlit.__version__,
+        'platform': platform.platform(),
+        'repeat': args.repeat,
+        'results': [],
+    }
+    sys.path.insert(0, REPO_ROOT)
+    for script in args.scripts:
+        for size in args.sizes:
+            result = measure(script, size, args.repeat, args.top)
+            report['results'].append(result)
+            timings = '  '.join(f"{name}={stats['median']:.0f}ms" for name, stats in result['timings_ms'].items())
+            heavy = ' '.join(f"{name}@{info['page']}" for name, info in result['heavy'].items())
+            print(f'{script:<24} {size:>7}  {timings}  imports={result["dashboard_import_ms"]:.0f}ms  {heavy}')
+
+    output = args.output or os.path.join(RESULTS_DIR, f"import-{report['commit']}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(f'Results written to {output}')
+    if args.compare:
+        compare(report, args.compare)
+
+
+if __name__ == '__main__':
+    main()
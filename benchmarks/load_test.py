@@ -0,0 +1,405 @@
+"""Multi-session load test against a real Streamlit server on localhost.
+
+Starts `streamlit run <script>` on 127.0.0.1 with a temporary FINANCE_DB
+(and an empty FINANCE_LEDGER_DIR, so no old Arrow ledger is imported) and
+opens N concurrent sessions over the websocket protocol the browser uses
+(/_stcore/stream, BackMsg and ForwardMsg protobufs). Each session is
+its own user (?user=load-<i>, seeded with --expenses rows of history) and,
+after a random think time, replays one of:
+
+    add_expense     submit the expense form with a random category and amount
+    graphs          switch to the Graphs page
+    dashboard       switch back to the Dashboard
+    language        pick another language in the sidebar (scripts that have one)
+
+Fragment widgets rerun only their fragment, and run_every fragments are
+polled while a session waits, the way the browser does. Reported per
+session count:
+
+    throughput      interaction reruns completed per second
+    latency         p50 / p95 / p99 from sending the rerun to the end of the
+                    last script run it caused, per interaction
+    rss             server RSS at start, with every session connected, at the
+                    end and at its peak; (connected - start) / sessions is the
+                    memory one session costs with its ledger loaded
+
+Usage:
+    python benchmarks/load_test.py                                  # 10 sessions, 60 s
+    python benchmarks/load_test.py --sessions 10 50 100 --duration 120
+    python benchmarks/load_test.py --expenses 0 1000 10000 100000    # per-session RSS vs ledger size
+    python benchmarks/load_test.py --script new.py
+    python benchmarks/load_test.py --compare benchmarks/results/load-<old>.json
+
+Results are written as JSON to benchmarks/results/load-<commit>.json (or
+--output). Nothing leaves localhost. The sessions run in this process and
+share the machine with the server, so give it spare cores for clean numbers.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+
+from rerun_latency import CATEGORIES, REPO_ROOT, RESULTS_DIR, git_commit, seed_ledger
+
+SESSIONS = [10]
+ACTIONS = {'dashboard': {'add_expense': 6, 'graphs': 3, 'language': 1}, 'graphs': {'dashboard': 7, 'language': 3}}
+DONE = {0, 1, 3}  # ScriptFinishedStatus ending a rerun; 2 (finished early for a rerun) means another run follows
+WIDGETS = {'button', 'text_input', 'number_input', 'selectbox'}
+RERUN_TIMEOUT = 120
+LANGUAGE_OPTION = 'Twi'  # identifies the language selectbox in the sidebar
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def rss_mb(pid):
+    try:
+        with open(f'/proc/{pid}/status', encoding='ascii') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) / 1024
+    except FileNotFoundError:
+        pass
+    try:
+        import psutil
+    except ImportError:
+        return None
+    return psutil.Process(pid).memory_info().rss / 2**20
+
+
+def percentile(values, q):
+    return sorted(values)[max(0, int(round(q * len(values))) - 1)] if values else None
+
+
+class Session:
+    """One simulated browser tab: a websocket, the widgets on screen and the values the tab would send back."""
+
+    def __init__(self, url, user, rng):
+        self.url = url
+        self.query_string = f'user={user}'
+        self.rng = rng
+        self.page = 'dashboard'
+        self.page_script_hash = ''
+        self.widgets = {}  # delta path -> (element type, element proto, fragment id, in sidebar)
+        self.values = {}  # widget id -> WidgetState the user set
+        self.auto_reruns = {}  # fragment id -> seconds between polls
+        self.errors = []
+        self._finished = None
+        self._ws = None
+        self._reader = None
+
+    async def connect(self):
+        from tornado.websocket import websocket_connect
+
+        self._ws = await websocket_connect(self.url, subprotocols=['streamlit'], max_message_size=2**30)
+        self._reader = asyncio.ensure_future(self._read())
+
+    async def close(self):
+        self._ws.close()
+        await asyncio.gather(self._reader, return_exceptions=True)
+
+    async def _read(self):
+        from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+
+        while True:
+            payload = await self._ws.read_message()
+            if payload is None:
+                if self._finished is not None and not self._finished.done():
+                    self._finished.set_exception(ConnectionError('websocket closed'))
+                return
+            msg = ForwardMsg()
+            msg.ParseFromString(payload)
+            kind = msg.WhichOneof('type')
+            if kind == 'new_session':
+                self.page_script_hash = msg.new_session.page_script_hash
+                if not msg.new_session.fragment_ids_this_run:
+                    self.widgets.clear()
+                    self.auto_reruns.clear()
+            elif kind == 'delta' and msg.delta.WhichOneof('type') == 'new_element':
+                element = msg.delta.new_element
+                element_type = element.WhichOneof('type')
+                path = tuple(msg.metadata.delta_path)
+                if element_type in WIDGETS:
+                    self.widgets[path] = (element_type, getattr(element, element_type), msg.delta.fragment_id,
+                                          path[:1] == (1,))
+                else:
+                    self.widgets.pop(path, None)
+                if element_type == 'exception':
+                    self.errors.append(element.exception.message)
+            elif kind == 'auto_rerun':
+                self.auto_reruns[msg.auto_rerun.fragment_id] = msg.auto_rerun.interval
+            elif kind == 'script_finished' and msg.script_finished in DONE:
+                if self._finished is not None and not self._finished.done():
+                    self._finished.set_result(time.perf_counter())
+
+    async def rerun(self, fragment_id='', triggers=(), auto=False):
+        # Seconds until the server finished every script run this rerun caused
+        from streamlit.proto.BackMsg_pb2 import BackMsg
+
+        back = BackMsg()
+        state = back.rerun_script
+        state.query_string = self.query_string
+        state.page_script_hash = self.page_script_hash
+        state.fragment_id = fragment_id
+        state.is_auto_rerun = auto
+        on_screen = {proto.id for _, proto, _, _ in self.widgets.values()}
+        state.widget_states.widgets.extend(value for key, value in self.values.items() if key in on_screen)
+        state.widget_states.widgets.extend(triggers)
+        self._finished = asyncio.get_running_loop().create_future()
+        started = time.perf_counter()
+        await self._ws.write_message(back.SerializeToString(), binary=True)
+        return await asyncio.wait_for(self._finished, RERUN_TIMEOUT) - started
+
+    def _find(self, element_type, sidebar=None, match=lambda proto: True):
+        return [(proto, fragment_id) for _, (kind, proto, fragment_id, in_sidebar) in sorted(self.widgets.items())
+                if kind == element_type and (sidebar is None or in_sidebar == sidebar) and match(proto)]
+
+    def _set(self, widget_id, **value):
+        from streamlit.proto.WidgetStates_pb2 import WidgetState
+
+        self.values[widget_id] = WidgetState(id=widget_id, **value)
+
+    def _trigger(self, widget_id):
+        from streamlit.proto.WidgetStates_pb2 import WidgetState
+
+        return WidgetState(id=widget_id, trigger_value=True)
+
+    def available(self):
+        actions = dict(ACTIONS[self.page])
+        if not self._find('selectbox', True, lambda proto: LANGUAGE_OPTION in proto.options):
+            actions.pop('language', None)
+        if not self._find('button', False, lambda proto: proto.is_form_submitter):
+            actions.pop('add_expense', None)
+        return actions
+
+    async def add_expense(self):
+        submit, fragment_id = self._find('button', False, lambda proto: proto.is_form_submitter)[0]
+        for proto, _ in self._find('text_input', match=lambda proto: proto.form_id == submit.form_id):
+            self._set(proto.id, string_value=self.rng.choice(CATEGORIES))
+        for proto, _ in self._find('number_input', match=lambda proto: proto.form_id == submit.form_id):
+            amount = round(self.rng.uniform(5, 500), 2)
+            # data_type 0 is an int input, 1 a float input
+            self._set(proto.id, **({'int_value': int(amount)} if proto.data_type == 0 else {'double_value': amount}))
+        return await self.rerun(fragment_id, [self._trigger(submit.id)])
+
+    async def _navigate(self, index, page):
+        # The first two sidebar buttons are Dashboard and Graphs in every script
+        button, fragment_id = self._find('button', True)[index]
+        elapsed = await self.rerun(fragment_id, [self._trigger(button.id)])
+        self.page = page
+        return elapsed
+
+    async def graphs(self):
+        return await self._navigate(1, 'graphs')
+
+    async def dashboard(self):
+        return await self._navigate(0, 'dashboard')
+
+    async def language(self):
+        selectbox, fragment_id = self._find('selectbox', True, lambda proto: LANGUAGE_OPTION in proto.options)[0]
+        current = self.values[selectbox.id].int_value if selectbox.id in self.values else selectbox.default
+        self._set(selectbox.id, int_value=self.rng.choice([i for i in range(len(selectbox.options)) if i != current]))
+        return await self.rerun(fragment_id)
+
+    async def think(self, seconds, timings):
+        # Idle like a reader, polling run_every fragments (e.g. a chart still being computed) at their interval
+        deadline = time.monotonic() + seconds
+        while (remaining := deadline - time.monotonic()) > 0:
+            if not self.auto_reruns:
+                await asyncio.sleep(remaining)
+                return
+            fragment_id, interval = next(iter(self.auto_reruns.items()))
+            await asyncio.sleep(min(interval, remaining))
+            if remaining >= interval:
+                timings.setdefault('poll', []).append(await self.rerun(fragment_id, auto=True))
+
+
+async def run_session(session, stop_at, think, timings):
+    while time.monotonic() < stop_at:
+        await session.think(session.rng.expovariate(1 / think), timings)
+        if time.monotonic() >= stop_at:
+            return
+        actions = session.available()
+        action = session.rng.choices(list(actions), list(actions.values()))[0]
+        try:
+            timings.setdefault(action, []).append(await getattr(session, action)())
+        except (asyncio.TimeoutError, ConnectionError, IndexError) as error:
+            session.errors.append(f'{action}: {type(error).__name__} {error}')
+            if isinstance(error, ConnectionError):
+                return
+
+
+async def drive(url, pid, sessions, duration, think, ramp, seed):
+    rss = {'start': rss_mb(pid)}
+    peak = [rss['start'] or 0]
+
+    async def sample():
+        while True:
+            peak[0] = max(peak[0], rss_mb(pid) or 0)
+            await asyncio.sleep(0.25)
+
+    sampler = asyncio.ensure_future(sample())
+    clients = [Session(url, f'load-{i}', random.Random(seed + i)) for i in range(sessions)]
+    timings = {}
+
+    async def open_session(i, session):
+        await asyncio.sleep(ramp * i / sessions)
+        await session.connect()
+        timings.setdefault('connect', []).append(await session.rerun())
+
+    await asyncio.gather(*(open_session(i, session) for i, session in enumerate(clients)))
+    rss['connected'] = rss_mb(pid)
+    started = time.monotonic()
+    await asyncio.gather(*(run_session(session, started + duration, think, timings) for session in clients))
+    elapsed = time.monotonic() - started
+    rss['end'] = rss_mb(pid)
+    await asyncio.gather(*(session.close() for session in clients))
+    sampler.cancel()
+    rss['peak'] = peak[0]
+
+    interactions = sum(len(values) for name, values in timings.items() if name not in ('connect', 'poll'))
+    added = len(timings.get('add_expense', []))
+    return {
+        'sessions': sessions,
+        'duration_s': elapsed,
+        'reruns': interactions,
+        'throughput_rps': interactions / elapsed,
+        'expenses_added': added,
+        'errors': [error for session in clients for error in session.errors][:10],
+        'error_count': sum(len(session.errors) for session in clients),
+        'latency_ms': {
+            name: {'p50': percentile(values, 0.50) * 1000, 'p95': percentile(values, 0.95) * 1000,
+                   'p99': percentile(values, 0.99) * 1000, 'runs': len(values)}
+            for name, values in sorted(timings.items())
+        },
+        'rss_mb': rss,
+        'rss_per_session_mb': (rss['connected'] - rss['start']) / sessions if rss['start'] is not None else None,
+    }
+
+
+def wait_until_healthy(port, server, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f'streamlit exited with code {server.returncode}')
+        try:
+            with urllib.request.urlopen(f'http://127.0.0.1:{port}/_stcore/health', timeout=1) as response:
+                if response.status == 200:
+                    return
+        except (urllib.error.URLError, ConnectionError):
+            pass
+        time.sleep(0.2)
+    raise TimeoutError(f'streamlit did not answer on port {port} within {timeout}s')
+
+
+def measure(script, sessions, expenses, args):
+    db_dir = tempfile.mkdtemp(prefix='load-ledger-')
+    db_path = os.path.join(db_dir, 'finance.db')
+    for i in range(sessions):
+        seed_ledger(db_path, expenses, seed=i, user=f'load-{i}')
+    port = free_port()
+    log_path = os.path.join(db_dir, 'server.log')
+    with open(log_path, 'w', encoding='utf-8') as log:
+        server = subprocess.Popen(
+            [sys.executable, '-m', 'streamlit', 'run', script, '--server.headless', 'true',
+             '--server.address', '127.0.0.1', '--server.port', str(port), '--server.fileWatcherType', 'none',
+             '--browser.gatherUsageStats', 'false'],
+            cwd=REPO_ROOT, env={**os.environ, 'FINANCE_DB': db_path, 'FINANCE_LEDGER_DIR': db_dir},
+            stdout=log, stderr=subprocess.STDOUT)
+    try:
+        wait_until_healthy(port, server)
+        result = asyncio.run(drive(f'ws://127.0.0.1:{port}/_stcore/stream', server.pid, sessions, args.duration,
+                                   args.think, args.ramp, args.seed))
+    except BaseException:
+        with open(log_path, encoding='utf-8') as log:
+            print(log.read()[-4000:], file=sys.stderr)
+        raise
+    finally:
+        server.terminate()
+        server.wait(30)
+    shutil.rmtree(db_dir, ignore_errors=True)
+    return {'script': script, 'expenses': expenses, **result}
+
+
+def compare(current, baseline_path):
+    with open(baseline_path, encoding='utf-8') as f:
+        baseline = json.load(f)
+    previous = {(r['script'], r['sessions'], r['expenses']): r for r in baseline['results']}
+    print(f"\nChange vs {baseline.get('commit', baseline_path)}:")
+    for result in current['results']:
+        old = previous.get((result['script'], result['sessions'], result['expenses']))
+        if old is None:
+            continue
+        changes = [('throughput', result['throughput_rps'], old['throughput_rps'])]
+        changes += [(f'{name} p95', stats['p95'], old['latency_ms'][name]['p95'])
+                    for name, stats in result['latency_ms'].items() if name in old['latency_ms']]
+        changes.append(('rss end', result['rss_mb']['end'], old['rss_mb']['end']))
+        for name, new, before in changes:
+            if new is not None and before:
+                print(f"  {result['script']:<24} {result['sessions']:>5}  {name:<18} {(new / before - 1) * 100:+7.1f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--script', default='financial-dashboard.py')
+    parser.add_argument('--sessions', nargs='+', type=int, default=SESSIONS, help='concurrent sessions; one server each')
+    parser.add_argument('--duration', type=float, default=60, help='seconds of load once every session is connected')
+    parser.add_argument('--think', type=float, default=2.0, help='mean seconds between interactions per session')
+    parser.add_argument('--ramp', type=float, default=5.0, help='seconds over which sessions connect')
+    parser.add_argument('--expenses', nargs='+', type=int, default=[1_000], help='expenses seeded per session user')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='JSON file to write (default: benchmarks/results/load-<commit>.json)')
+    parser.add_argument('--compare', help='earlier results file to compare against')
+    args = parser.parse_args()
+
+    import streamlit
+
+    sys.path.insert(0, REPO_ROOT)
+    report = {
+        'commit': git_commit(),
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'streamlit': streamlit.__version__,
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'think_s': args.think,
+        'results': [],
+    }
+    for expenses in args.expenses:
+        for sessions in args.sessions:
+            result = measure(args.script, sessions, expenses, args)
+            report['results'].append(result)
+            latency = '  '.join(f"{name}={stats['p50']:.0f}/{stats['p95']:.0f}/{stats['p99']:.0f}ms"
+                                for name, stats in result['latency_ms'].items())
+            rss = result['rss_mb']
+            print(f"{args.script:<24} {sessions:>5} sessions x {expenses:>7} expenses  "
+                  f"{result['throughput_rps']:6.1f} reruns/s  errors={result['error_count']}  "
+                  f"rss {rss['start']:.0f} -> {rss['connected']:.0f} -> {rss['end']:.0f} MB (peak {rss['peak']:.0f}, "
+                  f"{result['rss_per_session_mb']:.1f} MB/session)\n    p50/p95/p99  {latency}")
+            for error in result['errors'][:3]:
+                print(f'    error: {error[:200]}')
+
+    output = args.output or os.path.join(RESULTS_DIR, f"load-{report['commit']}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(f'Results written to {output}')
+    if args.compare:
+        compare(report, args.compare)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,178 @@
+"""Headless rerun-latency benchmark for the dashboard entry points.
+
+Every (script, ledger size) pair runs in its own subprocess so cold starts
+and process-wide caches are measured from scratch. Each worker seeds a
+temporary ledger, drives the script with Streamlit's AppTest and times:
+
+    cold_start      first run of the script
+    page_switch     Dashboard -> Graphs -> Dashboard
+    add_expense     submitting the expense form
+    income_slider   moving the monthly income slider
+
+Usage:
+    python benchmarks/rerun_latency.py                      # all scripts, all sizes
+    python benchmarks/rerun_latency.py --sizes 0 1000 --repeat 5
+    python benchmarks/rerun_latency.py --compare benchmarks/results/<old>.json
+
+Results are written as JSON to benchmarks/results/<commit>.json (or --output).
+Everything runs offline; no server or browser is started.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCRIPTS = ['financial-dashboard.py', 'new.py', 'new2.py']
+SIZES = [0, 1_000, 10_000, 100_000]
+RESULTS_DIR = os.path.join(REPO_ROOT, 'benchmarks', 'results')
+CATEGORIES = ['Rent', 'Food', 'Transport', 'Airtime', 'Utilities', 'School Fees', 'Health', 'Church', 'Savings']
+
+
+def seed_ledger(db_path, size, seed=0, user='default'):
+    # Deterministic synthetic history for one user, written in one transaction
+    import numpy as np
+    import pyarrow as pa
+
+    from expense_ledger import SCHEMA
+    from ledger_store import LedgerStore
+
+    ledger = LedgerStore(db_path).ledger(user)
+    if size == 0:
+        return
+    rng = np.random.default_rng(seed)
+    end = np.datetime64('now', 'ms')
+    offsets = np.sort(rng.integers(0, 3 * 365 * 86_400_000, size))[::-1]
+    ledger.append_batch(pa.table({
+        'name': pa.array(rng.choice(CATEGORIES, size)),
+        'amount': np.round(rng.gamma(2.0, 60.0, size), 2),
+        'date': pa.array(end - offsets.astype('timedelta64[ms]')),
+    }, schema=SCHEMA))
+
+
+def _timed(action):
+    started = time.perf_counter()
+    action()
+    return time.perf_counter() - started
+
+
+def run_worker(script, size, repeat):
+    ledger_dir = tempfile.mkdtemp(prefix='bench-ledger-')
+    os.environ['FINANCE_LEDGER_DIR'] = ledger_dir  # no old Arrow ledgers to import into the benchmark's database
+    os.environ['FINANCE_DB'] = os.path.join(ledger_dir, 'finance.db')
+    sys.path.insert(0, REPO_ROOT)
+    seed_ledger(os.environ['FINANCE_DB'], size)
+
+    from streamlit.testing.v1 import AppTest
+
+    at = AppTest.from_file(os.path.join(REPO_ROOT, script), default_timeout=600)
+    timings = {'cold_start': [_timed(at.run)]}
+    errors = [e.value for e in at.exception]
+
+    for i in range(repeat):
+        at.sidebar.button[1].click()
+        switch = _timed(at.run)
+        at.sidebar.button[0].click()
+        timings.setdefault('page_switch', []).append(switch + _timed(at.run))
+
+        at.main.button[0].click()
+        timings.setdefault('add_expense', []).append(_timed(at.run))
+
+        at.slider[0].set_value(1000 + 250 * (i % 20))
+        timings.setdefault('income_slider', []).append(_timed(at.run))
+        errors += [e.value for e in at.exception]
+
+    return {
+        'script': script,
+        'size': size,
+        'errors': errors[:5],
+        'timings_ms': {
+            name: {
+                'median': statistics.median(values) * 1000,
+                'p95': sorted(values)[max(0, int(round(0.95 * len(values))) - 1)] * 1000,
+                'min': min(values) * 1000,
+                'runs': len(values),
+            }
+            for name, values in timings.items()
+        },
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def compare(current, baseline_path):
+    with open(baseline_path, encoding='utf-8') as f:
+        baseline = json.load(f)
+    previous = {(r['script'], r['size']): r['timings_ms'] for r in baseline['results']}
+    print(f"\nChange vs {baseline.get('commit', baseline_path)} (median):")
+    for result in current['results']:
+        old = previous.get((result['script'], result['size']))
+        if old is None:
+            continue
+        for name, stats in result['timings_ms'].items():
+            if name in old and old[name]['median']:
+                change = (stats['median'] / old[name]['median'] - 1) * 100
+                print(f"  {result['script']:<24} {result['size']:>7}  {name:<14} {change:+7.1f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--scripts', nargs='+', default=SCRIPTS)
+    parser.add_argument('--sizes', nargs='+', type=int, default=SIZES)
+    parser.add_argument('--repeat', type=int, default=10, help='interactions timed per scenario')
+    parser.add_argument('--output', help='JSON file to write (default: benchmarks/results/<commit>.json)')
+    parser.add_argument('--compare', help='earlier results file to compare against')
+    parser.add_argument('--worker', nargs=2, metavar=('SCRIPT', 'SIZE'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        script, size = args.worker
+        print(json.dumps(run_worker(script, int(size), args.repeat)))
+        return
+
+    import streamlit
+
+    report = {
+        'commit': git_commit(),
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'streamlit': streamlit.__version__,
+        'platform': platform.platform(),
+        'repeat': args.repeat,
+        'results': [],
+    }
+    for script in args.scripts:
+        for size in args.sizes:
+            completed = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), '--worker', script, str(size), '--repeat', str(args.repeat)],
+                capture_output=True, text=True, cwd=REPO_ROOT)
+            if completed.returncode != 0:
+                print(completed.stderr, file=sys.stderr)
+                raise SystemExit(f'{script} with {size} expenses failed')
+            result = json.loads(completed.stdout.strip().splitlines()[-1])
+            report['results'].append(result)
+            summary = '  '.join(f"{name}={stats['median']:.1f}ms" for name, stats in result['timings_ms'].items())
+            print(f'{script:<24} {size:>7}  {summary}')
+
+    output = args.output or os.path.join(RESULTS_DIR, f"{report['commit']}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(f'Results written to {output}')
+    if args.compare:
+        compare(report, args.compare)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,146 @@
+from datetime import date, datetime
+
+import numpy as np
+import pandas as pd
+
+# Resolutions offered on the Graphs page
+RESOLUTIONS = {'Daily': 'D', 'Weekly': 'W', 'Monthly': 'M'}
+
+_EPOCH_WEEKDAY = 3  # 1970-01-01 was a Thursday; weeks start on Monday
+
+
+def _to_datetime64(values):
+    # Accept Arrow arrays, pandas objects or NumPy arrays of timestamps
+    if hasattr(values, 'to_numpy') and not isinstance(values, np.ndarray):
+        values = values.to_numpy()
+    return np.asarray(values, dtype='datetime64[ms]')
+
+
+def _period_codes(days, freq):
+    # Integer period number for day numbers since 1970: the day itself, its Monday-based week or its month
+    if freq == 'D':
+        return days
+    if freq == 'W':
+        return (days + _EPOCH_WEEKDAY) // 7
+    if freq == 'M':
+        return days.astype('datetime64[D]').astype('datetime64[M]').astype(np.int64)
+    raise ValueError(f'Unknown resolution {freq!r}; expected one of {sorted(RESOLUTIONS.values())}')
+
+
+def _period_starts(codes, freq):
+    if freq == 'D':
+        return codes.astype('datetime64[D]')
+    if freq == 'W':
+        return (codes * 7 - _EPOCH_WEEKDAY).astype('datetime64[D]')
+    return codes.astype('datetime64[M]').astype('datetime64[D]')
+
+
+def monthly_income_flows(start, end, amount, day=1):
+    """Dates and amounts of a fixed monthly income paid on `day` between start and end."""
+    months = np.arange(np.datetime64(start, 'M'), np.datetime64(end, 'M') + 1)
+    dates = months.astype('datetime64[D]') + (day - 1)
+    dates = dates[(dates >= np.datetime64(start, 'D')) & (dates <= np.datetime64(end, 'D'))]
+    return dates.astype('datetime64[ms]'), np.full(len(dates), float(amount))
+
+
+def balance_series(current_balance, expense_dates, expense_amounts, income_dates=None, income_amounts=None,
+                   freq='M', end=None):
+    """Closing balance of every period from the first record up to `end` (default: today).
+
+    The series is anchored on `current_balance` at the end and walked back
+    through the dated flows, so balance[i] = current_balance minus the net
+    flow of all later periods. Flows are bucketed with np.bincount and summed
+    with np.cumsum; there is no per-row Python work.
+    """
+    end = np.datetime64(end if end is not None else date.today(), 'ms')
+    dates = [_to_datetime64(expense_dates)]
+    flows = [-np.asarray(expense_amounts, dtype=np.float64)]
+    if income_dates is not None:
+        dates.append(_to_datetime64(income_dates))
+        flows.append(np.asarray(income_amounts, dtype=np.float64))
+    dates = np.concatenate(dates)
+    flows = np.concatenate(flows)
+
+    # Flows dated after `end` are not part of the history
+    in_range = dates <= end
+    dates, flows = dates[in_range], flows[in_range]
+
+    # Sum flows per day first (integer division, no calendar work per row); only the
+    # short array of days in the range is then mapped to weeks or months
+    day_ms = 86_400_000
+    days = dates.astype(np.int64) // day_ms
+    last_day = end.astype(np.int64) // day_ms
+    first_day = days.min() if len(days) else last_day
+    daily_net = np.bincount(days - first_day, weights=flows, minlength=last_day - first_day + 1)
+
+    periods = _period_codes(np.arange(first_day, last_day + 1), freq)
+    first, last = periods[0], periods[-1]
+    net = np.bincount(periods - first, weights=daily_net, minlength=last - first + 1)
+
+    # Closing balance of period i = current balance minus everything that happened after period i
+    running = np.cumsum(net)
+    balances = float(current_balance) - (running[-1] - running)
+    index = pd.DatetimeIndex(_period_starts(np.arange(first, last + 1), freq), name='period')
+    return pd.Series(balances, index=index, name='balance')
+
+
+def ledger_balance_series(ledger, current_balance, monthly_income=0, freq='M', end=None, period=None):
+    """Balance history for a ledger, with monthly_income treated as paid on the 1st of every month.
+
+    period=(start, end), ms with end exclusive (see expense_periods.Period),
+    limits the history to one date range. Only the rows in the range are
+    read; the current balance is first carried back to the end of the range
+    over the expenses and income dated after it.
+    """
+    start = stop = None
+    if period is not None:
+        start, stop = period[0], period[1]
+        today = np.datetime64(end if end is not None else date.today(), 'ms')
+        if stop is not None and np.datetime64(stop, 'ms') <= today:
+            later = ledger.period_aggregates(stop, int(today.astype(np.int64)) + 1).total
+            if monthly_income:
+                later -= monthly_income_flows(np.datetime64(stop, 'ms'), today, monthly_income)[1].sum()
+            current_balance = current_balance + later
+            end = np.datetime64(stop - 1, 'ms')
+    # Spilled rows come back summed per day by SQLite: the history is binned by day anyway
+    table, daily = ledger.split(start, stop, lambda max_id, start, end: ledger.store.daily_totals(
+        ledger.user, max_id, start, end))
+    expense_dates, expense_amounts = table['date'].to_numpy(), table['amount'].to_numpy()
+    if daily:
+        days, totals = zip(*daily)
+        expense_dates = np.concatenate([np.asarray(days, np.int64).astype('datetime64[ms]'), expense_dates])
+        expense_amounts = np.concatenate([np.asarray(totals, np.float64), expense_amounts])
+    income_dates = income_amounts = None
+    if monthly_income and len(expense_dates):
+        income_dates, income_amounts = monthly_income_flows(
+            expense_dates.min(), end if end is not None else np.datetime64(date.today()), monthly_income)
+    return balance_series(current_balance, expense_dates, expense_amounts,
+                          income_dates, income_amounts, freq=freq, end=end)
+
+
+def balance_forecast(current_balance, rules, start, end, monthly_income=0, freq='M'):
+    """Projected closing balance of every period from the one holding `start` to the one holding `end`.
+
+    Walks forward from `current_balance` over the recurring rules (see
+    recurring_schedule) due in [start, end), ms, with monthly_income paid on
+    the 1st as in the history. Each rule is counted per period in closed
+    form, so the work follows the number of periods shown, not the number of
+    occurrences: five years of daily rules at monthly resolution is 61 values
+    per rule.
+    """
+    from recurring_schedule import monthly_income_rule, scheduled_net
+
+    rules = list(rules) + ([monthly_income_rule(monthly_income)] if monthly_income else [])
+    first, last = _period_codes(np.array([start // 86_400_000, (end - 1) // 86_400_000]), freq)
+    starts = _period_starts(np.arange(first, last + 2), freq)
+    bounds = starts.astype('datetime64[ms]').astype(np.int64)
+    bounds[0], bounds[-1] = start, end
+    balances = float(current_balance) + np.cumsum(scheduled_net(rules, bounds))
+    return pd.Series(balances, index=pd.DatetimeIndex(starts[:-1], name='period'), name='forecast')
+
+
+def recent_spending(ledger, days=30, end=None):
+    # Total expenses dated in the `days` days up to `end` (default: now), e.g. the current monthly spend;
+    # only the rows in that window are read
+    end = int(np.datetime64(end if end is not None else datetime.now(), 'ms').astype(np.int64))
+    return ledger.period_aggregates(end - days * 86_400_000 + 1, end + 1).total
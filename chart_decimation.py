@@ -0,0 +1,94 @@
+import numpy as np
+import plotly.graph_objs as go
+
+DEFAULT_CHART_WIDTH = 800  # px; Streamlit does not report the real container width to the server
+POINTS_PER_PIXEL = 2
+WEBGL_THRESHOLD = 1000  # traces with more points than this are drawn with WebGL
+MARKER_THRESHOLD = 200  # markers are only drawn when they can still be told apart
+MAX_PIE_SLICES = 8
+
+
+def max_points_for_width(width=DEFAULT_CHART_WIDTH):
+    # More than a couple of points per horizontal pixel cannot be seen
+    return max(10, int(width * POINTS_PER_PIXEL))
+
+
+def _as_numeric(x):
+    x = np.asarray(x)
+    if np.issubdtype(x.dtype, np.datetime64):
+        return x.astype('datetime64[ms]').astype(np.int64).astype(np.float64)
+    return x.astype(np.float64)
+
+
+def lttb(x, y, n_out):
+    """Largest-Triangle-Three-Buckets: indices of n_out points that keep the visual shape of (x, y).
+
+    The first and last points are always kept; from every bucket in between
+    the point spanning the largest triangle with its neighbours is chosen.
+    """
+    n = len(y)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    xs, ys = _as_numeric(x), np.asarray(y, dtype=np.float64)
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    selected = np.empty(n_out, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    previous = 0
+    for i in range(n_out - 2):
+        start, stop = edges[i], edges[i + 1]
+        # Average of the next bucket is the third corner of the triangle
+        next_stop = edges[i + 2] if i + 2 < len(edges) else n
+        avg_x = xs[stop:next_stop].mean() if next_stop > stop else xs[-1]
+        avg_y = ys[stop:next_stop].mean() if next_stop > stop else ys[-1]
+        areas = np.abs((xs[previous] - avg_x) * (ys[start:stop] - ys[previous])
+                       - (xs[previous] - xs[start:stop]) * (avg_y - ys[previous]))
+        previous = start + int(areas.argmax())
+        selected[i + 1] = previous
+    return selected
+
+
+def minmax_decimate(y, n_buckets):
+    """Indices of the minimum and maximum of each of n_buckets equal-size buckets, in order.
+
+    Fully vectorized; keeps every spike, which LTTB may smooth away.
+    """
+    n = len(y)
+    if 2 * n_buckets >= n:
+        return np.arange(n)
+    ys = np.asarray(y, dtype=np.float64)
+    size = -(-n // n_buckets)
+    padded = np.full(n_buckets * size, np.nan)
+    padded[:n] = ys
+    buckets = padded.reshape(n_buckets, size)
+    valid = ~np.isnan(buckets).all(axis=1)
+    offsets = np.arange(n_buckets) * size
+    lows = offsets + np.nanargmin(np.where(valid[:, None], buckets, 0), axis=1)
+    highs = offsets + np.nanargmax(np.where(valid[:, None], buckets, 0), axis=1)
+    indices = np.sort(np.concatenate([lows[valid], highs[valid]]))
+    return np.unique(np.concatenate([[0], indices, [n - 1]]))
+
+
+def decimate(x, y, max_points, method='lttb'):
+    if method == 'minmax':
+        indices = minmax_decimate(y, max_points // 2)
+    else:
+        indices = lttb(x, y, max_points)
+    return np.asarray(x)[indices], np.asarray(y)[indices]
+
+
+def line_trace(x, y, name=None, width=DEFAULT_CHART_WIDTH, method='lttb', **kwargs):
+    # A line trace whose payload is bounded by the chart width, drawn with WebGL when it is still large
+    x, y = decimate(x, y, max_points_for_width(width), method)
+    mode = 'lines+markers' if len(x) <= MARKER_THRESHOLD else 'lines'
+    trace_type = go.Scattergl if len(x) > WEBGL_THRESHOLD else go.Scatter
+    return trace_type(x=x, y=y, name=name, mode=mode, **kwargs)
+
+
+def fold_tail(labels, values, max_slices=MAX_PIE_SLICES, other_label='Other'):
+    # Keep the largest max_slices - 1 categories and sum the rest into one "Other" slice
+    labels, values = list(labels), np.asarray(values, dtype=np.float64)
+    if len(labels) <= max_slices:
+        return labels, values.tolist()
+    order = np.argsort(values)[::-1]
+    head = order[:max_slices - 1]
+    return [labels[i] for i in head] + [other_label], values[head].tolist() + [float(values[order[max_slices - 1:]].sum())]
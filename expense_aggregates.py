@@ -0,0 +1,45 @@
+import numpy as np
+
+
+class ExpenseAggregates:
+    """Running total, count and per-category sums for an expense ledger.
+
+    Single expenses are folded in with add() in O(1); many rows at once
+    with add_codes() (one bincount over dictionary codes) or add_grouped()
+    (sums from a SQL GROUP BY), so nothing has to rebuild a DataFrame per
+    rerun.
+    """
+
+    def __init__(self):
+        self.total = 0.0
+        self.count = 0
+        self.by_category = {}
+
+    def add(self, name, amount):
+        amount = float(amount)
+        self.total += amount
+        self.count += 1
+        self.by_category[name] = self.by_category.get(name, 0.0) + amount
+
+    def add_grouped(self, names, sums, counts):
+        # Per-category sums and counts computed elsewhere (a SQL GROUP BY)
+        for name, amount, count in zip(names, sums, counts):
+            self.by_category[name] = self.by_category.get(name, 0.0) + amount
+            self.total += amount
+            self.count += count
+
+    def add_codes(self, categories, codes, amounts):
+        # Rows as codes into categories (see ExpenseColumns): per-category sums with one bincount, no group-by
+        if len(codes) == 0:
+            return
+        sums = np.bincount(codes, weights=amounts, minlength=len(categories))
+        counts = np.bincount(codes, minlength=len(categories))
+        for code in np.flatnonzero(counts).tolist():
+            name = categories[code]
+            self.by_category[name] = self.by_category.get(name, 0.0) + float(sums[code])
+        self.total += float(sums.sum())
+        self.count += len(codes)
+
+    def categories(self):
+        # Labels and values in insertion order, ready for a pie chart
+        return list(self.by_category), list(self.by_category.values())
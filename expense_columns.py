@@ -0,0 +1,225 @@
+import numpy as np
+import pyarrow as pa
+
+# Smallest code type that fits the number of categories, the same rule pandas uses for Categorical codes
+CODE_TYPES = [(np.int8, pa.int8()), (np.int16, pa.int16()), (np.int32, pa.int32())]
+GROWTH = 1.5  # capacity multiplier when the columns are full; keeps append amortized O(1) with at most 50% slack
+
+
+def _code_types(categories):
+    for np_type, pa_type in CODE_TYPES:
+        if categories < np.iinfo(np_type).max:
+            return np_type, pa_type
+    raise OverflowError(f'{categories:,} expense categories')
+
+
+class ExpenseColumns:
+    """Expense columns kept in date order: dictionary-encoded names, float64 amounts and int64 ms dates.
+
+    Every distinct name is stored once in `categories`; each expense costs
+    one small integer code (int8 until 127 names, then int16, then int32),
+    an 8-byte amount and an 8-byte date. The arrays grow by GROWTH when
+    full, so appending rows dated after the last one is amortized O(1) per
+    row. Older rows (an imported statement) are merged into new arrays in
+    O(n + k).
+
+    Because the dates are sorted they are their own index: date_slice()
+    finds any date range with two binary searches, and the rows of a range
+    are a contiguous slice.
+
+    Written rows are never changed in place (a merge builds new arrays), so
+    to_arrow() and to_frame() hand out views: the Arrow dictionary column
+    and the pandas Categorical share the code buffer instead of copying it.
+    """
+
+    def __init__(self, capacity=1024):
+        self.categories = []
+        self._index = {}  # name -> code
+        self._size = 0
+        self._codes = np.empty(capacity, CODE_TYPES[0][0])
+        self._amounts = np.empty(capacity, np.float64)
+        self._dates = np.empty(capacity, np.int64)
+        self._dictionary = None  # Arrow copy of categories, rebuilt when a name is added
+
+    def __len__(self):
+        return self._size
+
+    def _view(self, array):
+        # Read-only, so a DataFrame built on it cannot write into the ledger
+        view = array[:self._size]
+        view.flags.writeable = False
+        return view
+
+    @property
+    def codes(self):
+        return self._view(self._codes)
+
+    @property
+    def amounts(self):
+        return self._view(self._amounts)
+
+    @property
+    def dates(self):
+        return self._view(self._dates)
+
+    @property
+    def nbytes(self):
+        # Allocated bytes, including unused capacity and the category strings
+        arrays = self._codes.nbytes + self._amounts.nbytes + self._dates.nbytes
+        return arrays + sum(len(name.encode()) for name in self.categories)
+
+    def date_slice(self, start=None, end=None):
+        # Rows dated in [start, end), both ms and optional, as a slice of the columns
+        dates = self._dates[:self._size]
+        first = 0 if start is None else int(np.searchsorted(dates, start, 'left'))
+        last = self._size if end is None else int(np.searchsorted(dates, end, 'left'))
+        return slice(first, max(first, last))
+
+    def date_span(self):
+        # (first, last) date in ms, or None while empty
+        return (int(self._dates[0]), int(self._dates[self._size - 1])) if self._size else None
+
+    def _reserve(self, rows):
+        needed = self._size + rows
+        if needed <= len(self._amounts):
+            return
+        capacity = max(needed, int(len(self._amounts) * GROWTH))
+        for name in ('_codes', '_amounts', '_dates'):
+            old = getattr(self, name)
+            new = np.empty(capacity, old.dtype)
+            new[:self._size] = old[:self._size]
+            setattr(self, name, new)
+
+    def _intern(self, name):
+        code = self._index.get(name)
+        if code is None:
+            code = self._index[name] = len(self.categories)
+            self.categories.append(name)
+            self._dictionary = None
+            code_type = _code_types(len(self.categories))[0]
+            if code_type != self._codes.dtype:
+                self._codes = self._codes.astype(code_type)  # happens twice at most: at 127 and 32,767 names
+        return code
+
+    def encode(self, names):
+        # Codes for a sequence or Arrow array of names, interning new ones; each distinct name is looked up once
+        names = names if isinstance(names, pa.Array) else pa.array(names, pa.string())
+        encoded = names.dictionary_encode()
+        lookup = np.array([self._intern(name) for name in encoded.dictionary.to_pylist()] or [0], np.int32)
+        return lookup[encoded.indices.to_numpy(zero_copy_only=False)].astype(self._codes.dtype)
+
+    def append(self, name, amount, date_ms):
+        if self._size and date_ms < self._dates[self._size - 1]:
+            self.extend([name], [amount], [date_ms])
+            return
+        code = self._intern(name)
+        self._reserve(1)
+        self._codes[self._size] = code
+        self._amounts[self._size] = amount
+        self._dates[self._size] = date_ms
+        self._size += 1
+
+    def extend(self, names, amounts, dates_ms):
+        """Add rows in any date order and return their codes, in the order given."""
+        codes = self.encode(names)
+        self.extend_codes(codes, amounts, dates_ms)
+        return codes
+
+    def extend_codes(self, codes, amounts, dates_ms):
+        # Rows whose names were already turned into codes by encode()
+        codes = np.asarray(codes, self._codes.dtype)
+        amounts = np.asarray(amounts, np.float64)
+        dates = np.asarray(dates_ms, np.int64)
+        if len(dates) and (self._size and dates.min() < self._dates[self._size - 1] or np.any(dates[1:] < dates[:-1])):
+            self._merge(codes, amounts, dates)
+            return
+        self._reserve(len(codes))
+        end = self._size + len(codes)
+        self._codes[self._size:end] = codes
+        self._amounts[self._size:end] = amounts
+        self._dates[self._size:end] = dates
+        self._size = end
+
+    def drop_before(self, date_ms):
+        # Forget the rows dated before date_ms; the rest is copied into arrays sized for it. Returns the rows dropped
+        dropped = self.date_slice(date_ms).start
+        if dropped == 0:
+            return 0
+        kept = self._size - dropped
+        capacity = max(1024, int(kept * GROWTH))
+        for name in ('_codes', '_amounts', '_dates'):
+            old = getattr(self, name)
+            new = np.empty(capacity, old.dtype)
+            new[:kept] = old[dropped:self._size]
+            setattr(self, name, new)
+        self._size = kept
+        return dropped
+
+    def _merge(self, codes, amounts, dates):
+        # Sort the new rows and find each one's place with one searchsorted (side='right' keeps equal dates in
+        # arrival order), then fill fresh arrays so views of the old ones stay as they were
+        order = np.argsort(dates, kind='stable')
+        size = self._size + len(dates)
+        placed = np.zeros(size, bool)
+        placed[np.searchsorted(self._dates[:self._size], dates[order], 'right') + np.arange(len(dates))] = True
+        capacity = max(len(self._amounts), int(size * GROWTH))
+        for name, new in (('_codes', codes), ('_amounts', amounts), ('_dates', dates)):
+            old = getattr(self, name)
+            merged = np.empty(capacity, old.dtype)
+            merged[:size][placed] = new[order]
+            merged[:size][~placed] = old[:self._size]
+            setattr(self, name, merged)
+        self._size = size
+
+    def schema(self):
+        code_type = _code_types(len(self.categories))[1]
+        return pa.schema([('name', pa.dictionary(code_type, pa.string())),
+                          ('amount', pa.float64()), ('date', pa.timestamp('ms'))])
+
+    def _arrow_dictionary(self):
+        if self._dictionary is None or len(self._dictionary) != len(self.categories):
+            self._dictionary = pa.array(self.categories, pa.string())
+        return self._dictionary
+
+    def _batch(self, codes, amounts, dates):
+        dictionary = self._arrow_dictionary()
+        return pa.record_batch([
+            pa.DictionaryArray.from_arrays(pa.array(codes.astype(self._codes.dtype, copy=False)), dictionary),
+            pa.array(amounts),
+            pa.array(dates.view('datetime64[ms]')),
+        ], schema=self.schema())
+
+    def to_arrow(self, rows=slice(None), extra=None):
+        """Arrow table of the rows in a slice (see date_slice), without copying the columns.
+
+        extra=(names, amounts, dates_ms) appends rows that are not stored
+        (e.g. still waiting to be written) as a second chunk sharing the same
+        dictionary; their names are interned so the dictionary stays common.
+        """
+        # Interning the extra names first may add categories or widen the codes, so encode before building
+        extra_codes = self.encode(extra[0]) if extra is not None and len(extra[0]) else None
+        batches = [self._batch(self.codes[rows], self.amounts[rows], self.dates[rows])]
+        if extra_codes is not None:
+            batches.append(self._batch(extra_codes, np.asarray(extra[1], np.float64), np.asarray(extra[2], np.int64)))
+        return pa.Table.from_batches(batches, schema=self.schema())
+
+    def to_frame(self):
+        # pandas view: a Categorical over the same codes, amounts and datetime64[ms] dates, none of them copied
+        import pandas as pd
+        names = pd.Categorical.from_codes(self.codes, dtype=pd.CategoricalDtype(self.categories), validate=False)
+        return pd.DataFrame({'name': names, 'amount': self.amounts, 'date': self.dates.view('datetime64[ms]')},
+                            copy=False)
+
+
+def dictionary_codes(column):
+    """(codes as one NumPy array, categories as an Arrow array) of a dictionary-encoded column.
+
+    Chunks built by ExpenseColumns share one dictionary; other columns are
+    unified first so every code refers to the same categories.
+    """
+    if column.num_chunks > 1:
+        column = pa.table({'name': column}).unify_dictionaries().column('name')
+    if column.num_chunks == 0:
+        return np.empty(0, np.int32), pa.array([], pa.string())
+    codes = np.concatenate([chunk.indices.to_numpy(zero_copy_only=False) for chunk in column.chunks])
+    return codes, column.chunk(0).dictionary
@@ -0,0 +1,55 @@
+import os
+import sqlite3
+
+import pyarrow as pa
+import pyarrow.ipc as ipc
+
+# One-time import of the Arrow IPC files under data/ledger/<user> (or FINANCE_LEDGER_DIR) that held expenses
+# before ledger_store; SCHEMA, their row layout, is still the Arrow schema of an expense table
+LEDGER_DIR = os.environ.get(
+    'FINANCE_LEDGER_DIR',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'ledger'),
+)
+
+SCHEMA = pa.schema([
+    ('name', pa.string()),
+    ('amount', pa.float64()),
+    ('date', pa.timestamp('ms')),
+])
+
+SEGMENT_SUFFIX = '.arrow'
+
+
+def legacy_segments(ledger_dir=LEDGER_DIR):
+    # (user, segment name, path) of every segment file the Arrow ledger left behind, oldest first per user
+    if not os.path.isdir(ledger_dir):
+        return
+    for user in sorted(os.listdir(ledger_dir)):
+        path = os.path.join(ledger_dir, user)
+        if os.path.isdir(path):
+            for name in sorted(os.listdir(path)):
+                if name.endswith(SEGMENT_SUFFIX):
+                    yield user, name, os.path.join(path, name)
+
+
+def import_legacy_ledgers(store, ledger_dir=LEDGER_DIR):
+    """Copy the expenses of every Arrow ledger segment into the store; returns the rows imported.
+
+    Each segment is written in one transaction together with a record of
+    its name, so it is imported exactly once, even when several processes
+    start at the same time. The files are left in place.
+    """
+    imported = 0
+    for user, name, path in legacy_segments(ledger_dir):
+        if name in store.imported_segments(user):
+            continue
+        with pa.memory_map(path, 'r') as source:
+            table = ipc.open_file(source).read_all().cast(SCHEMA)
+        rows = list(zip([user] * table.num_rows, table.column('name').to_pylist(),
+                        table.column('amount').to_pylist(), table.column('date').cast(pa.int64()).to_pylist()))
+        try:
+            store.insert(rows, imported=[(user, name)])
+        except sqlite3.IntegrityError:
+            continue  # another process imported it first
+        imported += len(rows)
+    return imported
@@ -0,0 +1,82 @@
+from collections import namedtuple
+from datetime import datetime
+
+import numpy as np
+import streamlit as st
+
+# Period kinds offered by the pickers; month, quarter and year steps in NumPy datetime units
+PERIOD_KINDS = ['all', 'month', 'quarter', 'year', 'custom']
+_STEPS = {'month': ('M', 1), 'quarter': ('M', 3), 'year': ('Y', 1)}
+
+# English labels; translations.json entries with the same keys take precedence
+DEFAULT_LABELS = {
+    'period': 'Period',
+    'period_all': 'All time',
+    'period_month': 'Month',
+    'period_quarter': 'Quarter',
+    'period_year': 'Year',
+    'period_custom': 'Custom range',
+    'period_dates': 'From / to',
+}
+
+# start and end are ms timestamps (end exclusive), None for an open side
+Period = namedtuple('Period', ['start', 'end', 'label'])
+ALL_TIME = Period(None, None, DEFAULT_LABELS['period_all'])
+
+
+def _ms(value):
+    return int(np.datetime64(value, 'ms').astype(np.int64))
+
+
+def _label(kind, start):
+    if kind == 'month':
+        return str(start.astype('datetime64[M]'))
+    if kind == 'quarter':
+        month = start.astype('datetime64[M]').astype(np.int64)
+        return f'{month // 12 + 1970} Q{month % 12 // 3 + 1}'
+    return str(start.astype('datetime64[Y]'))
+
+
+def period_options(kind, first_ms, last_ms):
+    """Every month, quarter or year from the one holding first_ms to the one holding last_ms, newest first."""
+    unit, step = _STEPS[kind]
+    first = np.datetime64(first_ms, 'ms').astype(f'datetime64[{unit}]').astype(np.int64) // step
+    last = np.datetime64(last_ms, 'ms').astype(f'datetime64[{unit}]').astype(np.int64) // step
+    starts = (np.arange(last, first - 1, -1) * step).astype(f'datetime64[{unit}]')
+    return [Period(_ms(start), _ms(start + step), _label(kind, start)) for start in starts]
+
+
+def custom_period(first_day, last_day):
+    # Both days included
+    return Period(_ms(np.datetime64(first_day, 'D')), _ms(np.datetime64(last_day, 'D') + 1),
+                  f'{first_day} – {last_day}')
+
+
+def render_period_picker(ledger, translations=None, key='period'):
+    """Period widgets for a ledger; returns the chosen Period.
+
+    Months, quarters and years are listed from the first expense up to
+    today, so the ledger is only asked for its first and last date.
+    """
+    translations = translations or {}
+
+    def label(name):
+        return translations.get(name, DEFAULT_LABELS[name])
+
+    col1, col2 = st.columns([2, 1])
+    kind = col1.radio(label('period'), PERIOD_KINDS, format_func=lambda kind: label(f'period_{kind}'),
+                      horizontal=True, key=f'{key}_kind')
+    span = ledger.date_span()
+    if kind == 'all' or span is None:
+        return ALL_TIME._replace(label=label('period_all'))
+
+    today = _ms(datetime.now())
+    first, last = span[0], max(span[1], today)
+    if kind == 'custom':
+        days = col2.date_input(label('period_dates'), value=(), key=f'{key}_dates',
+                               min_value=np.datetime64(first, 'ms').astype(datetime).date(),
+                               max_value=np.datetime64(last, 'ms').astype(datetime).date())
+        return custom_period(days[0], days[-1]) if len(days) else ALL_TIME._replace(label=label('period_all'))
+
+    options = {period.label: period for period in period_options(kind, first, last)}
+    return options[col2.selectbox(label(f'period_{kind}'), list(options), key=f'{key}_{kind}')]
@@ -0,0 +1,117 @@
+import math
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import streamlit as st
+
+from expense_columns import dictionary_codes
+
+PAGE_SIZES = [25, 50, 100]
+SORT_COLUMNS = ['date', 'name', 'amount']
+
+# English labels; translations.json entries with the same keys take precedence
+DEFAULT_LABELS = {
+    'filter_by_name': 'Filter by name',
+    'min_amount': 'Min amount (GHS)',
+    'max_amount': 'Max amount (GHS)',
+    'sort_by': 'Sort by',
+    'descending': 'Descending',
+    'rows_per_page': 'Rows per page',
+    'page': 'Page',
+    'showing_expenses': 'Showing {start}-{end} of {matching} matching expenses ({total} total)',
+}
+
+
+def query_expenses(table, name_filter='', min_amount=None, max_amount=None,
+                   sort_by='date', descending=True, page=0, page_size=50):
+    """Filter and sort the ledger with Arrow compute kernels and return one page.
+
+    Returns (page_table, matching_rows). Only the requested page is taken out
+    of the ledger, so the cost of rendering does not grow with the ledger.
+    Dictionary-encoded names are matched and ranked once per distinct name.
+    """
+    encoded = pa.types.is_dictionary(table.schema.field('name').type)
+    mask = None
+    if name_filter and encoded:
+        codes, categories = dictionary_codes(table['name'])
+        matches = pc.match_substring(categories, name_filter, ignore_case=True).to_numpy(zero_copy_only=False)
+        mask = pa.array(matches[codes])
+    elif name_filter:
+        mask = pc.match_substring(table['name'], name_filter, ignore_case=True)
+    if min_amount is not None:
+        bound = pc.greater_equal(table['amount'], min_amount)
+        mask = bound if mask is None else pc.and_(mask, bound)
+    if max_amount is not None:
+        bound = pc.less_equal(table['amount'], max_amount)
+        mask = bound if mask is None else pc.and_(mask, bound)
+    if mask is not None:
+        table = table.filter(mask)
+
+    order = 'descending' if descending else 'ascending'
+    if sort_by == 'name' and encoded:
+        codes, categories = dictionary_codes(table['name'])
+        ranks = np.empty(len(categories), np.int64)
+        ranks[pc.sort_indices(categories).to_numpy()] = np.arange(len(categories))
+        indices = pc.sort_indices(pa.array(ranks[codes]), sort_keys=[('', order)])
+    else:
+        indices = pc.sort_indices(table, sort_keys=[(sort_by, order)])
+    start = page * page_size
+    return table.take(indices[start:start + page_size]), table.num_rows
+
+
+def query_ledger(ledger, name_filter='', min_amount=None, max_amount=None,
+                 sort_by='date', descending=True, page=0, page_size=50):
+    """query_expenses() over a whole ledger; returns (page_table, matching_rows, total_rows).
+
+    Rows the ledger spilled to SQLite are filtered, sorted and cut to the
+    first page + 1 pages there, then merged with the same rows of the part
+    in memory, so the page costs the same however much was spilled.
+    """
+    from expense_ledger import SCHEMA
+    limit = (page + 1) * page_size
+    table, cold = ledger.split(cold=lambda max_id, start, end: ledger.store.expense_page(
+        ledger.user, max_id, start, end, name_filter, min_amount, max_amount, sort_by, descending, limit))
+    if cold is None:
+        rows, matching = query_expenses(table, name_filter, min_amount, max_amount, sort_by, descending,
+                                        page, page_size)
+        return rows, matching, table.num_rows
+    cold_rows, cold_matching, cold_total = cold
+    top, matching = query_expenses(table, name_filter, min_amount, max_amount, sort_by, descending, 0, limit)
+    rows, _ = query_expenses(pa.concat_tables([top.cast(SCHEMA), cold_rows]), sort_by=sort_by,
+                             descending=descending, page=page, page_size=page_size)
+    return rows, matching + cold_matching, table.num_rows + cold_total
+
+
+def render_expense_table(ledger, translations=None, key='expense_table'):
+    # Windowed expense view: widgets for filter/sort/page, then only the visible rows are sent
+    translations = translations or {}
+
+    def label(name):
+        return translations.get(name, DEFAULT_LABELS[name])
+
+    col1, col2, col3 = st.columns([2, 1, 1])
+    name_filter = col1.text_input(label('filter_by_name'), key=f'{key}_name')
+    min_amount = col2.number_input(label('min_amount'), min_value=0.0, value=None, key=f'{key}_min')
+    max_amount = col3.number_input(label('max_amount'), min_value=0.0, value=None, key=f'{key}_max')
+
+    col1, col2, col3, col4 = st.columns([2, 1, 1, 1])
+    sort_by = col1.selectbox(label('sort_by'), SORT_COLUMNS, key=f'{key}_sort')
+    descending = col2.checkbox(label('descending'), value=True, key=f'{key}_desc')
+    page_size = col3.selectbox(label('rows_per_page'), PAGE_SIZES, index=1, key=f'{key}_size')
+
+    # The page count depends on the filter, so query first with the stored page and clamp after
+    page = st.session_state.get(f'{key}_page', 1)
+    rows, matching, total = query_ledger(ledger, name_filter, min_amount, max_amount,
+                                         sort_by, descending, page - 1, page_size)
+    pages = max(1, math.ceil(matching / page_size))
+    if page > pages:
+        st.session_state[f'{key}_page'] = page = pages
+        rows, matching, total = query_ledger(ledger, name_filter, min_amount, max_amount,
+                                             sort_by, descending, page - 1, page_size)
+    col4.number_input(label('page'), min_value=1, max_value=pages, step=1, key=f'{key}_page')
+
+    st.dataframe(rows.to_pandas(), hide_index=True, use_container_width=True)
+    start = (page - 1) * page_size + 1 if matching else 0
+    st.caption(label('showing_expenses').format(
+        start=start, end=start + rows.num_rows - 1 if matching else 0, matching=matching, total=total))
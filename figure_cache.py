@@ -0,0 +1,50 @@
+import hashlib
+import threading
+from collections import OrderedDict
+
+import streamlit as st
+
+
+def figure_key(name, *inputs):
+    """Cheap content hash of everything a figure is built from.
+
+    Inputs must have a stable repr (numbers, strings, dates, tuples); the
+    ledger contributes its version rather than its rows.
+    """
+    return name, hashlib.blake2b(repr(inputs).encode(), digest_size=16).hexdigest()
+
+
+class FigureCache:
+    """Bounded LRU cache of Plotly figures shared by every session of the process."""
+
+    def __init__(self, maxsize=64):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._figures = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._figures)
+
+    def get_or_build(self, key, build):
+        with self._lock:
+            figure = self._figures.get(key)
+            if figure is not None:
+                self._figures.move_to_end(key)
+                self.hits += 1
+                return figure
+            self.misses += 1
+        # Build outside the lock so a slow figure does not hold up other sessions
+        figure = build()
+        with self._lock:
+            self._figures[key] = figure
+            self._figures.move_to_end(key)
+            while len(self._figures) > self.maxsize:
+                self._figures.popitem(last=False)
+        return figure
+
+
+@st.cache_resource
+def get_figure_cache(maxsize=64):
+    return FigureCache(maxsize)
@@ -1,30 +1,34 @@
+from datetime import date
+
 import streamlit as st
-import pandas as pd
-import numpy as np
-import plotly.graph_objs as go
-import json
-
-# Load translations from a JSON file (English is default)
-def load_translations(language):
-    try:
-        with open('translations.json',encoding='utf-8') as f:
-            translations = json.load(f)
-        return translations.get(language, translations['en'])
-    except FileNotFoundError:
-        st.error("Translation file not found. Defaulting to English.")
-        return translations['en']
-
-# Function to translate text based on selected language
-def translate(key, translations):
-    return translations.get(key, key)
+from ledger_store import current_user, get_store, sync_metrics
+from statement_import import render_statement_import
+from ledger_export import render_ledger_export
+from expense_periods import render_period_picker
+from recurring_schedule import forecast_window, render_recurring_rules, rest_of_month, scheduled_totals
+from figure_cache import figure_key, get_figure_cache
+from analytics_jobs import show_job, submit_job
+from health_score import budget_remaining_ratio, health_score
+from suggestion_rules import get_suggestion_rules
+from fragment_sections import notify, rerun_app_on_change, show_notices
+from rerun_profiler import begin_rerun, profile_section, profiled, render_profiler_panel
+from translation_catalog import LANGUAGE_CODES, load_translations, translate
+
+# Per-section timings, shown in a hidden sidebar panel with ?debug=1
+begin_rerun()
 
 # Sidebar for language selection
 st.sidebar.title('🌍 Language Selection')
 language = st.sidebar.selectbox("Choose language:", ['English', 'Twi','Ga','Hausa'])
-language_key = {"English": "en", "Twi": "twi", "Ga":"ga","Hausa":"ha"}[language]
+language_key = LANGUAGE_CODES[language]
 
-# Load translations for the selected language
-translations = load_translations(language_key)
+# Load translations for the selected language (cached per process, reloaded when the file changes)
+try:
+    with profiled('translations'):
+        translations = load_translations(language_key)
+except FileNotFoundError:
+    st.error("Translation file not found. Defaulting to English.")
+    translations = {}
 
 # Custom CSS for a modern UI
 st.markdown(
@@ -82,34 +86,41 @@ if st.sidebar.button(translate('navigate_graphs', translations)):
     st.session_state.page = "Graphs"
 
 
-# Initialize session state for financial metrics if not already done
-if 'current_balance' not in st.session_state:
-    st.session_state.current_balance = 1200  # Default current balance
-if 'total_savings' not in st.session_state:
-    st.session_state.total_savings = 5000  # Default total savings
-if 'investment_value' not in st.session_state:
-    st.session_state.investment_value = 10000  # Default investment value
-if 'expenses' not in st.session_state:
-    st.session_state.expenses = []  # Initialize empty list for expenses
+# Financial metrics and expenses live in the shared store; a new session starts from the user's saved values
+store = get_store()
+user = current_user()
+# This user's expenses, shared by all their sessions; looked up again on every rerun, since the store
+# forgets the ledgers of users who went idle
+st.session_state.expenses = store.ledger(user)
+sync_metrics(store, user)  # Also picks up metrics another session of this user saved since the last rerun
+if 'monthly_income' not in st.session_state:
+    st.session_state.monthly_income = 2000  # Default monthly income
+expense_totals = st.session_state.expenses.aggregates  # Running totals, updated in O(1) per added expense
 
-if st.session_state.page == "Dashboard":
-    # Title and Header
-    st.title(f"💰 {translate('dashboard_title', translations)}")
-    st.header(f"📊 {translate('overview_title', translations)}")
+# Dashboard sections run as fragments: a widget inside one reruns only that section.
+# Sections that change state read elsewhere (metrics, expenses) trigger a full rerun.
+@st.fragment
+@profile_section('metrics')
+def metrics_section(translations):
+    with rerun_app_on_change(lambda: (st.session_state.current_balance, st.session_state.total_savings, st.session_state.investment_value)):
+        # Financial Metrics Input
+        st.subheader(f"💸 {translate('update_metrics', translations)}")
+        st.session_state.current_balance = st.number_input(translate('current_balance', translations), min_value=0, value=st.session_state.current_balance)
+        st.session_state.total_savings = st.number_input(translate('total_savings', translations), min_value=0, value=st.session_state.total_savings)
+        st.session_state.investment_value = st.number_input(translate('investment_value', translations), min_value=0, value=st.session_state.investment_value)
+        sync_metrics(store, user)  # Saves only the metrics edited in this session
 
-    # Financial Metrics Input
-    st.subheader(f"💸 {translate('update_metrics', translations)}")
-    st.session_state.current_balance = st.number_input(translate('current_balance', translations), min_value=0, value=st.session_state.current_balance)
-    st.session_state.total_savings = st.number_input(translate('total_savings', translations), min_value=0, value=st.session_state.total_savings)
-    st.session_state.investment_value = st.number_input(translate('investment_value', translations), min_value=0, value=st.session_state.investment_value)
+        # Financial Metrics Display
+        st.subheader(f"📈 {translate('key_metrics', translations)}")
+        col1, col2, col3 = st.columns(3)
+        col1.metric(translate('current_balance', translations), f"GHS {st.session_state.current_balance}")
+        col2.metric(translate('total_savings', translations), f"GHS {st.session_state.total_savings}")
+        col3.metric(translate('investment_value', translations), f"GHS {st.session_state.investment_value}")
 
-    # Financial Metrics Display
-    st.subheader(f"📈 {translate('key_metrics', translations)}")
-    col1, col2, col3 = st.columns(3)
-    col1.metric(translate('current_balance', translations), f"GHS {st.session_state.current_balance}")
-    col2.metric(translate('total_savings', translations), f"GHS {st.session_state.total_savings}")
-    col3.metric(translate('investment_value', translations), f"GHS {st.session_state.investment_value}")
 
+@st.fragment
+@profile_section('goals')
+def goals_section(translations, language_key):
     # Financial Goals Section
     st.subheader(f"🎯 {translate('set_goals', translations)}")
     goal = st.selectbox(translate('choose_goal_1', translations), [
@@ -120,8 +131,11 @@ if st.session_state.page == "Dashboard":
 ])
 
     goal_amount = st.number_input(translate('goal_amount', translations), min_value=0, value=1000)
+    st.session_state.goal_target = goal_amount  # Projected on the Graphs page
 
-    # Financial Goals Explanation
+    # Financial Goals Explanation; the selectbox shows translated labels, so map them back to the goal first
+    rules = get_suggestion_rules()
+    goal = rules.resolve_goal(goal)
     if goal == 'Emergency Fund':
         st.write(f"💡 {translate('emergency_fund_suggestion', translations)}")
     elif goal == 'Home Purchase':
@@ -131,67 +145,209 @@ if st.session_state.page == "Dashboard":
     else:
         st.write(f"🚀 {translate('debt_repayment_suggestion', translations)}")
 
-    # Suggestions based on the financial goal
+    # Suggestions based on the financial goal and the current balance
     st.write(translate('goal_suggestions_intro', translations))
-    if goal == 'Emergency Fund':
-        st.write(translate('emergency_fund_tip', translations))
-    elif goal == 'Home Purchase':
-        st.write(translate('home_purchase_tip', translations))
-
-    # Expense Tracking Section
-    st.subheader(f"📝 {translate('track_expenses', translations)}")
-    with st.form("expense_form"):
-        expense_name = st.text_input(translate('add_expense', translations), 'Rent')
-        expense_amount = st.number_input(translate('total_expenses', translations), min_value=0, max_value=10000, value=1000)
-        add_expense = st.form_submit_button(f"➕ {translate('add_expense', translations)}")
-
-    # Add expense to session state
-    if add_expense:
-        st.session_state.expenses.append({'name': expense_name, 'amount': expense_amount})
-        st.success(f"✅ {translate('add_expense', translations)} {expense_name} with amount GHS {expense_amount}")
-
-    # Display expenses
-    if st.session_state.expenses:
-        st.subheader(f"📋 {translate('total_expenses', translations)}")
-        expense_df = pd.DataFrame(st.session_state.expenses)
-        st.table(expense_df)
-        st.metric(translate('total_expenses', translations), f"GHS {expense_df['amount'].sum()}")
+    suggestion, tip = rules.advice(goal, st.session_state.current_balance, language_key)
+    if suggestion:
+        st.write(suggestion)
+    if tip:
+        st.write(tip)
+
+
+@st.fragment
+@profile_section('expenses')
+def expenses_section(translations, expense_totals):
+    with rerun_app_on_change(lambda: (st.session_state.expenses.version, store.schedules(user))):
+        # Expense Tracking Section
+        st.subheader(f"📝 {translate('track_expenses', translations)}")
+        show_notices()
+        with st.form("expense_form"):
+            expense_name = st.text_input(translate('add_expense', translations), 'Rent')
+            expense_amount = st.number_input(translate('total_expenses', translations), min_value=0, max_value=10000, value=1000)
+            add_expense = st.form_submit_button(f"➕ {translate('add_expense', translations)}")
 
+        # Add expense to session state
+        if add_expense:
+            st.session_state.expenses.append(expense_name, expense_amount)
+            notify(f"✅ {translate('add_expense', translations)} {expense_name} with amount GHS {expense_amount}")
+
+        # Rent, salary and other rules that repeat, forecast on the Graphs page
+        render_recurring_rules(store, user, translations, notify=notify)
+
+        # Bulk import of bank / mobile-money statements
+        render_statement_import(st.session_state.expenses, translations, notify=notify)
+
+        # Filtered CSV / Parquet / Excel export and a monthly summary
+        render_ledger_export(store, user, st.session_state.expenses, translations)
+
+        # Display expenses
+        if expense_totals.count:
+            st.subheader(f"📋 {translate('total_expenses', translations)}")
+            from expense_table import render_expense_table
+            with profiled('expense_table'):
+                render_expense_table(st.session_state.expenses, translations)
+            # Totals of one month, quarter, year or date range; the ledger is date-sorted, so only its rows are read
+            period = render_period_picker(st.session_state.expenses, translations, key='dashboard_period')
+            period_totals = st.session_state.expenses.period_aggregates(period.start, period.end) if period.start is not None else expense_totals
+            st.metric(f"{translate('total_expenses', translations)} ({period.label})", f"GHS {period_totals.total:,.2f}")
+
+
+@st.fragment
+@profile_section('budget')
+def budget_section(translations, expense_totals):
     # Monthly Budget Progress
     st.subheader(f"📊 {translate('budget_progress', translations)}")
-    monthly_income = st.slider('Enter your monthly income (GHS)', 500, 10000, 2000)
-    total_expenses = expense_df['amount'].sum() if st.session_state.expenses else 0
-    budget_remaining = monthly_income - total_expenses
-    st.progress(budget_remaining / monthly_income)
+    monthly_income = st.slider('Enter your monthly income (GHS)', 500, 10000, st.session_state.monthly_income)
+    st.session_state.monthly_income = monthly_income
+    total_expenses = expense_totals.total
+    # Recurring rules still due this month count towards the budget
+    scheduled_expenses, scheduled_income = scheduled_totals(store.schedules(user), *rest_of_month())
+    st.progress(budget_remaining_ratio(monthly_income + scheduled_income, total_expenses + scheduled_expenses))
+    if scheduled_expenses or scheduled_income:
+        st.caption(f"Still scheduled this month: GHS {scheduled_expenses:,.2f} out, GHS {scheduled_income:,.2f} in")
 
     # Financial Health Score
     st.subheader(f"🏆 {translate('financial_health_score', translations)}")
-    health_score = min(100, max(0, ((st.session_state.total_savings + st.session_state.investment_value - total_expenses) / monthly_income) * 10))
-    st.metric(translate('financial_health_score', translations), f"{health_score}/100")
+    score = health_score(st.session_state.current_balance, st.session_state.total_savings, monthly_income)
+    st.metric(translate('financial_health_score', translations), f"{int(score)}/100")
+
+
+@st.fragment
+@profile_section('balance_chart')
+def balance_chart_section(translations, language_key, ledger_version, period):
+    # Balance history from the ledger, anchored on the current balance
+    import plotly.graph_objs as go
+    from cash_flow import RESOLUTIONS, balance_forecast, ledger_balance_series
+    from chart_decimation import line_trace
+
+    col1, col2 = st.columns(2)
+    resolution = col1.radio("Resolution", list(RESOLUTIONS), index=2, horizontal=True)
+    horizon = col2.slider("Forecast (months)", 0, 60, 12)
+
+    ledger, balance, income = st.session_state.expenses, st.session_state.current_balance, st.session_state.monthly_income
+    # Recurring rules projected forward from tomorrow, within the chosen period
+    rules, window = store.schedules(user), forecast_window(horizon, period)
+
+    def build_balance_figure(job):
+        balances = ledger_balance_series(ledger, balance, income, RESOLUTIONS[resolution], period=period)
+        traces = [line_trace(balances.index, balances.values, name="Balance")]
+        if window is not None:
+            forecast = balance_forecast(balance, rules, *window, monthly_income=income, freq=RESOLUTIONS[resolution])
+            traces.append(line_trace(forecast.index, forecast.values, name="Forecast", line={'dash': 'dash'}))
+        fig = go.Figure(traces)
+        fig.update_layout(title=translate('balance_over_time', translations), xaxis_title=resolution, yaxis_title="Balance (GHS)")
+        return fig
+
+    # Plotly line chart, built in the background; the previous chart stays up until the new one is ready
+    job = submit_job('balance_chart', figure_key('balance', current_user(), ledger_version, balance, income, resolution,
+                                                 period.start, period.end, rules, window, language_key, date.today()),
+                     build_balance_figure)
+    show_job(job, st.plotly_chart, slot='balance_chart')
+
+
+@st.fragment
+@profile_section('goal_projection')
+def goal_projection_section(translations, language_key):
+    # Monte Carlo paths from today's savings and investments towards the goal set on the Dashboard
+    from cash_flow import recent_spending
+    from goal_projection import project_goal, projection_figure
+
+    st.subheader(f"🔮 {translate('goal_projection', translations)}")
+    col1, col2, col3 = st.columns(3)
+    goal_amount = col1.number_input(translate('goal_amount', translations), min_value=1, value=max(1, st.session_state.get('goal_target', 5000)))
+    annual_return = col2.slider('Expected annual return (%)', 0.0, 20.0, 8.0, 0.5) / 100
+    volatility = col3.slider('Volatility (%)', 0.0, 40.0, 15.0, 0.5) / 100
+    col1, col2 = st.columns(2)
+    years = col1.slider('Horizon (years)', 1, 30, 5)
+    paths = col2.select_slider('Simulated paths', [1_000, 10_000, 100_000, 1_000_000], value=10_000)
+    contribution = st.session_state.monthly_income - recent_spending(st.session_state.expenses)
+    st.caption(f'Monthly contribution: GHS {contribution:,.2f} (income minus the last 30 days of expenses)')
+    savings, investments = st.session_state.total_savings, st.session_state.investment_value
+
+    def build_projection_figure(projection):
+        chance = projection['probability'].iloc[-1]
+        title = f'Chance of reaching GHS {goal_amount:,} in {years} years: {chance:.0%}'
+        return projection_figure(projection, goal_amount, title=title)
+
+    def run_projection(job):
+        projection = project_goal(goal_amount, savings, investments, contribution, months=12 * years,
+                                  annual_return=annual_return, volatility=volatility, paths=paths,
+                                  progress=job.report, cancelled=job.cancelled)
+        job.check_cancelled()
+        return build_projection_figure(projection)
+
+    def show_partial(job, previous):
+        # Paths simulated so far, until the full run is in
+        st.progress(job.progress, text=f'Simulating {paths:,} paths')
+        if job.partial is not None:
+            st.plotly_chart(build_projection_figure(job.partial))
+        elif previous is not None:
+            st.plotly_chart(previous)
+
+    with profiled('goal_projection_chart'):
+        job = submit_job('goal_projection',
+                         figure_key('goal_projection', goal_amount, savings, investments, round(contribution, 2),
+                                    annual_return, volatility, years, paths, language_key, date.today()),
+                         run_projection)
+        show_job(job, st.plotly_chart, show_partial, slot='goal_projection')
+
+if st.session_state.page == "Dashboard":
+    # Title and Header
+    st.title(f"💰 {translate('dashboard_title', translations)}")
+    st.header(f"📊 {translate('overview_title', translations)}")
+
+    metrics_section(translations)
+    goals_section(translations, language_key)
+    expenses_section(translations, expense_totals)
+    budget_section(translations, expense_totals)
 
 elif st.session_state.page == "Graphs":
+    # Plotly and the chart modules are only imported once the Graphs page is opened
+    import plotly.graph_objs as go
+    from chart_decimation import fold_tail
+
     st.title(f"📊 {translate('financial_graphs', translations)}")
     st.subheader(f"📈 {translate('balance_over_time', translations)}")
 
-    # Generate sample data for the graph
-    months = pd.date_range(start='2023-01-01', periods=12, freq='M')
-    balances = np.random.randint(1000, 5000, size=12)
+    # Figures are cached per process and rebuilt only when one of their inputs changes
+    figures = get_figure_cache()
+    ledger_version = st.session_state.expenses.version
+
+    # One period for the charts below; switching it reads only the expenses dated in it
+    period = render_period_picker(st.session_state.expenses, translations, key='graphs_period')
+    period_totals = st.session_state.expenses.period_aggregates(period.start, period.end) if period.start is not None else expense_totals
 
-    # Plotly line chart
-    fig = go.Figure([go.Scatter(x=months, y=balances, mode='lines+markers')])
-    fig.update_layout(title=translate('balance_over_time', translations), xaxis_title="Month", yaxis_title="Balance (GHS)")
-    st.plotly_chart(fig)
+    balance_chart_section(translations, language_key, ledger_version, period)
 
     # Expense Breakdown Chart
     st.subheader(f"📊 {translate('expense_breakdown', translations)}")
-    if st.session_state.expenses:
-        expense_breakdown_fig = go.Figure([go.Pie(labels=expense_df['name'], values=expense_df['amount'])])
-        st.plotly_chart(expense_breakdown_fig)
+    if period_totals.count:
+        def build_expense_breakdown_figure():
+            labels, values = fold_tail(*period_totals.categories())
+            return go.Figure([go.Pie(labels=labels, values=values)])
+
+        with profiled('expense_pie'):
+            expense_breakdown_fig = figures.get_or_build(
+                figure_key('expense_breakdown', user, ledger_version, period.start, period.end, language_key),
+                build_expense_breakdown_figure)
+            st.plotly_chart(expense_breakdown_fig)
     else:
         st.write("No expenses added yet.")
 
     # Savings vs Investment Chart
     st.subheader(f"📊 {translate('savings_investment_comparison', translations)}")
-    comparison_fig = go.Figure()
-    comparison_fig.add_trace(go.Bar(x=['Savings', 'Investments'], y=[st.session_state.total_savings, st.session_state.investment_value]))
-    st.plotly_chart(comparison_fig)
+
+    def build_comparison_figure():
+        comparison_fig = go.Figure()
+        comparison_fig.add_trace(go.Bar(x=['Savings', 'Investments'], y=[st.session_state.total_savings, st.session_state.investment_value]))
+        return comparison_fig
+
+    with profiled('comparison_chart'):
+        comparison_fig = figures.get_or_build(
+            figure_key('comparison', st.session_state.total_savings, st.session_state.investment_value, language_key),
+            build_comparison_figure)
+        st.plotly_chart(comparison_fig)
+
+    goal_projection_section(translations, language_key)
+
+render_profiler_panel()
@@ -0,0 +1,40 @@
+from contextlib import contextmanager
+
+import streamlit as st
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+
+def in_fragment_rerun():
+    # True while Streamlit is rerunning only one or more fragments, not the whole script
+    ctx = get_script_run_ctx()
+    return bool(ctx is not None and ctx.fragment_ids_this_run)
+
+
+@contextmanager
+def rerun_app_on_change(read_state):
+    """Run a fragment body and rerun the whole app only if it changed shared state.
+
+    read_state() returns the values that other sections depend on. A fragment
+    rerun that leaves them untouched stays scoped to the fragment; one that
+    changes them (new metrics, a new expense) triggers a full rerun so every
+    dependent section is redrawn with the new values. Messages shown with
+    notify() inside the block are carried over that rerun.
+    """
+    before = read_state()
+    st.session_state['_pending_notices'] = []
+    yield
+    pending = st.session_state.pop('_pending_notices', [])
+    if in_fragment_rerun() and read_state() != before:
+        st.session_state['_notices'] = pending
+        st.rerun()
+
+
+def notify(message):
+    st.success(message)
+    st.session_state.setdefault('_pending_notices', []).append(message)
+
+
+def show_notices():
+    # Messages from a fragment run that was replaced by a full rerun
+    for message in st.session_state.pop('_notices', []):
+        st.success(message)
@@ -0,0 +1,137 @@
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+import numpy as np
+import pandas as pd
+import plotly.graph_objs as go
+
+PERCENTILES = (10, 25, 50, 75, 90)
+CHUNK_PATHS = 20_000  # paths simulated at once; bounds memory to a few chunk x months arrays
+POOL_THRESHOLD = 200_000  # runs with more paths than this are spread over a process pool
+
+
+def _simulate_chunk(args):
+    """Simulate one chunk of savings paths; returns (paths, goal hits per month, percentiles per month).
+
+    Cash savings grow by the monthly contribution; investments follow a
+    geometric Brownian motion with the given annual return and volatility.
+    All months are drawn and accumulated at once with cumsum, so there is no
+    Python loop over months or paths.
+    """
+    seed, paths, months, savings, investments, contribution, annual_return, volatility, goal = args
+    rng = np.random.default_rng(seed)
+    mu = np.log1p(annual_return) / 12
+    sigma = volatility / np.sqrt(12)
+    log_growth = rng.standard_normal((paths, months))
+    log_growth *= sigma
+    log_growth += mu - 0.5 * sigma ** 2
+    np.cumsum(log_growth, axis=1, out=log_growth)
+    wealth = np.exp(log_growth, out=log_growth)
+    wealth *= investments
+    wealth += savings + contribution * np.arange(1, months + 1)
+
+    # A goal counts as reached from the first month the path touches it
+    reached = np.logical_or.accumulate(wealth >= goal, axis=1)
+    hits = reached.sum(axis=0)
+    bands = np.percentile(wealth, PERCENTILES, axis=0)
+    return paths, hits, bands
+
+
+def _combine(results, months):
+    total = sum(size for size, _, _ in results)
+    hits = sum(chunk_hits for _, chunk_hits, _ in results)
+    bands = sum(size * chunk_bands for size, _, chunk_bands in results) / total
+    frame = pd.DataFrame({f'p{p}': band for p, band in zip(PERCENTILES, bands)},
+                         index=pd.RangeIndex(1, months + 1, name='month'))
+    frame.insert(0, 'probability', hits / total)
+    return frame
+
+
+def project_goal(goal, savings, investments, monthly_contribution, months=60, annual_return=0.08, volatility=0.15,
+                 paths=10_000, seed=0, workers=None, chunk_paths=CHUNK_PATHS, progress=None, cancelled=None):
+    """Monte Carlo projection of savings towards a goal.
+
+    Returns a DataFrame indexed by month number (1..months) with the
+    probability of having reached the goal by that month and the wealth
+    percentiles p10/p25/p50/p75/p90.
+
+    Paths are simulated in chunks of chunk_paths, each with its own child of
+    one SeedSequence, so results depend only on seed and chunk_paths, not on
+    how many workers ran them. Runs above POOL_THRESHOLD paths use a process
+    pool of `workers` processes (default: all cores). Percentiles are the
+    path-weighted mean of the chunk percentiles.
+
+    After every chunk, progress(fraction, frame_so_far) is called; if
+    cancelled() returns True the run stops and returns None.
+    """
+    n_chunks = max(1, -(-paths // chunk_paths))
+    seeds = np.random.SeedSequence(seed).spawn(n_chunks)
+    sizes = [min(chunk_paths, paths - i * chunk_paths) for i in range(n_chunks)]
+    tasks = [(s, size, months, float(savings), float(investments), float(monthly_contribution),
+              float(annual_return), float(volatility), float(goal)) for s, size in zip(seeds, sizes)]
+
+    def collect(chunks):
+        results = []
+        for result in chunks:
+            if cancelled is not None and cancelled():
+                return None
+            results.append(result)
+            if progress is not None:
+                progress(len(results) / n_chunks, _combine(results, months))
+        return _combine(results, months)
+
+    workers = workers or os.cpu_count() or 1
+    if paths > POOL_THRESHOLD and workers > 1 and n_chunks > 1:
+        # spawn, not fork: the caller may be a threaded Streamlit server
+        with ProcessPoolExecutor(min(workers, n_chunks), mp_context=get_context('spawn')) as pool:
+            futures = [pool.submit(_simulate_chunk, task) for task in tasks]
+            projection = collect(future.result() for future in futures)
+            if projection is None:
+                for future in futures:
+                    future.cancel()
+            return projection
+    return collect(_simulate_chunk(task) for task in tasks)
+
+
+def projection_figure(projection, goal, start=None, title='Goal projection', wealth_label='Savings + investments (GHS)',
+                      probability_label='Chance of reaching the goal'):
+    # Percentile bands and the median path on the left axis, the probability of having reached the goal on the right
+    start = pd.Timestamp(start if start is not None else pd.Timestamp.today()).to_period('M')
+    dates = pd.period_range(start + 1, periods=len(projection), freq='M').to_timestamp()
+    fig = go.Figure()
+    for low, high, opacity in (('p10', 'p90', 0.15), ('p25', 'p75', 0.3)):
+        fig.add_trace(go.Scatter(x=dates, y=projection[high], mode='lines', line=dict(width=0), showlegend=False,
+                                 hoverinfo='skip'))
+        fig.add_trace(go.Scatter(x=dates, y=projection[low], mode='lines', line=dict(width=0), fill='tonexty',
+                                 fillcolor=f'rgba(39, 174, 96, {opacity})', name=f'{low}-{high}'))
+    fig.add_trace(go.Scatter(x=dates, y=projection['p50'], mode='lines', line=dict(color='#27ae60'), name='p50'))
+    fig.add_hline(y=goal, line_dash='dash', line_color='gray')
+    fig.add_trace(go.Scatter(x=dates, y=projection['probability'], mode='lines', line=dict(color='#1a6f9a'),
+                             name=probability_label, yaxis='y2'))
+    fig.update_layout(title=title, yaxis=dict(title=wealth_label),
+                      yaxis2=dict(title=probability_label, overlaying='y', side='right', range=[0, 1],
+                                  tickformat='.0%'))
+    return fig
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Monte Carlo projection of savings towards a goal.')
+    parser.add_argument('goal', type=float)
+    parser.add_argument('--savings', type=float, default=5000)
+    parser.add_argument('--investments', type=float, default=10000)
+    parser.add_argument('--contribution', type=float, default=500, help='monthly income minus expenses')
+    parser.add_argument('--months', type=int, default=60)
+    parser.add_argument('--return', dest='annual_return', type=float, default=0.08)
+    parser.add_argument('--volatility', type=float, default=0.15)
+    parser.add_argument('--paths', type=int, default=1_000_000)
+    parser.add_argument('--workers', type=int)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    projection = project_goal(args.goal, args.savings, args.investments, args.contribution, args.months,
+                              args.annual_return, args.volatility, args.paths, workers=args.workers)
+    print(projection.iloc[[0, len(projection) // 4, len(projection) // 2, -1]].round(3))
+    print(f'{args.paths:,} paths x {args.months} months in {time.perf_counter() - started:.2f}s')
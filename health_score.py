@@ -0,0 +1,115 @@
+import argparse
+import time
+
+import numpy as np
+import pyarrow as pa
+
+DEFAULT_SAVINGS_GOAL = 5000  # GHS; the savings target shown on the Graphs page
+
+# Columns of a profile file; savings_goal is optional
+PROFILE_COLUMNS = ['income', 'expenses', 'balance', 'savings']
+
+
+def _as_float(values):
+    return np.asarray(values, dtype=np.float64)
+
+
+def _ratio(numerator, denominator):
+    # numerator / denominator where the denominator is positive, 0 elsewhere
+    numerator, denominator = np.broadcast_arrays(_as_float(numerator), _as_float(denominator))
+    out = np.zeros(numerator.shape)
+    np.divide(numerator, denominator, out=out, where=denominator > 0)
+    return out
+
+
+def health_scores(balance, savings, income):
+    """Financial health score, 0-100, of every profile.
+
+    The score is the cash buffer (balance plus savings) as a percentage of
+    monthly income, capped at 100: a buffer of one month's income or more
+    scores full marks. Profiles without income score 0.
+    """
+    scores = _ratio(np.add(_as_float(balance), _as_float(savings)), income)
+    scores *= 100
+    return np.clip(scores, 0, 100, out=scores)
+
+
+def budget_remaining_ratios(income, expenses):
+    # Share of monthly income left after expenses, 0-1
+    ratios = _ratio(np.subtract(_as_float(income), _as_float(expenses)), income)
+    return np.clip(ratios, 0, 1, out=ratios)
+
+
+def savings_progress(savings, goal=DEFAULT_SAVINGS_GOAL):
+    # Share of the savings goal reached, 0-1
+    progress = _ratio(savings, goal)
+    return np.clip(progress, 0, 1, out=progress)
+
+
+def score_profiles(columns):
+    """Scores for a population of profiles given as a mapping of column name -> array.
+
+    Returns a dict of NumPy arrays: health_score, budget_remaining and
+    savings_progress, one value per profile.
+    """
+    missing = [name for name in PROFILE_COLUMNS if name not in columns]
+    if missing:
+        raise ValueError(f'Profile data is missing columns: {", ".join(missing)}')
+    goal = columns['savings_goal'] if 'savings_goal' in columns else DEFAULT_SAVINGS_GOAL
+    return {
+        'health_score': health_scores(columns['balance'], columns['savings'], columns['income']),
+        'budget_remaining': budget_remaining_ratios(columns['income'], columns['expenses']),
+        'savings_progress': savings_progress(columns['savings'], goal),
+    }
+
+
+def health_score(balance, savings, income):
+    # Single-user form used by the dashboard pages
+    return float(health_scores(balance, savings, income))
+
+
+def budget_remaining_ratio(income, expenses):
+    return float(budget_remaining_ratios(income, expenses))
+
+
+def _read_profiles(path):
+    if path.endswith('.parquet'):
+        import pyarrow.parquet as pq
+        return pq.read_table(path)
+    import pyarrow.csv as pacsv
+    numeric = pa.float64()
+    convert = pacsv.ConvertOptions(column_types={name: numeric for name in PROFILE_COLUMNS + ['savings_goal']})
+    return pacsv.read_csv(path, convert_options=convert)
+
+
+def _write_scores(table, path):
+    if path.endswith('.parquet'):
+        import pyarrow.parquet as pq
+        pq.write_table(table, path)
+    else:
+        import pyarrow.csv as pacsv
+        pacsv.write_csv(table, path)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Score a file of user profiles (CSV or Parquet).')
+    parser.add_argument('profiles', help=f'file with columns {", ".join(PROFILE_COLUMNS)} and optionally savings_goal')
+    parser.add_argument('--output', help='write the profiles with their scores to this CSV or Parquet file')
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    table = _read_profiles(args.profiles)
+    loaded = time.perf_counter()
+    columns = {name: table[name].to_numpy() for name in PROFILE_COLUMNS + ['savings_goal'] if name in table.column_names}
+    scores = score_profiles(columns)
+    scored = time.perf_counter()
+
+    print(f'{table.num_rows:,} profiles: read {loaded - started:.2f}s, scored {scored - loaded:.2f}s')
+    for name, values in scores.items():
+        print(f'{name:>17}: mean {values.mean():.3f}  p10 {np.percentile(values, 10):.3f}  '
+              f'p50 {np.percentile(values, 50):.3f}  p90 {np.percentile(values, 90):.3f}')
+    if args.output:
+        for name, values in scores.items():
+            table = table.append_column(name, pa.array(values))
+        _write_scores(table, args.output)
+        print(f'Wrote {args.output} in {time.perf_counter() - scored:.2f}s')
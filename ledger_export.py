@@ -0,0 +1,276 @@
+import argparse
+import os
+import tempfile
+import time
+from datetime import datetime
+from importlib.util import find_spec
+
+import numpy as np
+import pyarrow as pa
+import streamlit as st
+
+from analytics_jobs import clear_job, current_job, show_job, submit_job
+from expense_ledger import SCHEMA
+from ledger_store import DB_PATH, LedgerStore
+
+CHUNK_ROWS = 50_000  # rows read from SQLite and written per chunk; bounds memory regardless of ledger size
+EXCEL_MAX_ROWS = 1_048_575  # one sheet, minus the header row
+EXPORT_DIR = os.path.join(tempfile.gettempdir(), 'finance-exports')
+EXPORT_TTL = 3600  # seconds an exported file is kept for its download button
+# Larger exports are not offered in the browser: Streamlit sends a download button's whole file through
+# the server's memory. Those are left to the command line (python ledger_export.py)
+MAX_DOWNLOAD_MB = float(os.environ.get('FINANCE_MAX_DOWNLOAD_MB', 100))
+
+FORMATS = {'csv': 'text/csv', 'parquet': 'application/vnd.apache.parquet',
+           'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'}
+SUMMARY_SCHEMA = pa.schema([('month', pa.string()), ('category', pa.string()),
+                            ('expenses', pa.int64()), ('total', pa.float64())])
+
+# English labels; translations.json entries with the same keys take precedence
+DEFAULT_LABELS = {
+    'export_expenses': 'Export expenses',
+    'export_dates': 'Date range',
+    'export_categories': 'Categories (all if empty)',
+    'export_format': 'Format',
+    'export_button': 'Prepare export',
+    'export_progress': 'Exported {rows:,} rows',
+    'export_download': 'Download {rows:,} expenses',
+    'export_too_large': 'This export is {size:,.1f} MB, more than the {limit:g} MB offered for download here. '
+                        'Pick fewer dates or categories, or run python ledger_export.py on the server.',
+    'monthly_summary': 'Monthly summary',
+    'summary_download': 'Download monthly summary',
+}
+
+
+def _filters(user, start=None, end=None, categories=None):
+    # WHERE clause and parameters shared by the row export and the monthly summary; start and end are ms, end exclusive
+    where, params = ['user = ?'], [user]
+    if start is not None:
+        where.append('date >= ?')
+        params.append(start)
+    if end is not None:
+        where.append('date < ?')
+        params.append(end)
+    if categories:
+        where.append(f'name IN ({", ".join("?" * len(categories))})')
+        params.extend(categories)
+    return ' AND '.join(where), params
+
+
+def iter_expense_batches(store, user, start=None, end=None, categories=None, chunk_rows=CHUNK_ROWS):
+    """Yield a user's expenses as Arrow record batches of at most chunk_rows rows, oldest id first.
+
+    Each chunk is its own short query continuing after the last id seen, so
+    no read transaction stays open across the export and writers are never
+    blocked by it. Rows still waiting in the store's batch are written first.
+    """
+    store.flush()
+    where, params = _filters(user, start, end, categories)
+    last_id = 0
+    while True:
+        with store.pool.connection() as conn:
+            rows = conn.execute(f'SELECT id, name, amount, date FROM expenses WHERE {where} AND id > ? '
+                                f'ORDER BY id LIMIT ?', params + [last_id, chunk_rows]).fetchall()
+        if not rows:
+            return
+        ids, names, amounts, dates = zip(*rows)
+        yield pa.record_batch([
+            pa.array(names, pa.string()),
+            pa.array(amounts, pa.float64()),
+            pa.array(np.asarray(dates, dtype=np.int64).astype('datetime64[ms]')),
+        ], schema=SCHEMA)
+        last_id = ids[-1]
+
+
+def monthly_summary(store, user, start=None, end=None, categories=None):
+    # Expense count and total per month and category, aggregated by SQLite so no rows are loaded
+    store.flush()
+    where, params = _filters(user, start, end, categories)
+    with store.pool.connection() as conn:
+        rows = conn.execute(f"SELECT strftime('%Y-%m', date / 1000, 'unixepoch') AS month, name, COUNT(*), "
+                            f'ROUND(SUM(amount), 2) FROM expenses WHERE {where} '
+                            f'GROUP BY month, name ORDER BY month, name', params).fetchall()
+    return pa.Table.from_pylist([dict(zip(SUMMARY_SCHEMA.names, row)) for row in rows], schema=SUMMARY_SCHEMA)
+
+
+def _write_csv(batches, sink, schema):
+    import pyarrow.csv as pacsv
+    with pacsv.CSVWriter(sink, schema) as writer:
+        for batch in batches:
+            writer.write_batch(batch)
+            yield batch.num_rows
+
+
+def _write_parquet(batches, sink, schema):
+    import pyarrow.parquet as pq
+    with pq.ParquetWriter(sink, schema) as writer:
+        for batch in batches:
+            writer.write_batch(batch)  # one row group per chunk
+            yield batch.num_rows
+
+
+def _write_xlsx(batches, sink, schema):
+    try:
+        from openpyxl import Workbook
+    except ImportError:
+        raise ValueError('Excel export needs openpyxl (pip install openpyxl)') from None
+    # Write-only workbooks stream rows to a temporary file instead of keeping cell objects
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet()
+    sheet.append(schema.names)
+    written = 0
+    for batch in batches:
+        written += batch.num_rows
+        if written > EXCEL_MAX_ROWS:
+            raise ValueError(f'Excel sheets hold at most {EXCEL_MAX_ROWS:,} rows; export CSV or Parquet instead')
+        for row in zip(*(column.to_pylist() for column in batch.columns)):
+            sheet.append(row)
+        yield batch.num_rows
+    workbook.save(sink)
+
+
+WRITERS = {'csv': _write_csv, 'parquet': _write_parquet, 'xlsx': _write_xlsx}
+
+
+def available_formats():
+    return [fmt for fmt in FORMATS if fmt != 'xlsx' or find_spec('openpyxl') is not None]
+
+
+def write_batches(batches, sink, fmt='csv', schema=SCHEMA, progress=None):
+    """Stream record batches to sink (a path or binary file) as csv, parquet or xlsx; returns the row count.
+
+    Only one batch is held at a time, so memory stays flat however many
+    rows pass through. progress(rows_written) is called after each batch.
+    """
+    if fmt not in WRITERS:
+        raise ValueError(f'Unknown export format {fmt!r}; expected one of {", ".join(WRITERS)}')
+    rows = 0
+    for written in WRITERS[fmt](batches, sink, schema):
+        rows += written
+        if progress is not None:
+            progress(rows)
+    return rows
+
+
+def export_ledger(store, user, sink, fmt='csv', start=None, end=None, categories=None, chunk_rows=CHUNK_ROWS,
+                  progress=None):
+    # A user's expenses, filtered by date range (ms, end exclusive) and category, streamed to sink
+    batches = iter_expense_batches(store, user, start, end, categories, chunk_rows)
+    return write_batches(batches, sink, fmt, progress=progress)
+
+
+def _to_ms(day, days=0):
+    # Midnight at the start of a date (plus days), in the ledger's millisecond timestamps
+    return int(np.datetime64(day, 'D').astype('datetime64[ms]').astype(np.int64)) + days * 86_400_000
+
+
+def _prune_exports():
+    os.makedirs(EXPORT_DIR, exist_ok=True)
+    cutoff = time.time() - EXPORT_TTL
+    for entry in os.scandir(EXPORT_DIR):
+        if entry.is_file() and entry.stat().st_mtime < cutoff:
+            os.remove(entry.path)
+
+
+@st.cache_resource(max_entries=8, ttl=EXPORT_TTL, show_spinner=False)
+def _export_bytes(path, mtime):
+    # A finished export's file, read once for every rerun and session showing its download button
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def render_ledger_export(store, user, ledger, translations=None, key='ledger_export'):
+    # Filters and format, then the export runs as a background job into a temporary file offered for download
+    translations = translations or {}
+
+    def label(name):
+        return translations.get(name, DEFAULT_LABELS[name])
+
+    with st.expander(label('export_expenses')):
+        today = datetime.now().date()
+        dates = st.date_input(label('export_dates'), value=(), max_value=today, key=f'{key}_dates')
+        categories = st.multiselect(label('export_categories'), sorted(ledger.aggregates.by_category),
+                                    key=f'{key}_categories')
+        fmt = st.selectbox(label('export_format'), available_formats(), key=f'{key}_format')
+        start = _to_ms(dates[0]) if len(dates) > 0 else None
+        end = _to_ms(dates[-1], days=1) if len(dates) > 0 else None
+        categories = sorted(categories)
+        inputs = (user, start, end, tuple(categories), fmt)
+
+        if st.button(label('export_button'), key=f'{key}_button'):
+            def run_export(job):
+                _prune_exports()
+                fd, path = tempfile.mkstemp(suffix=f'.{fmt}', dir=EXPORT_DIR)
+                try:
+                    with os.fdopen(fd, 'wb') as sink:
+                        rows = export_ledger(store, user, sink, fmt, start, end, categories,
+                                             progress=lambda rows: job.report(0.0, rows))
+                except BaseException:
+                    os.remove(path)
+                    raise
+                return path, rows, monthly_summary(store, user, start, end, categories), inputs
+
+            # Keyed by the ledger version, so an unchanged ledger reuses the file already written
+            submit_job(key, ('ledger_export', ledger.version, *inputs), run_export)
+
+        job = current_job(key)
+        if job is None:
+            return
+        if job.key[2:] != inputs:
+            clear_job(key)  # filters or format changed since the click; an unfinished export is cancelled
+            return
+        if not job.done():
+            show_job(job, lambda result: st.rerun(),
+                     lambda job, previous: st.caption(label('export_progress').format(rows=job.partial or 0)))
+            return
+        if job.failed():
+            clear_job(key)
+            st.error(str(job.future.exception()))
+            return
+        path, rows, summary, inputs = job.result()
+        fmt = inputs[-1]  # the format the file was written in
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            clear_job(key)  # pruned; the next click writes it again
+            return
+        if stat.st_size > MAX_DOWNLOAD_MB * 2**20:
+            st.info(label('export_too_large').format(size=stat.st_size / 2**20, limit=MAX_DOWNLOAD_MB))
+        else:
+            st.download_button(label('export_download').format(rows=rows), _export_bytes(path, stat.st_mtime),
+                               file_name=f'expenses-{user}.{fmt}', mime=FORMATS[fmt], key=f'{key}_download')
+
+        st.subheader(label('monthly_summary'))
+        if summary.num_rows:
+            frame = summary.to_pandas()
+            st.dataframe(frame.pivot_table(index='month', columns='category', values='total', aggfunc='sum',
+                                           fill_value=0, margins=True, margins_name='Total'),
+                         use_container_width=True)
+            st.download_button(label('summary_download'), frame.to_csv(index=False), file_name=f'summary-{user}.csv',
+                               mime='text/csv', key=f'{key}_summary_download')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Stream a user's expenses to CSV, Parquet or Excel.")
+    parser.add_argument('output', help='file to write; the format follows the extension (.csv, .parquet, .xlsx)')
+    parser.add_argument('--user', default='default', help='user whose expenses are exported (store in FINANCE_DB)')
+    parser.add_argument('--start', help='first day to include, YYYY-MM-DD')
+    parser.add_argument('--end', help='last day to include, YYYY-MM-DD')
+    parser.add_argument('--category', action='append', help='only this category (repeatable)')
+    parser.add_argument('--summary', help='also write the monthly summary to this file')
+    parser.add_argument('--chunk-rows', type=int, default=CHUNK_ROWS)
+    args = parser.parse_args()
+
+    store = LedgerStore(DB_PATH)
+    start = _to_ms(args.start) if args.start else None
+    end = _to_ms(args.end, days=1) if args.end else None
+    fmt = os.path.splitext(args.output)[1].lstrip('.').lower()
+    started = time.perf_counter()
+    rows = export_ledger(store, args.user, args.output, fmt, start, end, args.category, args.chunk_rows,
+                         progress=lambda rows: print(f'\r{rows:,} rows written', end='', flush=True))
+    print(f'\r{rows:,} rows written to {args.output} in {time.perf_counter() - started:.1f}s')
+    if args.summary:
+        summary = monthly_summary(store, args.user, start, end, args.category)
+        fmt = os.path.splitext(args.summary)[1].lstrip('.').lower()
+        write_batches(summary.to_batches(), args.summary, fmt, schema=SUMMARY_SCHEMA)
+        print(f'{summary.num_rows:,} month/category rows written to {args.summary}')
@@ -0,0 +1,710 @@
+import atexit
+import os
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
+
+import numpy as np
+import pyarrow as pa
+import streamlit as st
+
+from expense_aggregates import ExpenseAggregates
+from expense_columns import ExpenseColumns
+from expense_ledger import SCHEMA, import_legacy_ledgers
+from memory_budget import MemoryBudget
+from recurring_schedule import RecurringRule
+
+# One SQLite file shared by every app process; data/ is next to the scripts unless FINANCE_DB says otherwise
+DB_PATH = os.environ.get(
+    'FINANCE_DB',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'finance.db'),
+)
+
+# Metrics kept per user, with the values a new user starts from
+COLD_CHUNK_ROWS = 50_000  # spilled rows read per query when a scan goes through all of them
+SORT_COLUMNS = ('date', 'name', 'amount')
+DEFAULT_METRICS = {'current_balance': 1200, 'total_savings': 5000, 'investment_value': 10000}
+
+_SCHEMA_SQL = """
+CREATE TABLE IF NOT EXISTS users (
+    user TEXT PRIMARY KEY,
+    rows INTEGER NOT NULL DEFAULT 0,
+    current_balance NUMERIC,
+    total_savings NUMERIC,
+    investment_value NUMERIC,
+    updated_at INTEGER
+);
+CREATE TABLE IF NOT EXISTS expenses (
+    id INTEGER PRIMARY KEY,
+    user TEXT NOT NULL,
+    name TEXT NOT NULL,
+    amount REAL NOT NULL,
+    date INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS expenses_user_id ON expenses (user, id);
+CREATE INDEX IF NOT EXISTS expenses_user_date ON expenses (user, date);
+CREATE INDEX IF NOT EXISTS expenses_user_name ON expenses (user, name);
+CREATE TABLE IF NOT EXISTS schedules (
+    id INTEGER PRIMARY KEY,
+    user TEXT NOT NULL,
+    name TEXT NOT NULL,
+    amount REAL NOT NULL,
+    kind TEXT NOT NULL,
+    every TEXT NOT NULL,
+    interval INTEGER NOT NULL,
+    start INTEGER NOT NULL,
+    until INTEGER
+);
+CREATE INDEX IF NOT EXISTS schedules_user ON schedules (user, id);
+CREATE TABLE IF NOT EXISTS imported_segments (
+    user TEXT NOT NULL,
+    segment TEXT NOT NULL,
+    PRIMARY KEY (user, segment)
+);
+"""
+
+
+def _to_ms(date):
+    # Naive wall-clock ms, like every other stored date: np.datetime64 takes the datetime as it reads, with no
+    # conversion from local time to UTC (an aware datetime keeps its own wall-clock time)
+    if getattr(date, 'tzinfo', None) is not None:
+        date = date.replace(tzinfo=None)
+    return int(np.datetime64(date, 'ms').astype(np.int64))
+
+
+def _in_period(date_ms, start=None, end=None):
+    return (start is None or date_ms >= start) and (end is None or date_ms < end)
+
+
+def _period_sql(user, max_id, start=None, end=None):
+    # WHERE clause for a user's expenses with id <= max_id dated in [start, end)
+    where, params = ['user = ?', 'id <= ?'], [user, max_id]
+    if start is not None:
+        where.append('date >= ?')
+        params.append(start)
+    if end is not None:
+        where.append('date < ?')
+        params.append(end)
+    return ' AND '.join(where), params
+
+
+class ConnectionPool:
+    """Bounded pool of SQLite connections for one process.
+
+    Connections are opened lazily, in autocommit mode with WAL journaling, so
+    readers never wait for the writer. A pool inherited through fork() is
+    discarded and opened again in the child.
+    """
+
+    def __init__(self, path, size=8, busy_timeout_ms=5000):
+        self.path = path
+        self.size = size
+        self.busy_timeout_ms = busy_timeout_ms
+        self._reset()
+
+    def _reset(self):
+        self._pid = os.getpid()
+        self._idle = queue.LifoQueue()
+        self._opened = 0
+        self._lock = threading.Lock()
+
+    def _open(self):
+        conn = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False)
+        conn.execute(f'PRAGMA busy_timeout = {self.busy_timeout_ms}')
+        conn.execute('PRAGMA journal_mode = WAL')
+        # WAL makes NORMAL safe against corruption; a power cut may lose the last transactions only
+        conn.execute('PRAGMA synchronous = NORMAL')
+        return conn
+
+    @contextmanager
+    def connection(self):
+        if os.getpid() != self._pid:
+            self._reset()
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                can_open = self._opened < self.size
+                if can_open:
+                    self._opened += 1
+            conn = self._open() if can_open else self._idle.get()
+        try:
+            yield conn
+        finally:
+            self._idle.put(conn)
+
+    @contextmanager
+    def transaction(self, committing=None):
+        # BEGIN IMMEDIATE takes the write lock up front instead of failing half-way on upgrade;
+        # committing, a context manager, is entered around the COMMIT only
+        with self.connection() as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                yield conn
+            except BaseException:
+                conn.execute('ROLLBACK')
+                raise
+            with committing if committing is not None else nullcontext():
+                conn.execute('COMMIT')
+
+
+class LedgerStore:
+    """Expenses, metrics and recurring rules of every user in one SQLite database.
+
+    Appended expenses and metric updates from all sessions of the process
+    are buffered and written together, one transaction per batch, so hundreds
+    of users cost a few write locks per second instead of one per change.
+    A batch is written when it reaches batch_size rows or flush_interval
+    seconds after its first change, whichever comes first.
+    """
+
+    def __init__(self, path=DB_PATH, pool_size=8, batch_size=256, flush_interval=0.5, memory=None):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.pool = ConnectionPool(path, pool_size)
+        with self.pool.connection() as conn:
+            conn.executescript(_SCHEMA_SQL)
+        self._pending = []  # (user, name, amount, date_ms, UserLedger whose aggregates already hold it, or None)
+        self._pending_metrics = {}  # user -> metrics
+        # The batch being written: still listed until its COMMIT, so it is never in neither place
+        self._inflight = []
+        self._inflight_metrics = {}
+        self._commits = 0  # odd while a batch commits; see unwritten()
+        self._timer = None
+        self._lock = threading.RLock()
+        self._write_lock = threading.Lock()
+        self._ledgers = {}
+        self._saved_metrics = {}
+        self.memory = memory or MemoryBudget()
+
+    def ledger(self, user):
+        with self._lock:
+            ledger = self._ledgers.get(user)
+            if ledger is None:
+                ledger = self._ledgers[user] = UserLedger(self, user)
+            return ledger
+
+    def forget(self, ledger):
+        """Drop an evicted ledger and its user's saved metrics; returns whether they were dropped.
+
+        Kept while the user has metrics not yet written, since saved metrics
+        are the base of the next save_metrics(). A session may still append
+        through a forgotten ledger until its next full rerun; its pending
+        rows carry that ledger, so they are marked counted there (insert()).
+        """
+        user = ledger.user
+        with self._lock:
+            if self._ledgers.get(user) is not ledger or user in self._pending_metrics or \
+                    user in self._inflight_metrics:
+                return False
+            del self._ledgers[user]
+            self._saved_metrics.pop(user, None)
+            return True
+
+    def add(self, user, name, amount, date=None, ledger=None):
+        # ledger: the UserLedger that already counted the row (see UserLedger.append)
+        with self._lock:
+            self._pending.append((user, name, float(amount), _to_ms(date or datetime.now()), ledger))
+            self._schedule_flush()
+
+    def _schedule_flush(self):
+        # Batches are written by a timer thread, never by the session that happened to fill them
+        full = len(self._pending) >= self.batch_size
+        if self._timer is not None and (not full or self._timer.interval == 0):
+            return
+        if self._timer is not None:
+            self._timer.cancel()
+        self._timer = threading.Timer(0 if full else self.flush_interval, self.flush)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def pending(self, user):
+        # Rows of a user this process has not committed yet: the batch being written, then the queued ones
+        with self._lock:
+            return [row[:4] for row in self._inflight + self._pending if row[0] == user]
+
+    def unwritten(self, user, read):
+        """(read(), pending(user)) as of one moment: no batch of this process committed in between.
+
+        read() queries SQLite; had a batch committed while it ran, its rows
+        could be counted both there and in pending(), or in neither. A
+        seqlock on the commits detects that and the pair is taken again.
+        """
+        while True:
+            commits = self._commits
+            if commits % 2:
+                time.sleep(0.001)  # a COMMIT is running; it takes milliseconds
+                continue
+            result, rows = read(), self.pending(user)
+            if self._commits == commits:
+                return result, rows
+
+    @contextmanager
+    def _publishing(self):
+        # Around a batch's COMMIT: the batch leaves _inflight only once it is visible in SQLite
+        self._commits += 1
+        try:
+            yield
+            with self._lock:
+                self._inflight, self._inflight_metrics = [], {}
+        finally:
+            self._commits += 1
+
+    def flush(self):
+        # _write_lock makes a flush wait for one already in progress, so nothing is in flight when it returns
+        with self._write_lock:
+            with self._lock:
+                if self._timer is not None:
+                    self._timer.cancel()
+                    self._timer = None
+                if not self._pending and not self._pending_metrics:
+                    return
+                self._inflight, self._pending = self._pending, []
+                self._inflight_metrics, self._pending_metrics = self._pending_metrics, {}
+                batch, metrics = self._inflight, self._inflight_metrics
+            # Written outside _lock so sessions can keep appending while SQLite waits for the write lock
+            try:
+                self.insert([row[:4] for row in batch], counted=[row[4] for row in batch], metrics=metrics,
+                            committing=self._publishing())
+            except BaseException:
+                with self._lock:
+                    self._pending[:0] = batch
+                    self._pending_metrics = {**metrics, **self._pending_metrics}
+                    self._inflight, self._inflight_metrics = [], {}
+                raise
+
+    def insert(self, rows, counted=None, metrics=None, committing=None, imported=None):
+        """Write (user, name, amount, date_ms) rows, and optionally user metrics, in one transaction.
+
+        counted lists, per row, the UserLedger whose append() already folded
+        it into its aggregates (or None); each id is handed to that ledger
+        before the commit so no reader can count it a second time. It may be
+        a ledger the store has since forgotten: the one that replaced it has
+        not counted the row and folds it in from SQLite.
+        imported lists the (user, segment) Arrow ledger files the rows come
+        from (see expense_ledger.import_legacy_ledgers).
+        """
+        counts = {}
+        for row in rows:
+            counts[row[0]] = counts.get(row[0], 0) + 1
+        marked = []
+        try:
+            with self.pool.transaction(committing) as conn:
+                if rows:
+                    conn.executemany('INSERT INTO expenses (user, name, amount, date) VALUES (?, ?, ?, ?)', rows)
+                    if counted:
+                        # One writer at a time, so the batch got consecutive ids ending at last_insert_rowid()
+                        first_id = conn.execute('SELECT last_insert_rowid()').fetchone()[0] - len(rows) + 1
+                        marked = self._mark_counted(counted, first_id)
+                    conn.executemany('INSERT INTO users (user, rows) VALUES (?, ?) '
+                                     'ON CONFLICT (user) DO UPDATE SET rows = rows + excluded.rows', counts.items())
+                if imported:
+                    conn.executemany('INSERT INTO imported_segments (user, segment) VALUES (?, ?)', imported)
+                if metrics:
+                    updates = ', '.join(f'{key} = excluded.{key}' for key in DEFAULT_METRICS)
+                    now = int(time.time() * 1000)
+                    conn.executemany(
+                        f'INSERT INTO users (user, {", ".join(DEFAULT_METRICS)}, updated_at) '
+                        f'VALUES (?, {", ".join("?" * len(DEFAULT_METRICS))}, ?) '
+                        f'ON CONFLICT (user) DO UPDATE SET {updates}, updated_at = excluded.updated_at',
+                        [(user, *(values[key] for key in DEFAULT_METRICS), now) for user, values in metrics.items()])
+        except BaseException:
+            # Rolled back: the ids may be handed out again to other rows
+            for ledger, row_id in marked:
+                ledger._counted_ids.discard(row_id)
+            raise
+
+    def _mark_counted(self, ledgers, first_id):
+        marked = []
+        for row_id, ledger in enumerate(ledgers, first_id):
+            if ledger is not None:
+                ledger._counted_ids.add(row_id)
+                marked.append((ledger, row_id))
+        return marked
+
+    def imported_segments(self, user):
+        with self.pool.connection() as conn:
+            return {row[0] for row in conn.execute('SELECT segment FROM imported_segments WHERE user = ?', (user,))}
+
+    def row_count(self, user):
+        with self.pool.connection() as conn:
+            found = conn.execute('SELECT rows FROM users WHERE user = ?', (user,)).fetchone()
+        return found[0] if found else 0
+
+    def rows_after(self, user, last_id):
+        # Committed expenses of a user with id > last_id, oldest first
+        with self.pool.connection() as conn:
+            return conn.execute('SELECT id, name, amount, date FROM expenses WHERE user = ? AND id > ? ORDER BY id',
+                                (user, last_id)).fetchall()
+
+    def expense_rows(self, user, max_id, start=None, end=None):
+        # (name, amount, date) of expenses with id <= max_id dated in [start, end), oldest first
+        where, params = _period_sql(user, max_id, start, end)
+        with self.pool.connection() as conn:
+            return conn.execute(f'SELECT name, amount, date FROM expenses WHERE {where} ORDER BY date, id',
+                                params).fetchall()
+
+    def expense_totals(self, user, max_id, start=None, end=None):
+        # (name, total, count) per category of the same rows, summed by SQLite
+        where, params = _period_sql(user, max_id, start, end)
+        with self.pool.connection() as conn:
+            return conn.execute(f'SELECT name, SUM(amount), COUNT(*) FROM expenses WHERE {where} GROUP BY name',
+                                params).fetchall()
+
+    def expense_chunks(self, user, max_id, start=None, end=None, chunk_rows=COLD_CHUNK_ROWS):
+        # The same rows as Arrow tables of at most chunk_rows, oldest id first, each from its own short query
+        where, params = _period_sql(user, max_id, start, end)
+        last_id = 0
+        while True:
+            with self.pool.connection() as conn:
+                rows = conn.execute(f'SELECT id, name, amount, date FROM expenses WHERE {where} AND id > ? '
+                                    f'ORDER BY id LIMIT ?', params + [last_id, chunk_rows]).fetchall()
+            if not rows:
+                return
+            ids, names, amounts, dates = zip(*rows)
+            yield pa.table([pa.array(names, pa.string()), pa.array(amounts, pa.float64()),
+                            pa.array(np.asarray(dates, np.int64).astype('datetime64[ms]'))], schema=SCHEMA)
+            last_id = ids[-1]
+
+    def expense_page(self, user, max_id, start=None, end=None, name_filter='', min_amount=None, max_amount=None,
+                     sort_by='date', descending=True, limit=50):
+        """(table, matching, total) of the same rows, filtered, sorted and cut to `limit` by SQLite.
+
+        Filters as in expense_table.query_expenses: name_filter is a
+        case-insensitive substring, the amounts are inclusive bounds. matching
+        counts the rows passing the filters, total every row in the range.
+        """
+        if sort_by not in SORT_COLUMNS:
+            raise ValueError(f'Unknown sort column {sort_by!r}; expected one of {", ".join(SORT_COLUMNS)}')
+        where, params = _period_sql(user, max_id, start, end)
+        with self.pool.connection() as conn:
+            total = conn.execute(f'SELECT COUNT(*) FROM expenses WHERE {where}', params).fetchone()[0]
+            if name_filter:
+                escaped = name_filter.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+                where += " AND name LIKE ? ESCAPE '\\'"
+                params = params + [f'%{escaped}%']
+            for bound, op in ((min_amount, '>='), (max_amount, '<=')):
+                if bound is not None:
+                    where += f' AND amount {op} ?'
+                    params = params + [bound]
+            matching = conn.execute(f'SELECT COUNT(*) FROM expenses WHERE {where}', params).fetchone()[0]
+            order = 'DESC' if descending else 'ASC'
+            rows = conn.execute(f'SELECT name, amount, date FROM expenses WHERE {where} '
+                                f'ORDER BY {sort_by} {order}, id {order} LIMIT ?', params + [limit]).fetchall()
+        names, amounts, dates = zip(*rows) if rows else ((), (), ())
+        table = pa.table([pa.array(names, pa.string()), pa.array(amounts, pa.float64()),
+                          pa.array(np.asarray(dates, np.int64).astype('datetime64[ms]'))], schema=SCHEMA)
+        return table, matching, total
+
+    def daily_totals(self, user, max_id, start=None, end=None):
+        # (midnight ms, total) per day of the same rows, oldest first, summed by SQLite
+        where, params = _period_sql(user, max_id, start, end)
+        with self.pool.connection() as conn:
+            return conn.execute(f'SELECT date - date % 86400000 AS day, SUM(amount) FROM expenses WHERE {where} '
+                                f'GROUP BY day ORDER BY day', params).fetchall()
+
+    def first_date(self, user, max_id):
+        where, params = _period_sql(user, max_id)
+        with self.pool.connection() as conn:
+            return conn.execute(f'SELECT MIN(date) FROM expenses WHERE {where}', params).fetchone()[0]
+
+    def load_metrics(self, user):
+        with self._lock:
+            for unwritten in (self._pending_metrics, self._inflight_metrics):
+                if user in unwritten:
+                    return dict(unwritten[user])
+        with self.pool.connection() as conn:
+            found = conn.execute(f'SELECT {", ".join(DEFAULT_METRICS)} FROM users WHERE user = ?', (user,)).fetchone()
+        metrics = dict(DEFAULT_METRICS)
+        if found:
+            metrics.update({key: value for key, value in zip(DEFAULT_METRICS, found) if value is not None})
+        with self._lock:
+            self._saved_metrics[user] = metrics
+        return dict(metrics)
+
+    def schedules(self, user):
+        # The user's recurring rules (see recurring_schedule), oldest first; one indexed read of a few rows
+        with self.pool.connection() as conn:
+            rows = conn.execute(f'SELECT {", ".join(RecurringRule._fields)} FROM schedules WHERE user = ? ORDER BY id',
+                                (user,)).fetchall()
+        return tuple(RecurringRule(*row) for row in rows)
+
+    def add_schedule(self, user, rule):
+        # Written at once, not batched: rules change rarely and every session should see them on its next rerun
+        fields = RecurringRule._fields[1:]
+        with self.pool.transaction() as conn:
+            cursor = conn.execute(f'INSERT INTO schedules (user, {", ".join(fields)}) '
+                                  f'VALUES (?, {", ".join("?" * len(fields))})', (user, *rule[1:]))
+        return cursor.lastrowid
+
+    def delete_schedule(self, user, rule_id):
+        with self.pool.transaction() as conn:
+            conn.execute('DELETE FROM schedules WHERE user = ? AND id = ?', (user, rule_id))
+
+    def save_metrics(self, user, **metrics):
+        # Queued with the next expense batch, and only when something changed since the last load or save
+        saved = self._saved_metrics.get(user)
+        if saved is None:
+            saved = self.load_metrics(user)  # never loaded, or forgotten since: the rest stays as stored
+        metrics = {**DEFAULT_METRICS, **saved, **metrics}
+        with self._lock:
+            if self._saved_metrics.get(user) == metrics:
+                return
+            self._saved_metrics[user] = self._pending_metrics[user] = metrics
+            self._schedule_flush()
+
+
+class UserLedger:
+    """One user's expenses in a LedgerStore.
+
+    Expenses are append-only, so the in-memory columns and the aggregates
+    are built once and then extended with only the rows whose id is above
+    the last one seen, whichever process wrote them. The columns are
+    dictionary-encoded and kept in date order (see ExpenseColumns), and
+    table() is a zero-copy Arrow view of them, of the whole ledger or of one
+    date range. The aggregates object is updated in place, including by
+    append(); period_aggregates() totals a date range.
+
+    The columns are only a cache of SQLite, bounded by the store's
+    MemoryBudget: spill() drops the oldest rows (reads before _cold_before
+    go to SQLite) and evict() drops them all until the ledger is used
+    again. A spilled ledger keeps its aggregates; an evicted one is usually
+    forgotten by the store (see LedgerStore.forget) and dropped with them.
+    """
+
+    def __init__(self, store, user):
+        self.store = store
+        self.user = user
+        # No Arrow table until table() is called: creating any Arrow table makes pyarrow import pandas
+        self._columns = ExpenseColumns()
+        self._aggregates = ExpenseAggregates()
+        self._counted_ids = set()  # written by append(), already in the aggregates
+        self._last_id = 0
+        self._cold_before = None  # ms; rows dated earlier were spilled and are read from SQLite
+        self._resident = True  # False once evicted, until the columns are rebuilt
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self.version
+
+    def __bool__(self):
+        return len(self) > 0
+
+    @property
+    def version(self):
+        # Committed rows (one primary-key lookup) plus this process's unwritten ones, in flight or queued
+        committed, pending = self.store.unwritten(self.user, lambda: self.store.row_count(self.user))
+        return committed + len(pending)
+
+    def append(self, name, amount, date=None):
+        with self._lock:
+            self._aggregates.add(name, amount)
+        self.store.add(self.user, name, amount, date, ledger=self)
+
+    def append_batch(self, batch):
+        table = pa.Table.from_batches([batch]) if isinstance(batch, pa.RecordBatch) else batch
+        self.flush()
+        self.store.insert(self._rows(table.cast(SCHEMA)))
+
+    def _rows(self, table):
+        dates = table.column('date').cast(pa.int64()).to_pylist()
+        return list(zip([self.user] * table.num_rows, table.column('name').to_pylist(),
+                        table.column('amount').to_pylist(), dates))
+
+    @contextmanager
+    def segment_writer(self):
+        # Imports write through this: every written table commits on its own
+        self.flush()
+        yield _LedgerWriter(self)
+
+    def flush(self):
+        self.store.flush()
+
+    def _refresh(self):
+        with self._lock:
+            self._load()
+        self.store.memory.touch(self)
+
+    def _unwritten(self, start=None, end=None):
+        # Under _lock: fold in the committed rows and return the unwritten ones dated in [start, end), both
+        # as of one moment (see LedgerStore.unwritten), so a batch committing meanwhile is counted exactly once
+        _, rows = self.store.unwritten(self.user, self._load)
+        return [row for row in rows if _in_period(row[3], start, end)]
+
+    def _load(self):
+        # Under _lock: rebuild evicted columns, then fold in the rows written since the last call
+        if not self._resident:
+            rows = self.store.expense_rows(self.user, self._last_id, self._cold_before)
+            self._columns = ExpenseColumns()
+            if rows:
+                self._columns.extend(*zip(*rows))
+            self._resident = True
+        rows = self.store.rows_after(self.user, self._last_id)
+        if not rows:
+            return
+        ids, names, amounts, dates = zip(*rows)
+        codes, amounts, dates = self._columns.encode(names), np.asarray(amounts, np.float64), np.asarray(dates, np.int64)
+        hot = dates >= self._cold_before if self._cold_before is not None else slice(None)
+        self._columns.extend_codes(codes[hot], amounts[hot], dates[hot])
+        if self._counted_ids:
+            keep = np.fromiter((row_id not in self._counted_ids for row_id in ids), bool, len(ids))
+            self._counted_ids.difference_update(ids)
+            codes, amounts = codes[keep], amounts[keep]
+        self._aggregates.add_codes(self._columns.categories, codes, amounts)
+        self._last_id = ids[-1]
+
+    @property
+    def nbytes(self):
+        return self._columns.nbytes if self._resident else 0
+
+    def spill(self, target_bytes):
+        # Drop the oldest rows until the columns fit in target_bytes; they stay in SQLite
+        with self._lock:
+            size = len(self._columns)
+            if not self._resident or size < 2 or self._columns.nbytes <= target_bytes:
+                return
+            keep = max(1, min(size - 1, int(size * target_bytes / self._columns.nbytes)))
+            cutoff = int(self._columns.dates[size - keep])
+            if self._columns.drop_before(cutoff):
+                self._cold_before = cutoff
+
+    def evict(self):
+        with self._lock:
+            self._columns = ExpenseColumns(capacity=0)
+            self._resident = False
+
+    def _cold(self, start=None, end=None):
+        # The part of [start, end) that was spilled, or None
+        if self._cold_before is None or (start is not None and start >= self._cold_before):
+            return None
+        return start, self._cold_before if end is None else min(end, self._cold_before)
+
+    def table(self, start=None, end=None):
+        """Committed rows plus any rows of this user still waiting for the next batch write, as a second chunk.
+
+        start and end (ms, end exclusive) limit the table to a date range;
+        it is found by binary search and sliced without copying, so the cost
+        follows the rows in the range, not the size of the ledger. Spilled
+        rows in the range are read back from SQLite into the second chunk, all
+        of them: scans over a spilled ledger use split() instead.
+        """
+        with self._lock:
+            extra = [row[1:] for row in self._unwritten(start, end)]
+            cold = self._cold(start, end)
+            if cold is not None:
+                extra[:0] = self.store.expense_rows(self.user, self._last_id, *cold)
+            table = self._columns.to_arrow(self._columns.date_slice(start, end),
+                                           extra=tuple(zip(*extra)) if extra else None)
+        self.store.memory.touch(self)
+        return table
+
+    def split(self, start=None, end=None, cold=None):
+        """(table, cold(max_id, cold_start, cold_end)) of the expenses dated in [start, end), as of one moment.
+
+        table is table() without the spilled rows. Those are left to cold,
+        called only when part of the range was spilled (None otherwise) with
+        the bounds of that part, to page, sort or sum them in SQLite (see the
+        LedgerStore queries taking max_id) instead of reading them all. A
+        generator's queries run later, still on the same rows.
+        """
+        with self._lock:
+            extra = [row[1:] for row in self._unwritten(start, end)]
+            table = self._columns.to_arrow(self._columns.date_slice(start, end),
+                                           extra=tuple(zip(*extra)) if extra else None)
+            spilled = self._cold(start, end)
+            spilled = cold(self._last_id, *spilled) if spilled is not None and cold is not None else None
+        self.store.memory.touch(self)
+        return table, spilled
+
+    def period_aggregates(self, start=None, end=None):
+        # Totals of the expenses dated in [start, end) (ms), from one bincount over the rows of the range
+        aggregates = ExpenseAggregates()
+        with self._lock:
+            pending = self._unwritten(start, end)
+            rows = self._columns.date_slice(start, end)
+            aggregates.add_codes(self._columns.categories, self._columns.codes[rows], self._columns.amounts[rows])
+            cold = self._cold(start, end)
+            if cold is not None:
+                aggregates.add_grouped(*zip(*self.store.expense_totals(self.user, self._last_id, *cold)))
+        self.store.memory.touch(self)
+        for _, name, amount, _ in pending:
+            aggregates.add(name, amount)
+        return aggregates
+
+    def date_span(self):
+        # (first, last) expense date in ms, or None for an empty ledger
+        with self._lock:
+            dates = [row[3] for row in self._unwritten()]
+            dates.extend(self._columns.date_span() or ())
+            if self._cold_before is not None:
+                dates.append(self.store.first_date(self.user, self._last_id))
+        self.store.memory.touch(self)
+        dates = [date for date in dates if date is not None]
+        return (min(dates), max(dates)) if dates else None
+
+    @property
+    def aggregates(self):
+        # Kept current by append() and by folding in rows other sessions and processes wrote
+        self._refresh()
+        return self._aggregates
+
+    def to_frame(self):
+        # Written rows as a read-only pandas view of the columns, names as a Categorical; a copy once rows spilled
+        self.flush()
+        self._refresh()
+        with self._lock:
+            self._load()
+            if self._cold_before is None:
+                return self._columns.to_frame()
+        return self.table().to_pandas()
+
+
+class _LedgerWriter:
+    def __init__(self, ledger):
+        self.ledger = ledger
+
+    def write_table(self, table):
+        self.ledger.store.insert(self.ledger._rows(table.cast(SCHEMA)))
+
+    def write_batch(self, batch):
+        self.write_table(pa.Table.from_batches([batch]))
+
+
+@st.cache_resource
+def get_store(path=DB_PATH):
+    store = LedgerStore(path)
+    # Expenses saved by the Arrow ledger before the move to SQLite, copied over on the first start
+    import_legacy_ledgers(store)
+    # Expenses still buffered when the server stops are written out on exit
+    atexit.register(store.flush)
+    return store
+
+
+def current_user():
+    # No sign-in yet: the user is picked with ?user=<name>, everyone else shares "default"
+    return st.query_params.get('user', 'default')
+
+
+def sync_metrics(store, user, state=None):
+    """Save the metrics this session changed and take over the ones another session saved.
+
+    state (st.session_state by default) remembers the values it last
+    synced. A metric that differs from them was edited here and is saved;
+    every other metric is reloaded, so a session that only reruns never
+    writes its possibly stale copy over a newer value.
+    """
+    state = st.session_state if state is None else state
+    synced = state.get('_synced_metrics', {})
+    changed = {key: state[key] for key in DEFAULT_METRICS if key in synced and state.get(key) != synced[key]}
+    if changed:
+        store.save_metrics(user, **changed)
+    stored = store.load_metrics(user)
+    for key in DEFAULT_METRICS:
+        state[key] = changed.get(key, stored[key])
+    state['_synced_metrics'] = {key: state[key] for key in DEFAULT_METRICS}
@@ -0,0 +1,81 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+# Budgets for the expense rows held in memory, overridable per deployment
+LEDGER_BUDGET_MB = float(os.environ.get('FINANCE_LEDGER_BUDGET_MB', 64))  # one user's ledger, shared by their sessions
+TOTAL_BUDGET_MB = float(os.environ.get('FINANCE_MEMORY_BUDGET_MB', 512))  # every ledger of the process
+IDLE_SECONDS = float(os.environ.get('FINANCE_IDLE_SECONDS', 1800))  # unused this long, a ledger is evicted
+SWEEP_INTERVAL = 5.0  # seconds between checks for idle ledgers
+
+
+class MemoryBudget:
+    """Per-ledger and process-wide caps on the expense rows held in memory.
+
+    Ledgers call touch() whenever they are used. Every row is already in
+    SQLite, so holding less in memory never loses data:
+
+    - a ledger above ledger_bytes spills its oldest rows (down to half the
+      budget); they are read back from SQLite only by queries that reach
+      back that far
+    - ledgers unused for idle_seconds, and the least recently used ones
+      while the total is above total_bytes, are evicted: their columns are
+      dropped and the store forgets the ledger and the user's saved metrics
+      (LedgerStore.forget), so users who left cost no memory at all; the
+      next visit builds them again from SQLite
+
+    A spilled ledger keeps its aggregates, so its Dashboard totals are still
+    answered from memory.
+    """
+
+    def __init__(self, ledger_mb=LEDGER_BUDGET_MB, total_mb=TOTAL_BUDGET_MB, idle_seconds=IDLE_SECONDS):
+        self.ledger_bytes = int(ledger_mb * 2**20)
+        self.total_bytes = int(total_mb * 2**20)
+        self.idle_seconds = idle_seconds
+        self.spills = 0
+        self.evictions = 0
+        self._used = OrderedDict()  # resident ledger -> last use (monotonic), least recently used first
+        self._last_sweep = time.monotonic()
+        self._lock = threading.Lock()
+
+    @property
+    def nbytes(self):
+        with self._lock:
+            ledgers = list(self._used)
+        return sum(ledger.nbytes for ledger in ledgers)
+
+    def touch(self, ledger):
+        # Called without the ledger's own lock held: spilling and evicting take ledger locks
+        now = time.monotonic()
+        with self._lock:
+            self._used[ledger] = now
+            self._used.move_to_end(ledger)
+            sweep = now - self._last_sweep >= SWEEP_INTERVAL
+        if ledger.nbytes > self.ledger_bytes:
+            ledger.spill(self.ledger_bytes // 2)
+            self.spills += 1
+        if sweep or self.nbytes > self.total_bytes:
+            self.sweep(now, keep=ledger)
+
+    def sweep(self, now=None, keep=None):
+        """Evict idle ledgers, then least recently used ones until the total fits; keep is never evicted."""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            self._last_sweep = now
+            used = list(self._used.items())
+        total = sum(ledger.nbytes for ledger, _ in used)
+        for ledger, last_used in used:
+            if ledger is keep:
+                continue
+            if now - last_used < self.idle_seconds and total <= self.total_bytes:
+                break  # ordered by last use, so every later ledger is newer still
+            total -= ledger.nbytes
+            self.evict(ledger)
+
+    def evict(self, ledger):
+        with self._lock:
+            self._used.pop(ledger, None)
+        ledger.evict()
+        ledger.store.forget(ledger)
+        self.evictions += 1
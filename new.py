@@ -1,7 +1,20 @@
+from datetime import date
+
 import streamlit as st
-import pandas as pd
-import numpy as np
-import plotly.graph_objs as go
+from ledger_store import current_user, get_store, sync_metrics
+from statement_import import render_statement_import
+from ledger_export import render_ledger_export
+from expense_periods import render_period_picker
+from recurring_schedule import forecast_window, render_recurring_rules, rest_of_month, scheduled_totals
+from figure_cache import figure_key, get_figure_cache
+from analytics_jobs import show_job, submit_job
+from health_score import budget_remaining_ratio, health_score, savings_progress
+from suggestion_rules import get_suggestion_rules
+from fragment_sections import notify, rerun_app_on_change, show_notices
+from rerun_profiler import begin_rerun, profile_section, profiled, render_profiler_panel
+
+# Per-section timings, shown in a hidden sidebar panel with ?debug=1
+begin_rerun()
 
 # Custom CSS for a modern UI
 st.markdown(
@@ -59,122 +72,268 @@ if st.sidebar.button('Dashboard'):
 if st.sidebar.button('Graphs'):
     st.session_state.page = "Graphs"
 
-# Initialize session state for financial metrics if not already done
-if 'current_balance' not in st.session_state:
-    st.session_state.current_balance = 1200  # Default current balance
-if 'total_savings' not in st.session_state:
-    st.session_state.total_savings = 5000  # Default total savings
-if 'investment_value' not in st.session_state:
-    st.session_state.investment_value = 10000  # Default investment value
-if 'expenses' not in st.session_state:
-    st.session_state.expenses = []  # Initialize empty list for expenses
+# Financial metrics and expenses live in the shared store; a new session starts from the user's saved values
+store = get_store()
+user = current_user()
+# This user's expenses, shared by all their sessions; looked up again on every rerun, since the store
+# forgets the ledgers of users who went idle
+st.session_state.expenses = store.ledger(user)
+sync_metrics(store, user)  # Also picks up metrics another session of this user saved since the last rerun
+if 'monthly_income' not in st.session_state:
+    st.session_state.monthly_income = 2000  # Default monthly income
+expense_totals = st.session_state.expenses.aggregates  # Running totals, updated in O(1) per added expense
 
-if st.session_state.page == "Dashboard":
-    # Title and Header
-    st.title('💰 Personal Financial Dashboard')
-    st.header('📊 Overview of Your Financial Health')
+# Dashboard sections run as fragments: a widget inside one reruns only that section.
+# Sections that change state read elsewhere (metrics, goal, expenses) trigger a full rerun.
+@st.fragment
+@profile_section('metrics')
+def metrics_section():
+    with rerun_app_on_change(lambda: (st.session_state.current_balance, st.session_state.total_savings, st.session_state.investment_value)):
+        # Financial Metrics Input
+        st.subheader('💸 Update Your Financial Metrics')
+        st.session_state.current_balance = st.number_input('Current Balance (GHS)', min_value=0, value=st.session_state.current_balance)
+        st.session_state.total_savings = st.number_input('Total Savings (GHS)', min_value=0, value=st.session_state.total_savings)
+        st.session_state.investment_value = st.number_input('Investment Value (GHS)', min_value=0, value=st.session_state.investment_value)
+        sync_metrics(store, user)  # Saves only the metrics edited in this session
 
-    # Financial Metrics Input
-    st.subheader('💸 Update Your Financial Metrics')
-    st.session_state.current_balance = st.number_input('Current Balance (GHS)', min_value=0, value=st.session_state.current_balance)
-    st.session_state.total_savings = st.number_input('Total Savings (GHS)', min_value=0, value=st.session_state.total_savings)
-    st.session_state.investment_value = st.number_input('Investment Value (GHS)', min_value=0, value=st.session_state.investment_value)
+        # Financial Metrics Display
+        st.subheader('📈 Key Financial Metrics')
+        col1, col2, col3 = st.columns(3)
+        col1.metric("Current Balance", f"GHS {st.session_state.current_balance}")
+        col2.metric("Total Savings", f"GHS {st.session_state.total_savings}")
+        col3.metric("Investment Value", f"GHS {st.session_state.investment_value}")
 
-    # Financial Metrics Display
-    st.subheader('📈 Key Financial Metrics')
-    col1, col2, col3 = st.columns(3)
-    col1.metric("Current Balance", f"GHS {st.session_state.current_balance}")
-    col2.metric("Total Savings", f"GHS {st.session_state.total_savings}")
-    col3.metric("Investment Value", f"GHS {st.session_state.investment_value}")
-
-    # Financial Goals Section
-    st.subheader('🎯 Set Your Financial Goals')
-    goal = st.selectbox('Choose a financial goal:', ['Emergency Fund', 'Home Purchase', 'Retirement', 'Debt Repayment'])
-    goal_amount = st.number_input('Enter your goal amount (GHS)', min_value=0, value=1000)
-
-    # Financial Goals Explanation
-    if goal == 'Emergency Fund':
-        st.write('💡 You need to save at least 3-6 months of living expenses.')
-    elif goal == 'Home Purchase':
-        st.write('🏡 You should aim to save for a down payment (typically 20% of the home value).')
-    elif goal == 'Retirement':
-        st.write('📅 Consider saving 15% of your income towards retirement.')
-    else:
-        st.write('🚀 Focus on paying off high-interest debt first.')
-
-    # Expense Tracking Section
-    st.subheader('📝 Track Your Expenses')
-    with st.form("expense_form"):
-        expense_name = st.text_input('Expense Name', 'Rent')
-        expense_amount = st.number_input('Expense Amount (GHS)', min_value=0, max_value=10000, value=1000)
-        add_expense = st.form_submit_button('➕ Add Expense')
-
-    # Add expense to session state
-    if add_expense:
-        st.session_state.expenses.append({'name': expense_name, 'amount': expense_amount})
-        st.success(f'✅ Added {expense_name} with amount GHS {expense_amount}')
-
-    # Display expenses
-    if st.session_state.expenses:
-        st.subheader('📋 Your Expenses')
-        expense_df = pd.DataFrame(st.session_state.expenses)
-        st.table(expense_df)
-        st.metric("Total Expenses", f"GHS {expense_df['amount'].sum()}")
 
+@st.fragment
+@profile_section('goals')
+def goals_section():
+    # The advice further down the page depends on the goal, but not on the amount
+    with rerun_app_on_change(lambda: st.session_state.get('goal')):
+        # Financial Goals Section
+        st.subheader('🎯 Set Your Financial Goals')
+        goal = st.selectbox('Choose a financial goal:', ['Emergency Fund', 'Home Purchase', 'Retirement', 'Debt Repayment'], key='goal')
+        goal_amount = st.number_input('Enter your goal amount (GHS)', min_value=0, value=1000)
+        st.session_state.goal_target = goal_amount  # Projected on the Graphs page
+
+        # Financial Goals Explanation
+        if goal == 'Emergency Fund':
+            st.write('💡 You need to save at least 3-6 months of living expenses.')
+        elif goal == 'Home Purchase':
+            st.write('🏡 You should aim to save for a down payment (typically 20% of the home value).')
+        elif goal == 'Retirement':
+            st.write('📅 Consider saving 15% of your income towards retirement.')
+        else:
+            st.write('🚀 Focus on paying off high-interest debt first.')
+    return goal
+
+
+@st.fragment
+@profile_section('expenses')
+def expenses_section(expense_totals):
+    with rerun_app_on_change(lambda: (st.session_state.expenses.version, store.schedules(user))):
+        # Expense Tracking Section
+        st.subheader('📝 Track Your Expenses')
+        show_notices()
+        with st.form("expense_form"):
+            expense_name = st.text_input('Expense Name', 'Rent')
+            expense_amount = st.number_input('Expense Amount (GHS)', min_value=0, max_value=10000, value=1000)
+            add_expense = st.form_submit_button('➕ Add Expense')
+
+        # Add expense to session state
+        if add_expense:
+            st.session_state.expenses.append(expense_name, expense_amount)
+            notify(f'✅ Added {expense_name} with amount GHS {expense_amount}')
+
+        # Rent, salary and other rules that repeat, forecast on the Graphs page
+        render_recurring_rules(store, user, notify=notify)
+
+        # Bulk import of bank / mobile-money statements
+        render_statement_import(st.session_state.expenses, notify=notify)
+
+        # Filtered CSV / Parquet / Excel export and a monthly summary
+        render_ledger_export(store, user, st.session_state.expenses)
+
+        # Display expenses
+        if expense_totals.count:
+            st.subheader('📋 Your Expenses')
+            from expense_table import render_expense_table
+            with profiled('expense_table'):
+                render_expense_table(st.session_state.expenses)
+            # Totals of one month, quarter, year or date range; the ledger is date-sorted, so only its rows are read
+            period = render_period_picker(st.session_state.expenses, key='dashboard_period')
+            period_totals = st.session_state.expenses.period_aggregates(period.start, period.end) if period.start is not None else expense_totals
+            st.metric(f"Total Expenses ({period.label})", f"GHS {period_totals.total:,.2f}")
+
+
+@st.fragment
+@profile_section('budget')
+def budget_section(expense_totals, goal):
     # Monthly Budget Progress
     st.subheader('📊 Monthly Budget Progress')
-    monthly_income = st.slider('Enter your monthly income (GHS)', 500, 10000, 2000)
-    total_expenses = expense_df['amount'].sum() if st.session_state.expenses else 0
-    budget_remaining = monthly_income - total_expenses
-    st.progress(budget_remaining / monthly_income)
+    monthly_income = st.slider('Enter your monthly income (GHS)', 500, 10000, st.session_state.monthly_income)
+    st.session_state.monthly_income = monthly_income
+    total_expenses = expense_totals.total
+    # Recurring rules still due this month count towards the budget
+    scheduled_expenses, scheduled_income = scheduled_totals(store.schedules(user), *rest_of_month())
+    st.progress(budget_remaining_ratio(monthly_income + scheduled_income, total_expenses + scheduled_expenses))
+    if scheduled_expenses or scheduled_income:
+        st.caption(f'Still scheduled this month: GHS {scheduled_expenses:,.2f} out, GHS {scheduled_income:,.2f} in')
 
     # Savings & Investment Advice
     st.subheader('💡 Savings and Investment Suggestions')
     st.write('Based on your goal and current balance, here are some suggestions:')
-    if goal == 'Emergency Fund':
-        st.write('🌟 Try to save GHS 500 more this month to reach your goal faster.')
-    elif goal == 'Home Purchase':
-        st.write('💼 Invest in a high-yield savings account or consider low-risk investments.')
+    suggestion, tip = get_suggestion_rules().advice(goal, st.session_state.current_balance)
+    if suggestion:
+        st.write(f'🌟 {suggestion}')
+    if tip:
+        st.write(f'💼 {tip}')
 
     # Financial Health Score
     st.subheader('🏆 Your Financial Health Score')
-    health_score = min(100, max(0, ((st.session_state.current_balance + st.session_state.total_savings) / (monthly_income + 1)) * 100))
-    st.metric("Financial Health Score", f"{int(health_score)}/100")
+    score = health_score(st.session_state.current_balance, st.session_state.total_savings, monthly_income)
+    st.metric("Financial Health Score", f"{int(score)}/100")
+
+
+@st.fragment
+@profile_section('balance_chart')
+def balance_chart_section(ledger_version, period):
+    # Balance history from the ledger, anchored on the current balance
+    import plotly.graph_objs as go
+    from cash_flow import RESOLUTIONS, balance_forecast, ledger_balance_series
+    from chart_decimation import line_trace
+
+    col1, col2 = st.columns(2)
+    resolution = col1.radio('Resolution', list(RESOLUTIONS), index=2, horizontal=True)
+    horizon = col2.slider('Forecast (months)', 0, 60, 12)
+
+    ledger, balance, income = st.session_state.expenses, st.session_state.current_balance, st.session_state.monthly_income
+    # Recurring rules projected forward from tomorrow, within the chosen period
+    rules, window = store.schedules(user), forecast_window(horizon, period)
+
+    def build_balance_figure(job):
+        balances = ledger_balance_series(ledger, balance, income, RESOLUTIONS[resolution], period=period)
+
+        # Create a line graph of balance over time, and the forecast as a dashed line
+        traces = [line_trace(balances.index, balances.values, name='Balance')]
+        if window is not None:
+            forecast = balance_forecast(balance, rules, *window, monthly_income=income, freq=RESOLUTIONS[resolution])
+            traces.append(line_trace(forecast.index, forecast.values, name='Forecast', line={'dash': 'dash'}))
+        layout = go.Layout(title='Current Balance Over Time', xaxis_title=resolution, yaxis_title='Balance (GHS)')
+        return go.Figure(data=traces, layout=layout)
+
+    job = submit_job('balance_chart', figure_key('balance', current_user(), ledger_version, balance, income, resolution,
+                                                 period.start, period.end, rules, window, date.today()), build_balance_figure)
+    show_job(job, st.plotly_chart, slot='balance_chart')
+
+
+@st.fragment
+@profile_section('goal_projection')
+def goal_projection_section():
+    # Monte Carlo paths from today's savings and investments towards the goal set on the Dashboard
+    from cash_flow import recent_spending
+    from goal_projection import project_goal, projection_figure
+
+    st.subheader('🔮 Goal Projection')
+    col1, col2, col3 = st.columns(3)
+    goal_amount = col1.number_input('Goal amount (GHS)', min_value=1, value=max(1, st.session_state.get('goal_target', 5000)))
+    annual_return = col2.slider('Expected annual return (%)', 0.0, 20.0, 8.0, 0.5) / 100
+    volatility = col3.slider('Volatility (%)', 0.0, 40.0, 15.0, 0.5) / 100
+    col1, col2 = st.columns(2)
+    years = col1.slider('Horizon (years)', 1, 30, 5)
+    paths = col2.select_slider('Simulated paths', [1_000, 10_000, 100_000, 1_000_000], value=10_000)
+    contribution = st.session_state.monthly_income - recent_spending(st.session_state.expenses)
+    st.caption(f'Monthly contribution: GHS {contribution:,.2f} (income minus the last 30 days of expenses)')
+    savings, investments = st.session_state.total_savings, st.session_state.investment_value
+
+    def build_projection_figure(projection):
+        chance = projection['probability'].iloc[-1]
+        title = f'Chance of reaching GHS {goal_amount:,} in {years} years: {chance:.0%}'
+        return projection_figure(projection, goal_amount, title=title)
+
+    def run_projection(job):
+        projection = project_goal(goal_amount, savings, investments, contribution, months=12 * years,
+                                  annual_return=annual_return, volatility=volatility, paths=paths,
+                                  progress=job.report, cancelled=job.cancelled)
+        job.check_cancelled()
+        return build_projection_figure(projection)
+
+    def show_partial(job, previous):
+        # Paths simulated so far, until the full run is in
+        st.progress(job.progress, text=f'Simulating {paths:,} paths')
+        if job.partial is not None:
+            st.plotly_chart(build_projection_figure(job.partial))
+        elif previous is not None:
+            st.plotly_chart(previous)
+
+    with profiled('goal_projection_chart'):
+        job = submit_job('goal_projection',
+                         figure_key('goal_projection', goal_amount, savings, investments, round(contribution, 2),
+                                    annual_return, volatility, years, paths, date.today()),
+                         run_projection)
+        show_job(job, st.plotly_chart, show_partial, slot='goal_projection')
+
+
+if st.session_state.page == "Dashboard":
+    # Title and Header
+    st.title('💰 Personal Financial Dashboard')
+    st.header('📊 Overview of Your Financial Health')
+
+    metrics_section()
+    goal = goals_section()
+    expenses_section(expense_totals)
+    budget_section(expense_totals, goal)
 
 elif st.session_state.page == "Graphs":
+    # Plotly and the chart modules are only imported once the Graphs page is opened
+    import plotly.graph_objs as go
+    from chart_decimation import fold_tail
+
     st.title('📊 Financial Graphs')
     
+    # Figures are cached per process and rebuilt only when one of their inputs changes
+    figures = get_figure_cache()
+    ledger_version = st.session_state.expenses.version
+
+    # One period for the charts below; switching it reads only the expenses dated in it
+    period = render_period_picker(st.session_state.expenses, key='graphs_period')
+    period_totals = st.session_state.expenses.period_aggregates(period.start, period.end) if period.start is not None else expense_totals
+
     # Graph: Balance Over Time
     st.subheader('📈 Balance Over Time')
-    # Placeholder for actual balance data
-    dates = pd.date_range(start="2023-01-01", periods=12, freq='M')
-    # Using session state to simulate balance over time
-    balances = np.random.randint(1000, 2000, size=12).tolist()  # Replace with real data fetching logic
-
-    # Create a line graph of balance over time
-    balance_trace = go.Scatter(x=dates, y=balances, mode='lines+markers', name='Balance')
-    layout = go.Layout(title='Current Balance Over Time', xaxis_title='Month', yaxis_title='Balance (GHS)')
-    fig = go.Figure(data=[balance_trace], layout=layout)
-    st.plotly_chart(fig)
+    balance_chart_section(ledger_version, period)
 
     # Graph: Expense Breakdown
-    if st.session_state.expenses:
+    if period_totals.count:
         st.subheader('📊 Expense Breakdown')
-        expense_df = pd.DataFrame(st.session_state.expenses)
-        expense_breakdown = expense_df.groupby('name').sum().reset_index()
 
-        pie_fig = go.Figure(data=[go.Pie(labels=expense_breakdown['name'], values=expense_breakdown['amount'], hole=.3)])
-        pie_fig.update_layout(title_text='Expenses by Category')
-        st.plotly_chart(pie_fig)
+        def build_pie_figure():
+            labels, values = fold_tail(*period_totals.categories())
+
+            pie_fig = go.Figure(data=[go.Pie(labels=labels, values=values, hole=.3)])
+            pie_fig.update_layout(title_text='Expenses by Category')
+            return pie_fig
+
+        with profiled('expense_pie'):
+            pie_fig = figures.get_or_build(figure_key('expense_breakdown', user, ledger_version, period.start, period.end),
+                                            build_pie_figure)
+            st.plotly_chart(pie_fig)
 
     # Graph: Savings Progress
     st.subheader('🏦 Savings Progress')
     goal_amount = 5000
     current_savings = st.session_state.total_savings  # Fetching actual savings from session state
-    savings_progress = current_savings / goal_amount
-    bar_fig = go.Figure(data=[go.Bar(x=['Savings Progress'], y=[savings_progress], marker_color='green')])
-    bar_fig.update_layout(title='Progress Towards Savings Goal', yaxis=dict(tickvals=[0, 1], ticktext=['0%', '100%']), yaxis_title='Progress', xaxis_title='Goal')
-    st.plotly_chart(bar_fig)
+    progress = savings_progress(current_savings, goal_amount)
+
+    def build_bar_figure():
+        bar_fig = go.Figure(data=[go.Bar(x=['Savings Progress'], y=[progress], marker_color='green')])
+        bar_fig.update_layout(title='Progress Towards Savings Goal', yaxis=dict(tickvals=[0, 1], ticktext=['0%', '100%']), yaxis_title='Progress', xaxis_title='Goal')
+        return bar_fig
+
+    with profiled('savings_chart'):
+        bar_fig = figures.get_or_build(figure_key('savings_progress', progress), build_bar_figure)
+        st.plotly_chart(bar_fig)
+
+    goal_projection_section()
 
     # Educational Module
     st.subheader('📚 Financial Literacy Tips')
@@ -184,3 +343,5 @@ elif st.session_state.page == "Graphs":
 # Footer
 st.markdown("<br><br>", unsafe_allow_html=True)
 st.write("### © 2024 Personal Finance Dashboard. All rights reserved.")
+
+render_profiler_panel()
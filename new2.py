@@ -1,21 +1,36 @@
-import streamlit as st
-import pandas as pd
-import numpy as np
-import plotly.graph_objs as go
-import json
+from datetime import date
 
-# Load translations from the JSON file
-# Load translations from the JSON file with UTF-8 encoding
-with open('translations.json', 'r', encoding='utf-8') as f:
-    translations = json.load(f)
+import streamlit as st
+from ledger_store import current_user, get_store, sync_metrics
+from statement_import import render_statement_import
+from ledger_export import render_ledger_export
+from expense_periods import render_period_picker
+from recurring_schedule import forecast_window, render_recurring_rules, rest_of_month, scheduled_totals
+from figure_cache import figure_key, get_figure_cache
+from analytics_jobs import show_job, submit_job
+from health_score import budget_remaining_ratio, health_score, savings_progress
+from suggestion_rules import get_suggestion_rules
+from fragment_sections import notify, rerun_app_on_change, show_notices
+from rerun_profiler import begin_rerun, profile_section, profiled, render_profiler_panel
+from translation_catalog import LANGUAGE_CODES, load_translations, translate as lookup
 
+# Per-section timings, shown in a hidden sidebar panel with ?debug=1
+begin_rerun()
 
 # Language selection
 language = st.sidebar.selectbox("🌍 Select Language", options=["English","Twi", "Hausa", "Ga"])
 
+# Load translations from the shared catalog (cached per process, reloaded when the file changes)
+try:
+    with profiled('translations'):
+        translations = load_translations(LANGUAGE_CODES[language])
+except FileNotFoundError:
+    st.error("Translation file not found. Defaulting to English.")
+    translations = {}
+
 # Helper function to get the translation
 def translate(key):
-    return translations[language].get(key, key)
+    return lookup(key, translations)
 
 # Custom CSS for a modern UI
 st.markdown(
@@ -73,120 +88,267 @@ if st.sidebar.button(translate('dashboard')):
 if st.sidebar.button(translate('graphs')):
     st.session_state.page = "Graphs"
 
-# Initialize session state for financial metrics if not already done
-if 'current_balance' not in st.session_state:
-    st.session_state.current_balance = 1200  # Default current balance
-if 'total_savings' not in st.session_state:
-    st.session_state.total_savings = 5000  # Default total savings
-if 'investment_value' not in st.session_state:
-    st.session_state.investment_value = 10000  # Default investment value
-if 'expenses' not in st.session_state:
-    st.session_state.expenses = []  # Initialize empty list for expenses
+# Financial metrics and expenses live in the shared store; a new session starts from the user's saved values
+store = get_store()
+user = current_user()
+# This user's expenses, shared by all their sessions; looked up again on every rerun, since the store
+# forgets the ledgers of users who went idle
+st.session_state.expenses = store.ledger(user)
+sync_metrics(store, user)  # Also picks up metrics another session of this user saved since the last rerun
+if 'monthly_income' not in st.session_state:
+    st.session_state.monthly_income = 2000  # Default monthly income
+expense_totals = st.session_state.expenses.aggregates  # Running totals, updated in O(1) per added expense
 
 # Dashboard Page
-if st.session_state.page == "Dashboard":
-    st.title(translate("title"))
-    st.header(translate("header"))
+# Dashboard sections run as fragments: a widget inside one reruns only that section.
+# Sections that change state read elsewhere (metrics, goal, expenses) trigger a full rerun.
+@st.fragment
+@profile_section('metrics')
+def metrics_section():
+    with rerun_app_on_change(lambda: (st.session_state.current_balance, st.session_state.total_savings, st.session_state.investment_value)):
+        # Financial Metrics Input
+        st.subheader(translate("update_metrics"))
+        st.session_state.current_balance = st.number_input(translate("current_balance"), min_value=0, value=st.session_state.current_balance)
+        st.session_state.total_savings = st.number_input(translate("total_savings"), min_value=0, value=st.session_state.total_savings)
+        st.session_state.investment_value = st.number_input(translate("investment_value"), min_value=0, value=st.session_state.investment_value)
+        sync_metrics(store, user)  # Saves only the metrics edited in this session
 
-    # Financial Metrics Input
-    st.subheader(translate("update_metrics"))
-    st.session_state.current_balance = st.number_input(translate("current_balance"), min_value=0, value=st.session_state.current_balance)
-    st.session_state.total_savings = st.number_input(translate("total_savings"), min_value=0, value=st.session_state.total_savings)
-    st.session_state.investment_value = st.number_input(translate("investment_value"), min_value=0, value=st.session_state.investment_value)
+        # Financial Metrics Display
+        st.subheader(translate("key_financial_metrics"))
+        col1, col2, col3 = st.columns(3)
+        col1.metric(translate("current_balance"), f"GHS {st.session_state.current_balance}")
+        col2.metric(translate("total_savings"), f"GHS {st.session_state.total_savings}")
+        col3.metric(translate("investment_value"), f"GHS {st.session_state.investment_value}")
 
-    # Financial Metrics Display
-    st.subheader(translate("key_financial_metrics"))
-    col1, col2, col3 = st.columns(3)
-    col1.metric(translate("current_balance"), f"GHS {st.session_state.current_balance}")
-    col2.metric(translate("total_savings"), f"GHS {st.session_state.total_savings}")
-    col3.metric(translate("investment_value"), f"GHS {st.session_state.investment_value}")
-
-    # Financial Goals Section
-    st.subheader(translate("set_financial_goals"))
-    goal = st.selectbox(translate('choose_goal'), ['Emergency Fund', 'Home Purchase', 'Retirement', 'Debt Repayment'])
-    goal_amount = st.number_input(translate("goal_amount"), min_value=0, value=1000)
-
-    # Financial Goals Explanation
-    if goal == 'Emergency Fund':
-        st.write(translate('emergency_fund_tip'))
-    elif goal == 'Home Purchase':
-        st.write(translate('home_purchase_tip'))
-    elif goal == 'Retirement':
-        st.write(translate('retirement_tip'))
-    else:
-        st.write(translate('debt_repayment_tip'))
-
-    # Expense Tracking Section
-    st.subheader(translate('expense_tracking'))
-    with st.form("expense_form"):
-        expense_name = st.text_input(translate('expense_name'), 'Rent')
-        expense_amount = st.number_input(translate('expense_amount'), min_value=0, max_value=10000, value=1000)
-        add_expense = st.form_submit_button(translate('add_expense'))
-
-    # Add expense to session state
-    if add_expense:
-        st.session_state.expenses.append({'name': expense_name, 'amount': expense_amount})
-        st.success(f"✅ {translate('added_expense')} {expense_name} ({expense_amount} GHS)")
-
-    # Display expenses
-    if st.session_state.expenses:
-        st.subheader(translate('your_expenses'))
-        expense_df = pd.DataFrame(st.session_state.expenses)
-        st.table(expense_df)
-        st.metric(translate('total_expenses'), f"GHS {expense_df['amount'].sum()}")
 
+@st.fragment
+@profile_section('goals')
+def goals_section():
+    # The advice further down the page depends on the goal, but not on the amount
+    with rerun_app_on_change(lambda: st.session_state.get('goal')):
+        # Financial Goals Section
+        st.subheader(translate("set_financial_goals"))
+        goal = st.selectbox(translate('choose_goal'), ['Emergency Fund', 'Home Purchase', 'Retirement', 'Debt Repayment'], key='goal')
+        goal_amount = st.number_input(translate("goal_amount"), min_value=0, value=1000)
+        st.session_state.goal_target = goal_amount  # Projected on the Graphs page
+
+        # Financial Goals Explanation
+        if goal == 'Emergency Fund':
+            st.write(translate('emergency_fund_tip'))
+        elif goal == 'Home Purchase':
+            st.write(translate('home_purchase_tip'))
+        elif goal == 'Retirement':
+            st.write(translate('retirement_tip'))
+        else:
+            st.write(translate('debt_repayment_tip'))
+    return goal
+
+
+@st.fragment
+@profile_section('expenses')
+def expenses_section(expense_totals):
+    with rerun_app_on_change(lambda: (st.session_state.expenses.version, store.schedules(user))):
+        # Expense Tracking Section
+        st.subheader(translate('expense_tracking'))
+        show_notices()
+        with st.form("expense_form"):
+            expense_name = st.text_input(translate('expense_name'), 'Rent')
+            expense_amount = st.number_input(translate('expense_amount'), min_value=0, max_value=10000, value=1000)
+            add_expense = st.form_submit_button(translate('add_expense'))
+
+        # Add expense to session state
+        if add_expense:
+            st.session_state.expenses.append(expense_name, expense_amount)
+            notify(f"✅ {translate('added_expense')} {expense_name} ({expense_amount} GHS)")
+
+        # Rent, salary and other rules that repeat, forecast on the Graphs page
+        render_recurring_rules(store, user, translations, notify=notify)
+
+        # Bulk import of bank / mobile-money statements
+        render_statement_import(st.session_state.expenses, translations, notify=notify)
+
+        # Filtered CSV / Parquet / Excel export and a monthly summary
+        render_ledger_export(store, user, st.session_state.expenses, translations)
+
+        # Display expenses
+        if expense_totals.count:
+            st.subheader(translate('your_expenses'))
+            from expense_table import render_expense_table
+            with profiled('expense_table'):
+                render_expense_table(st.session_state.expenses, translations)
+            # Totals of one month, quarter, year or date range; the ledger is date-sorted, so only its rows are read
+            period = render_period_picker(st.session_state.expenses, translations, key='dashboard_period')
+            period_totals = st.session_state.expenses.period_aggregates(period.start, period.end) if period.start is not None else expense_totals
+            st.metric(f"{translate('total_expenses')} ({period.label})", f"GHS {period_totals.total:,.2f}")
+
+
+@st.fragment
+@profile_section('budget')
+def budget_section(expense_totals, goal):
     # Monthly Budget Progress
     st.subheader(translate('monthly_budget_progress'))
-    monthly_income = st.slider(translate('monthly_income'), 500, 10000, 2000)
-    total_expenses = expense_df['amount'].sum() if st.session_state.expenses else 0
-    budget_remaining = monthly_income - total_expenses
-    st.progress(budget_remaining / monthly_income)
+    monthly_income = st.slider(translate('monthly_income'), 500, 10000, st.session_state.monthly_income)
+    st.session_state.monthly_income = monthly_income
+    total_expenses = expense_totals.total
+    # Recurring rules still due this month count towards the budget
+    scheduled_expenses, scheduled_income = scheduled_totals(store.schedules(user), *rest_of_month())
+    st.progress(budget_remaining_ratio(monthly_income + scheduled_income, total_expenses + scheduled_expenses))
+    if scheduled_expenses or scheduled_income:
+        st.caption(f"Still scheduled this month: GHS {scheduled_expenses:,.2f} out, GHS {scheduled_income:,.2f} in")
 
     # Savings & Investment Advice
     st.subheader(translate('savings_investment_advice'))
     st.write(translate('suggestion_based_on_goal'))
-    if goal == 'Emergency Fund':
-        st.write(translate('emergency_fund_suggestion'))
-    elif goal == 'Home Purchase':
-        st.write(translate('home_purchase_suggestion'))
+    suggestion, tip = get_suggestion_rules().advice(goal, st.session_state.current_balance, LANGUAGE_CODES[language])
+    if suggestion:
+        st.write(suggestion)
+    if tip:
+        st.write(tip)
 
     # Financial Health Score
     st.subheader(translate('financial_health_score'))
-    health_score = min(100, max(0, ((st.session_state.current_balance + st.session_state.total_savings) / (monthly_income + 1)) * 100))
-    st.metric(translate('financial_health_score'), f"{int(health_score)}/100")
+    score = health_score(st.session_state.current_balance, st.session_state.total_savings, monthly_income)
+    st.metric(translate('financial_health_score'), f"{int(score)}/100")
+
+
+@st.fragment
+@profile_section('balance_chart')
+def balance_chart_section(ledger_version, period):
+    import plotly.graph_objs as go
+    from cash_flow import RESOLUTIONS, balance_forecast, ledger_balance_series
+    from chart_decimation import line_trace
+
+    col1, col2 = st.columns(2)
+    resolution = col1.radio(translate('resolution'), list(RESOLUTIONS), index=2, horizontal=True)
+    horizon = col2.slider("Forecast (months)", 0, 60, 12)
+
+    ledger, balance, income = st.session_state.expenses, st.session_state.current_balance, st.session_state.monthly_income
+    # Recurring rules projected forward from tomorrow, within the chosen period
+    rules, window = store.schedules(user), forecast_window(horizon, period)
+
+    def build_balance_figure(job):
+        balances = ledger_balance_series(ledger, balance, income, RESOLUTIONS[resolution], period=period)
+
+        traces = [line_trace(balances.index, balances.values, name=translate('balance'))]
+        if window is not None:
+            forecast = balance_forecast(balance, rules, *window, monthly_income=income, freq=RESOLUTIONS[resolution])
+            traces.append(line_trace(forecast.index, forecast.values, name="Forecast", line={'dash': 'dash'}))
+        layout = go.Layout(title=translate('balance_over_time'), xaxis_title=resolution, yaxis_title=translate('balance'))
+        return go.Figure(data=traces, layout=layout)
+
+    job = submit_job('balance_chart', figure_key('balance', current_user(), ledger_version, balance, income, resolution, language,
+                                                 period.start, period.end, rules, window, date.today()), build_balance_figure)
+    show_job(job, st.plotly_chart, slot='balance_chart')
+
+
+@st.fragment
+@profile_section('goal_projection')
+def goal_projection_section():
+    # Monte Carlo paths from today's savings and investments towards the goal set on the Dashboard
+    from cash_flow import recent_spending
+    from goal_projection import project_goal, projection_figure
+
+    st.subheader(translate('goal_projection'))
+    col1, col2, col3 = st.columns(3)
+    goal_amount = col1.number_input(translate('goal_amount'), min_value=1, value=max(1, st.session_state.get('goal_target', 5000)))
+    annual_return = col2.slider(translate('expected_return'), 0.0, 20.0, 8.0, 0.5) / 100
+    volatility = col3.slider(translate('volatility'), 0.0, 40.0, 15.0, 0.5) / 100
+    col1, col2 = st.columns(2)
+    years = col1.slider(translate('horizon_years'), 1, 30, 5)
+    paths = col2.select_slider(translate('simulated_paths'), [1_000, 10_000, 100_000, 1_000_000], value=10_000)
+    contribution = st.session_state.monthly_income - recent_spending(st.session_state.expenses)
+    st.caption(f"{translate('monthly_contribution')}: GHS {contribution:,.2f}")
+    savings, investments = st.session_state.total_savings, st.session_state.investment_value
+
+    def build_projection_figure(projection):
+        chance = projection['probability'].iloc[-1]
+        return projection_figure(projection, goal_amount, title=f"{translate('goal_projection')}: {chance:.0%}",
+                                 wealth_label=translate('balance'), probability_label=translate('goal_probability'))
+
+    def run_projection(job):
+        projection = project_goal(goal_amount, savings, investments, contribution, months=12 * years,
+                                  annual_return=annual_return, volatility=volatility, paths=paths,
+                                  progress=job.report, cancelled=job.cancelled)
+        job.check_cancelled()
+        return build_projection_figure(projection)
+
+    def show_partial(job, previous):
+        # Paths simulated so far, until the full run is in
+        st.progress(job.progress, text=f'{paths:,} paths')
+        if job.partial is not None:
+            st.plotly_chart(build_projection_figure(job.partial))
+        elif previous is not None:
+            st.plotly_chart(previous)
+
+    with profiled('goal_projection_chart'):
+        job = submit_job('goal_projection',
+                         figure_key('goal_projection', goal_amount, savings, investments, round(contribution, 2),
+                                    annual_return, volatility, years, paths, language, date.today()),
+                         run_projection)
+        show_job(job, st.plotly_chart, show_partial, slot='goal_projection')
+
+
+if st.session_state.page == "Dashboard":
+    st.title(translate("title"))
+    st.header(translate("header"))
+
+    metrics_section()
+    goal = goals_section()
+    expenses_section(expense_totals)
+    budget_section(expense_totals, goal)
 
 # Graphs Page
 elif st.session_state.page == "Graphs":
+    # Plotly and the chart modules are only imported once the Graphs page is opened
+    import plotly.graph_objs as go
+    from chart_decimation import fold_tail
+
     st.title(translate('graphs'))
 
+    # Figures are cached per process and rebuilt only when one of their inputs changes
+    figures = get_figure_cache()
+    ledger_version = st.session_state.expenses.version
+
+    # One period for the charts below; switching it reads only the expenses dated in it
+    period = render_period_picker(st.session_state.expenses, translations, key='graphs_period')
+    period_totals = st.session_state.expenses.period_aggregates(period.start, period.end) if period.start is not None else expense_totals
+
     # Graph: Balance Over Time
     st.subheader(translate('balance_over_time'))
-    dates = pd.date_range(start="2023-01-01", periods=12, freq='M')
-    balances = np.random.randint(1000, 2000, size=12).tolist()  # Replace with real data fetching logic
-
-    balance_trace = go.Scatter(x=dates, y=balances, mode='lines+markers', name=translate('balance'))
-    layout = go.Layout(title=translate('balance_over_time'), xaxis_title=translate('month'), yaxis_title=translate('balance'))
-    fig = go.Figure(data=[balance_trace], layout=layout)
-    st.plotly_chart(fig)
+    balance_chart_section(ledger_version, period)
 
     # Graph: Expense Breakdown
-    if st.session_state.expenses:
+    if period_totals.count:
         st.subheader(translate('expense_breakdown'))
-        expense_df = pd.DataFrame(st.session_state.expenses)
-        expense_breakdown = expense_df.groupby('name').sum().reset_index()
 
-        pie_fig = go.Figure(data=[go.Pie(labels=expense_breakdown['name'], values=expense_breakdown['amount'], hole=.3)])
-        pie_fig.update_layout(title_text=translate('expense_by_category'))
-        st.plotly_chart(pie_fig)
+        def build_pie_figure():
+            labels, values = fold_tail(*period_totals.categories())
+
+            pie_fig = go.Figure(data=[go.Pie(labels=labels, values=values, hole=.3)])
+            pie_fig.update_layout(title_text=translate('expense_by_category'))
+            return pie_fig
+
+        with profiled('expense_pie'):
+            pie_fig = figures.get_or_build(figure_key('expense_breakdown', user, ledger_version, period.start, period.end, language),
+                                            build_pie_figure)
+            st.plotly_chart(pie_fig)
 
     # Graph: Savings Progress
     st.subheader(translate('savings_progress'))
     goal_amount = 5000
     current_savings = st.session_state.total_savings
-    savings_progress = current_savings / goal_amount
-    bar_fig = go.Figure(data=[go.Bar(x=[translate('savings_progress')], y=[savings_progress], marker_color='green')])
-    bar_fig.update_layout(title=translate('savings_goal_progress'), yaxis=dict(tickvals=[0, 1], ticktext=['0%', '100%']), yaxis_title=translate('progress'), xaxis_title=translate('goal'))
-    st.plotly_chart(bar_fig)
+    progress = savings_progress(current_savings, goal_amount)
+
+    def build_bar_figure():
+        bar_fig = go.Figure(data=[go.Bar(x=[translate('savings_progress')], y=[progress], marker_color='green')])
+        bar_fig.update_layout(title=translate('savings_goal_progress'), yaxis=dict(tickvals=[0, 1], ticktext=['0%', '100%']), yaxis_title=translate('progress'), xaxis_title=translate('goal'))
+        return bar_fig
+
+    with profiled('savings_chart'):
+        bar_fig = figures.get_or_build(figure_key('savings_progress', progress, language), build_bar_figure)
+        st.plotly_chart(bar_fig)
+
+    goal_projection_section()
 
     # Educational Module
     st.subheader(translate('financial_literacy_tips'))
@@ -196,3 +358,5 @@ elif st.session_state.page == "Graphs":
 # Footer
 st.markdown("<br><br>", unsafe_allow_html=True)
 st.write(f"### © 2024 {translate('footer')}")
+
+render_profiler_panel()
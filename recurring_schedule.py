@@ -0,0 +1,174 @@
+from collections import namedtuple
+from datetime import date
+
+import numpy as np
+import streamlit as st
+
+DAY_MS = 86_400_000
+KINDS = ['expense', 'income']
+EVERY = ['day', 'week', 'month', 'year']
+_STEPS = {'day': 1, 'week': 7, 'month': 1, 'year': 12}  # days for day/week, months for month/year
+
+# English labels; translations.json entries with the same keys take precedence
+DEFAULT_LABELS = {
+    'recurring': 'Recurring expenses and income',
+    'recurring_name': 'Name',
+    'recurring_amount': 'Amount (GHS)',
+    'recurring_kind': 'Type',
+    'recurring_expense': 'Expense',
+    'recurring_income': 'Income',
+    'recurring_every': 'Repeats every',
+    'recurring_interval': 'Every how many',
+    'recurring_start': 'First date',
+    'recurring_add': 'Add recurring',
+    'recurring_added': 'Added recurring {name}',
+    'recurring_delete': 'Remove',
+    'recurring_summary': '{name}: GHS {amount:,.2f} {schedule}, from {start}',
+    'every_day': 'every day',
+    'every_week': 'every week',
+    'every_month': 'every month',
+    'every_year': 'every year',
+    'every_n_day': 'every {n} days',
+    'every_n_week': 'every {n} weeks',
+    'every_n_month': 'every {n} months',
+    'every_n_year': 'every {n} years',
+}
+
+# One rule stands for every occurrence: `amount` paid every `interval` days, weeks, months or years from
+# the day of `start` (ms) until `until` (ms, exclusive; None for no end). Monthly and yearly rules keep the
+# day of month of `start`, moved to the last day of shorter months (the 31st is paid on Feb 28/29).
+# Occurrences are never stored or listed up front; they are counted or generated for one window at a time
+RecurringRule = namedtuple('RecurringRule', ['id', 'name', 'amount', 'kind', 'every', 'interval', 'start', 'until'])
+
+
+def _ms(value):
+    return int(np.datetime64(value, 'ms').astype(np.int64))
+
+
+def _ceil_days(ms):
+    # Number of the first day starting at or after each ms timestamp
+    return -(-np.asarray(ms, np.int64) // DAY_MS)
+
+
+def _months(days):
+    return np.asarray(days, np.int64).astype('datetime64[D]').astype('datetime64[M]').astype(np.int64)
+
+
+def monthly_income_rule(amount):
+    # The monthly income slider as a rule, paid on the 1st like cash_flow.monthly_income_flows
+    return RecurringRule(None, 'Monthly income', float(amount), 'income', 'month', 1, 0, None)
+
+
+def _occurrence_days(rule, n):
+    # Day numbers of occurrences n (0 is the first) of a rule
+    anchor = int(_ceil_days(rule.start))
+    step = _STEPS[rule.every] * int(rule.interval)
+    if rule.every in ('day', 'week'):
+        return anchor + step * n
+    anchor_month = int(_months(anchor))
+    months = (anchor_month + step * n).astype('datetime64[M]')
+    month_starts = months.astype('datetime64[D]').astype(np.int64)
+    month_days = (months + 1).astype('datetime64[D]').astype(np.int64) - month_starts
+    day_of_month = anchor - int(np.datetime64(anchor_month, 'M').astype('datetime64[D]').astype(np.int64))
+    return month_starts + np.minimum(day_of_month, month_days - 1)
+
+
+def occurrences_before(rule, bounds):
+    """Number of occurrences of a rule dated before each bound (ms), in closed form.
+
+    np.diff() of the counts gives the occurrences between consecutive
+    bounds, so totals per day, week or month of a forecast cost one value per
+    period, however often the rule repeats.
+    """
+    if rule.every not in _STEPS:
+        raise ValueError(f'Unknown repeat {rule.every!r}; expected one of {EVERY}')
+    bounds = np.asarray(bounds, np.int64)
+    if rule.until is not None:
+        bounds = np.minimum(bounds, int(rule.until))
+    days = _ceil_days(bounds)  # occurrences fall at midnight, so "before a bound" is "before this day"
+    anchor = int(_ceil_days(rule.start))
+    step = _STEPS[rule.every] * int(rule.interval)
+    if rule.every in ('day', 'week'):
+        counts = -(-(days - anchor) // step)
+    else:
+        # The last occurrence in or before the bound's month, and whether it falls before the bound's day
+        last = (_months(days) - int(_months(anchor))) // step
+        counts = last + (_occurrence_days(rule, last) < days)
+    return np.maximum(counts, 0)
+
+
+def occurrences(rule, start, end):
+    # Dates (datetime64[ms], midnight) of the occurrences in [start, end), ms; only those are generated
+    first, last = occurrences_before(rule, [start, end])
+    return _occurrence_days(rule, np.arange(first, last, dtype=np.int64)).astype('datetime64[D]').astype('datetime64[ms]')
+
+
+def scheduled_net(rules, bounds):
+    # Net flow (income minus expenses) of the rules between each pair of consecutive bounds (ms)
+    net = np.zeros(max(0, len(bounds) - 1))
+    for rule in rules:
+        net += np.diff(occurrences_before(rule, bounds)) * float(rule.amount) * (1 if rule.kind == 'income' else -1)
+    return net
+
+
+def scheduled_totals(rules, start, end):
+    # (expenses, income) the rules add up to in [start, end)
+    totals = {'expense': 0.0, 'income': 0.0}
+    for rule in rules:
+        first, last = occurrences_before(rule, [start, end])
+        totals[rule.kind] += float(rule.amount) * int(last - first)
+    return totals['expense'], totals['income']
+
+
+def rest_of_month(today=None):
+    # (tomorrow, first of next month) in ms; today's expenses are expected to be entered already
+    today = np.datetime64(today or date.today(), 'D')
+    return _ms(today + 1), _ms((today.astype('datetime64[M]') + 1).astype('datetime64[D]'))
+
+
+def forecast_window(months, period=None, today=None):
+    """(start, end) ms of a forecast from tomorrow through `months` whole months after this one, or None.
+
+    period (see expense_periods.Period) limits the window to the period's
+    end; a period that is already over has nothing to forecast.
+    """
+    start, end = rest_of_month(today)
+    end = _ms(np.datetime64(end, 'ms').astype('datetime64[M]') + months)
+    if period is not None and period.end is not None:
+        end = min(end, period.end)
+    return (start, end) if end > start else None
+
+
+def render_recurring_rules(store, user, translations=None, key='recurring', notify=st.success):
+    # Form for a new rule and the list of the user's rules, each with a remove button
+    translations = translations or {}
+
+    def label(name):
+        return translations.get(name, DEFAULT_LABELS[name])
+
+    with st.expander(label('recurring')):
+        with st.form(f'{key}_form'):
+            col1, col2 = st.columns(2)
+            name = col1.text_input(label('recurring_name'), 'Rent', key=f'{key}_name')
+            amount = col2.number_input(label('recurring_amount'), min_value=0.0, value=1000.0, key=f'{key}_amount')
+            kind = col1.radio(label('recurring_kind'), KINDS, format_func=lambda kind: label(f'recurring_{kind}'),
+                              horizontal=True, key=f'{key}_kind')
+            every = col2.selectbox(label('recurring_every'), EVERY, index=2, format_func=lambda every: label(f'every_{every}'),
+                                   key=f'{key}_every')
+            interval = col1.number_input(label('recurring_interval'), min_value=1, max_value=52, value=1, key=f'{key}_interval')
+            first = col2.date_input(label('recurring_start'), value=date.today(), key=f'{key}_start')
+            add = st.form_submit_button(label('recurring_add'))
+        if add and name and amount > 0:
+            store.add_schedule(user, RecurringRule(None, name, amount, kind, every, int(interval), _ms(first), None))
+            notify(label('recurring_added').format(name=name))
+
+        for rule in store.schedules(user):
+            schedule = label(f'every_{rule.every}') if rule.interval == 1 else \
+                label(f'every_n_{rule.every}').format(n=rule.interval)
+            col1, col2 = st.columns([4, 1])
+            sign = '+' if rule.kind == 'income' else '−'
+            col1.write(sign + ' ' + label('recurring_summary').format(
+                name=rule.name, amount=rule.amount, schedule=schedule, start=np.datetime64(rule.start, 'ms').astype('datetime64[D]')))
+            if col2.button(label('recurring_delete'), key=f'{key}_delete_{rule.id}'):
+                store.delete_schedule(user, rule.id)
+                st.rerun()
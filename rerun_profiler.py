@@ -0,0 +1,176 @@
+import json
+import os
+import sys
+import time
+from bisect import bisect_left
+from collections import deque
+from contextlib import contextmanager, nullcontext
+from functools import wraps
+
+import streamlit as st
+
+# Histogram bucket upper bounds in milliseconds; the last bucket catches everything slower
+BUCKETS_MS = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000]
+WINDOW = 200  # samples kept per section
+
+_DISABLED = nullcontext()
+
+
+# Process-wide objects (st.cache_resource) reachable from session_state; they are not this session's memory
+SHARED_TYPES = [('ledger_store', 'LedgerStore'), ('memory_budget', 'MemoryBudget'), ('analytics_jobs', 'JobRunner'),
+                ('figure_cache', 'FigureCache'), ('suggestion_rules', 'SuggestionRules'),
+                ('translation_catalog', 'TranslationCatalog')]
+
+
+def _shared(obj):
+    # Looked up in sys.modules so the profiler imports none of them
+    return any(isinstance(obj, cls) for cls in
+               (getattr(sys.modules.get(module), name, None) for module, name in SHARED_TYPES) if cls is not None)
+
+
+def _deep_sizeof(obj, seen=None):
+    # Approximate bytes held by an object graph. Objects reporting nbytes (a UserLedger's columns, NumPy
+    # and Arrow data) count as that and are not followed, so a ledger does not pull in the store behind it
+    seen = seen if seen is not None else set()
+    if id(obj) in seen or _shared(obj):
+        return 0
+    seen.add(id(obj))
+    nbytes = getattr(obj, 'nbytes', None) if not isinstance(obj, type) else None
+    if isinstance(nbytes, int):
+        return nbytes
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(_deep_sizeof(k, seen) + _deep_sizeof(v, seen) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset, deque)):
+        size += sum(_deep_sizeof(item, seen) for item in obj)
+    elif hasattr(obj, '__dict__'):
+        size += _deep_sizeof(vars(obj), seen)
+    return size
+
+
+class RerunProfiler:
+    """Per-session timings of named script sections plus session_state memory.
+
+    Each section keeps a rolling window of its last WINDOW durations, from which
+    percentiles and a fixed-bucket histogram are derived. When disabled,
+    section() hands back one shared no-op context manager.
+    """
+
+    def __init__(self, window=WINDOW):
+        self.enabled = False
+        self.window = window
+        self.samples = {}
+        self.memory = deque(maxlen=window)
+        self._rerun_started = None
+
+    def section(self, name):
+        if not self.enabled:
+            return _DISABLED
+        return self._timed(name)
+
+    @contextmanager
+    def _timed(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, (time.perf_counter() - started) * 1000)
+
+    def record(self, name, ms):
+        samples = self.samples.get(name)
+        if samples is None:
+            samples = self.samples[name] = deque(maxlen=self.window)
+        samples.append(ms)
+
+    def begin_rerun(self, enabled):
+        self.enabled = enabled
+        self._rerun_started = time.perf_counter() if enabled else None
+
+    def end_rerun(self, session_state):
+        if self._rerun_started is None:
+            return
+        self.record('rerun_total', (time.perf_counter() - self._rerun_started) * 1000)
+        self._rerun_started = None
+        sizes = {key: _deep_sizeof(value) for key, value in session_state.items() if key != '_profiler'}
+        self.memory.append({'time': time.time(), 'total_bytes': sum(sizes.values()), 'by_key': sizes})
+
+    def summary(self):
+        rows = []
+        for name, samples in self.samples.items():
+            ordered = sorted(samples)
+            rows.append({
+                'section': name,
+                'runs': len(ordered),
+                'last_ms': samples[-1],
+                'p50_ms': ordered[len(ordered) // 2],
+                'p95_ms': ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))],
+                'max_ms': ordered[-1],
+            })
+        return sorted(rows, key=lambda row: row['p50_ms'], reverse=True)
+
+    def histogram(self, name):
+        counts = [0] * (len(BUCKETS_MS) + 1)
+        for ms in self.samples.get(name, ()):
+            counts[bisect_left(BUCKETS_MS, ms)] += 1
+        labels = [f'<={b}ms' for b in BUCKETS_MS] + [f'>{BUCKETS_MS[-1]}ms']
+        return dict(zip(labels, counts))
+
+    def to_json(self):
+        return json.dumps({
+            'sections': self.summary(),
+            'histograms': {name: self.histogram(name) for name in self.samples},
+            'samples_ms': {name: list(samples) for name, samples in self.samples.items()},
+            'session_state_memory': list(self.memory),
+        }, indent=2)
+
+
+def get_profiler():
+    profiler = st.session_state.get('_profiler')
+    if profiler is None:
+        profiler = st.session_state['_profiler'] = RerunProfiler()
+    return profiler
+
+
+def profiling_requested():
+    # Hidden unless the page is opened with ?debug=1 or FINANCE_PROFILE=1 is set for the server
+    return st.query_params.get('debug') == '1' or os.environ.get('FINANCE_PROFILE') == '1'
+
+
+def begin_rerun():
+    get_profiler().begin_rerun(profiling_requested())
+
+
+def profiled(name):
+    return get_profiler().section(name)
+
+
+def profile_section(name):
+    # Decorator form of profiled(), for section functions and fragments
+    def decorate(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with get_profiler().section(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def render_profiler_panel():
+    profiler = get_profiler()
+    if not profiler.enabled:
+        return
+    profiler.end_rerun(st.session_state)
+    with st.sidebar.expander('🛠 Rerun profiler', expanded=False):
+        summary = profiler.summary()
+        st.dataframe(summary, hide_index=True, use_container_width=True)
+        if summary:
+            section = st.selectbox('Histogram', [row['section'] for row in summary], key='_profiler_section')
+            st.bar_chart(profiler.histogram(section))
+        if profiler.memory:
+            latest = profiler.memory[-1]
+            st.metric('session_state memory', f"{latest['total_bytes'] / 1024:,.1f} KiB")
+            st.dataframe(sorted(({'key': k, 'bytes': v} for k, v in latest['by_key'].items()),
+                                key=lambda row: row['bytes'], reverse=True),
+                         hide_index=True, use_container_width=True)
+        st.download_button('Export JSON', profiler.to_json(), file_name='rerun_profile.json',
+                           mime='application/json', key='_profiler_export')
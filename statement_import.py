@@ -0,0 +1,338 @@
+import argparse
+import csv
+import hashlib
+import time
+from datetime import datetime
+
+import numpy as np
+import pyarrow as pa
+import streamlit as st
+
+from analytics_jobs import clear_job, current_job, show_job, submit_job
+from expense_ledger import SCHEMA
+from ledger_store import DB_PATH, LedgerStore
+
+# Header names seen in bank and mobile-money exports, most specific first
+NAME_COLUMNS = ['name', 'description', 'details', 'narration', 'payee', 'merchant', 'recipient',
+                'category', 'memo', 'transaction type', 'type']
+AMOUNT_COLUMNS = ['amount', 'debit', 'withdrawal', 'paid out', 'money out', 'amount (ghs)', 'value']
+DATE_COLUMNS = ['date', 'transaction date', 'trans date', 'posted date', 'value date', 'completion time',
+                'timestamp', 'time']
+# A transaction id tells repeated rows apart; without one, equal rows in a file are separate expenses
+REFERENCE_COLUMNS = ['transaction id', 'transaction reference', 'reference', 'reference number', 'ref', 'ref no',
+                     'receipt no', 'receipt number', 'transaction no', 'id']
+DATE_FORMATS = ['%Y-%m-%d %H:%M:%S', '%Y-%m-%d', '%d/%m/%Y %H:%M', '%d/%m/%Y', '%d-%m-%Y', '%m/%d/%Y',
+                '%d-%b-%Y', '%d %b %Y']
+
+BLOCK_SIZE = 8 << 20  # bytes of CSV parsed per chunk
+
+# English labels; translations.json entries with the same keys take precedence
+DEFAULT_LABELS = {
+    'import_statement': 'Import bank / mobile-money statement (CSV)',
+    'only_outgoing': 'Only negative amounts are expenses',
+    'import_button': 'Import',
+    'import_progress': 'Read {rows:,} rows ({rate:,.0f} rows/s)',
+    'import_done': 'Imported {imported:,} expenses, skipped {duplicates:,} duplicates and {skipped:,} invalid rows '
+                   'in {seconds:.1f}s ({rate:,.0f} rows/s)',
+}
+
+
+def _pick_column(header, aliases):
+    normalized = {column.strip().lower(): column for column in header}
+    for alias in aliases:
+        if alias in normalized:
+            return normalized[alias]
+    return None
+
+
+def _read_header(source):
+    first_line = source.readline()
+    source.seek(0)
+    if isinstance(first_line, bytes):
+        first_line = first_line.decode('utf-8-sig')
+    return next(csv.reader([first_line]))
+
+
+def _parse_amounts(column):
+    # Amounts arrive as text such as "GHS 1,250.00" or "(45.00)"; keep digits, sign and decimal point
+    import pyarrow.compute as pc
+    text = pc.cast(column, pa.string())
+    try:
+        # Plain numeric exports parse in one cast; only messy ones need the regex clean-up
+        return pc.cast(text, pa.float64())
+    except pa.ArrowInvalid:
+        pass
+    negative = pc.or_(pc.starts_with(pc.utf8_trim_whitespace(text), '-'),
+                      pc.starts_with(pc.utf8_trim_whitespace(text), '('))
+    digits = pc.replace_substring_regex(text, r'[^0-9.]', '')
+    digits = pc.if_else(pc.equal(digits, ''), pa.scalar(None, pa.string()), digits)
+    amounts = pc.cast(digits, pa.float64())
+    return pc.if_else(negative, pc.negate(amounts), amounts)
+
+
+def _detect_date_format(text):
+    # Pick the format that parses the most of a small sample, so each chunk needs one strptime pass
+    import pyarrow.compute as pc
+    sample = text.drop_null()[:1000]
+    if len(sample) == 0:
+        return DATE_FORMATS[0]
+    return max(DATE_FORMATS, key=lambda fmt: pc.strptime(sample, format=fmt, unit='ms', error_is_null=True).null_count * -1)
+
+
+def _parse_dates(column, date_format):
+    # Timestamps (ms) of a chunk's date column; null where a row has no date or none that parses
+    import pyarrow.compute as pc
+    if pa.types.is_timestamp(column.type):
+        parsed = pc.cast(column, pa.timestamp('ms'))
+    else:
+        text = pc.utf8_trim_whitespace(pc.cast(column, pa.string()))
+        parsed = pc.strptime(text, format=date_format, unit='ms', error_is_null=True)
+        if parsed.null_count > text.null_count:
+            # Mixed formats in one file: only then try the others on the whole chunk
+            for fmt in DATE_FORMATS:
+                if fmt != date_format:
+                    parsed = pc.coalesce(parsed, pc.strptime(text, format=fmt, unit='ms', error_is_null=True))
+    return parsed
+
+
+def _fill_dates(dates, previous):
+    # Undated rows take the date of the last dated row before them (`previous` carries it over from earlier
+    # chunks), or at the top of the file the next one, so importing the file again gives them the same dates
+    import pyarrow.compute as pc
+    if previous is not None:
+        dates = pc.fill_null_forward(pa.concat_arrays([pa.array([previous], dates.type), dates]))[1:]
+    return pc.fill_null_backward(pc.fill_null_forward(dates))
+
+
+def _mix(values):
+    # splitmix64 finalizer: spreads every input bit over the 64-bit fingerprint (uint64 arithmetic wraps)
+    values = values ^ (values >> np.uint64(30))
+    values = values * np.uint64(0xBF58476D1CE4E5B9)
+    values = values ^ (values >> np.uint64(27))
+    values = values * np.uint64(0x94D049BB133111EB)
+    return values ^ (values >> np.uint64(31))
+
+
+def _text_hashes(column):
+    # 64-bit hash per string, each distinct string hashed once through the column's dictionary; nulls hash to 0
+    from expense_columns import dictionary_codes
+    column = pa.chunked_array([column]) if isinstance(column, pa.Array) else column
+    valid = column.is_valid().to_numpy(zero_copy_only=False) if column.null_count else None
+    if valid is not None or not pa.types.is_dictionary(column.type):
+        column = column.cast(pa.string()).fill_null('').dictionary_encode()
+    codes, categories = dictionary_codes(column)
+    hashes = np.array([int.from_bytes(hashlib.blake2b(text.encode(), digest_size=8).digest(), 'little')
+                       for text in categories.to_pylist()] or [0], np.uint64)[codes]
+    return hashes if valid is None else np.where(valid, hashes, np.uint64(0))
+
+
+def _row_hashes(table, dated=True):
+    # One 64-bit fingerprint per (name, amount, date) row, or (name, amount) ones, straight from the Arrow columns
+    amounts = table.column('amount').to_numpy().astype(np.float64).view(np.uint64)
+    hashes = _mix(_mix(amounts) ^ _text_hashes(table.column('name')))
+    if not dated:
+        return hashes
+    return _mix(hashes ^ _mix(table.column('date').cast(pa.int64()).to_numpy().view(np.uint64)))
+
+
+class _SeenRows:
+    # Sorted array of fingerprints; sorted merges keep memory at 8 bytes per row
+    def __init__(self):
+        self.hashes = np.empty(0, dtype=np.uint64)
+
+    def new_rows(self, hashes):
+        # Keep the first occurrence of each fingerprint that is not already known
+        unique, first = np.unique(hashes, return_index=True)
+        if len(self.hashes):
+            positions = np.searchsorted(self.hashes, unique).clip(max=len(self.hashes) - 1)
+            fresh = self.hashes[positions] != unique
+            unique, first = unique[fresh], first[fresh]
+        self.hashes = np.sort(np.concatenate([self.hashes, unique]), kind='stable')
+        keep = np.zeros(len(hashes), dtype=bool)
+        keep[first] = True
+        return keep
+
+
+class _LedgerRows:
+    """Fingerprints of the rows already in the ledger, with how many times each occurs.
+
+    A statement row is a duplicate only while an equal ledger row is left
+    to match it, so importing a file again skips all of it, while two equal
+    rows in one file (two airtime top-ups on the same day) are both kept.
+    """
+
+    def __init__(self, hashes=None):
+        hashes = hashes if hashes is not None else np.empty(0, dtype=np.uint64)
+        self.hashes, self.unmatched = np.unique(hashes, return_counts=True)
+
+    def new_rows(self, hashes):
+        order = np.argsort(hashes, kind='stable')
+        unique, first, counts = np.unique(hashes[order], return_index=True, return_counts=True)
+        rank = np.arange(len(hashes)) - np.repeat(first, counts)  # earlier equal rows of this chunk
+        positions = np.searchsorted(self.hashes, unique).clip(max=max(len(self.hashes) - 1, 0))
+        found = (self.hashes[positions] == unique) if len(self.hashes) else np.zeros(len(unique), bool)
+        unmatched = np.where(found, self.unmatched[positions] if len(self.hashes) else 0, 0)
+        self.unmatched[positions[found]] -= np.minimum(unmatched, counts)[found]
+        keep = np.empty(len(hashes), dtype=bool)
+        keep[order] = rank >= np.repeat(unmatched, counts)
+        return keep
+
+
+def import_statement(source, ledger, only_outgoing=False, progress=None, block_size=BLOCK_SIZE):
+    """Stream a CSV statement into the ledger chunk by chunk.
+
+    Name, amount and date columns are detected from common header names and
+    normalized to the ledger schema. Rows already in the ledger are skipped,
+    as are rows whose transaction id (when the file has one) came earlier in
+    the file; equal rows without an id are separate expenses and all kept.
+    A row without a date takes the one of the nearest dated row before it
+    (after it, at the top of the file); in a file with no dates at all rows
+    are dated as of the import and matched on name and amount only.
+    With only_outgoing, positive amounts (income) are dropped and negative
+    ones are stored as positive expenses; otherwise the absolute value of
+    every amount is stored. progress(rows_read, seconds) is called after
+    each chunk.
+    """
+    # pyarrow.compute and the CSV reader load on the first import, not with the upload widget
+    import pyarrow.compute as pc
+    import pyarrow.csv as pacsv
+
+    header = _read_header(source)
+    name_column = _pick_column(header, NAME_COLUMNS)
+    amount_column = _pick_column(header, AMOUNT_COLUMNS)
+    date_column = _pick_column(header, DATE_COLUMNS)
+    reference_column = _pick_column(header, REFERENCE_COLUMNS)
+    if amount_column is None:
+        raise ValueError(f'No amount column found in statement header: {header}')
+
+    columns = [c for c in (name_column, amount_column, date_column, reference_column) if c is not None]
+    reader = pacsv.open_csv(
+        source,
+        read_options=pacsv.ReadOptions(block_size=block_size),
+        convert_options=pacsv.ConvertOptions(
+            include_columns=columns,
+            # Parse amounts and dates ourselves so odd formats do not abort the import
+            column_types={c: pa.string() for c in (amount_column, date_column, reference_column) if c is not None},
+        ),
+    )
+
+    # Spilled rows are fingerprinted one chunk at a time, never all read back at once
+    table, chunks = ledger.split(cold=lambda max_id, start, end: ledger.store.expense_chunks(
+        ledger.user, max_id, start, end))
+    tables = [table, *(chunks or ())] if chunks is not None else [table]
+    in_ledger = _LedgerRows(np.concatenate([_row_hashes(t) for t in tables]))
+    # Rows no date can be found for are stored as of the import; they match ledger rows on name and amount
+    in_ledger_undated = _LedgerRows(np.concatenate([_row_hashes(t, dated=False) for t in tables]))
+    references = _SeenRows()
+    imported_at = datetime.now()
+    date_format = last_date = None
+    rows_read = imported = duplicates = skipped = 0
+    started = time.perf_counter()
+    with ledger.segment_writer() as writer:
+        for batch in reader:
+            rows_read += batch.num_rows
+            amounts = _parse_amounts(batch.column(amount_column))
+            valid = pc.is_valid(amounts)
+            if only_outgoing:
+                valid = pc.and_(valid, pc.less(amounts, 0))
+            names = (pc.utf8_trim_whitespace(pc.cast(batch.column(name_column), pa.string()))
+                     if name_column else pa.nulls(batch.num_rows, pa.string()))
+            names = pc.if_else(pc.equal(names, ''), pa.scalar(None, pa.string()), names)
+            if date_column and date_format is None:
+                date_format = _detect_date_format(pc.cast(batch.column(date_column), pa.string()))
+            dates = (_fill_dates(_parse_dates(batch.column(date_column), date_format), last_date)
+                     if date_column else pa.nulls(batch.num_rows, pa.timestamp('ms')))
+            if dates.null_count < len(dates):
+                last_date = dates[len(dates) - 1].as_py()
+            chunk = pa.table({
+                'name': pc.fill_null(names, 'Imported'),
+                'amount': pc.abs(amounts),
+                'date': pc.fill_null(dates, pa.scalar(imported_at, pa.timestamp('ms'))),
+            }, schema=SCHEMA)
+            valid = pc.fill_null(valid, False)
+            chunk = chunk.filter(valid)
+            undated = pc.is_null(dates).filter(valid).to_numpy(zero_copy_only=False)
+            skipped += batch.num_rows - chunk.num_rows
+
+            rows = chunk.num_rows
+            if reference_column:
+                reference = pc.utf8_trim_whitespace(pc.cast(batch.column(reference_column), pa.string())).filter(valid)
+                reference = _text_hashes(pc.if_else(pc.equal(reference, ''), pa.scalar(None, pa.string()), reference))
+                # A repeated id is the same transaction listed twice; rows without an id are never repeats
+                repeated = ~(references.new_rows(reference) | (reference == 0))
+                chunk, undated = chunk.filter(pa.array(~repeated)), undated[~repeated]
+            keep = np.empty(chunk.num_rows, bool)
+            keep[~undated] = in_ledger.new_rows(_row_hashes(chunk.filter(pa.array(~undated))))
+            keep[undated] = in_ledger_undated.new_rows(_row_hashes(chunk.filter(pa.array(undated)), dated=False))
+            chunk = chunk.filter(pa.array(keep))
+            duplicates += rows - chunk.num_rows
+            if chunk.num_rows:
+                writer.write_table(chunk)
+                imported += chunk.num_rows
+            if progress is not None:
+                progress(rows_read, time.perf_counter() - started)
+
+    seconds = time.perf_counter() - started
+    return {
+        'rows_read': rows_read,
+        'imported': imported,
+        'duplicates': duplicates,
+        'skipped': skipped,
+        'seconds': seconds,
+        'rate': rows_read / seconds if seconds else 0.0,
+    }
+
+
+def render_statement_import(ledger, translations=None, key='statement_import', notify=st.success):
+    # Upload widget; the import runs as a background job with a progress bar that follows the CSV reader
+    translations = translations or {}
+
+    def label(name):
+        return translations.get(name, DEFAULT_LABELS[name])
+
+    with st.expander(label('import_statement')):
+        job = current_job(key)
+        uploaded = st.file_uploader(label('import_statement'), type=['csv'], key=f'{key}_file',
+                                    label_visibility='collapsed')
+        only_outgoing = st.checkbox(label('only_outgoing'), key=f'{key}_outgoing')
+        running = job is not None and not job.done()
+        if uploaded is not None and st.button(label('import_button'), key=f'{key}_button', disabled=running):
+            total_bytes = uploaded.size or 1
+
+            def run_import(job):
+                def progress(rows, seconds):
+                    job.report(min(1.0, uploaded.tell() / total_bytes), (rows, rows / seconds if seconds else 0))
+                return import_statement(uploaded, ledger, only_outgoing=only_outgoing, progress=progress)
+
+            # Every click is its own import; reruns while it runs pick it up again through the slot
+            job = submit_job(key, ('statement_import', uploaded.file_id, only_outgoing, time.time_ns()), run_import)
+        if job is None:
+            return
+        if not job.done():
+            def show_progress(job, previous):
+                rows, rate = job.partial or (0, 0)
+                st.progress(job.progress, text=label('import_progress').format(rows=rows, rate=rate))
+
+            show_job(job, lambda result: st.rerun(), show_progress)
+            return
+        clear_job(key)
+        if job.failed():
+            st.error(str(job.future.exception()))
+        elif job.result() is not None:
+            notify(label('import_done').format(**job.result()))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Import a CSV bank or mobile-money statement into the expense ledger.')
+    parser.add_argument('statement', help='path to the CSV file')
+    parser.add_argument('--user', default='default', help='user whose expenses receive the import (store in FINANCE_DB)')
+    parser.add_argument('--only-outgoing', action='store_true', help='treat only negative amounts as expenses')
+    args = parser.parse_args()
+
+    ledger = LedgerStore(DB_PATH).ledger(args.user)
+    with open(args.statement, 'rb') as f:
+        result = import_statement(
+            f, ledger, only_outgoing=args.only_outgoing,
+            progress=lambda rows, seconds: print(f'\r{rows:,} rows read', end='', flush=True))
+    print()
+    print(DEFAULT_LABELS['import_done'].format(**result))
@@ -0,0 +1,162 @@
+import json
+import os
+import threading
+from bisect import bisect_right
+
+import numpy as np
+import streamlit as st
+
+from translation_catalog import DEFAULT_LANGUAGE, get_catalog
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+# Later files override earlier ones for the same goal and tier
+SUGGESTION_FILES = [os.path.join(BASE_DIR, 'financial_suggestions.json'), os.path.join(BASE_DIR, 'suggestions.json')]
+EMERGENCY_TIPS_FILE = os.path.join(BASE_DIR, 'emergency_tips.json')
+
+TIERS = ('low_balance', 'medium_balance', 'high_balance')
+
+# Upper bounds (GHS) of the low and medium tiers; a goal entry may override them with "thresholds": [low, medium]
+DEFAULT_THRESHOLDS = {
+    'Emergency Fund': (1000, 5000),
+    'Home Purchase': (5000, 20000),
+    'Retirement': (5000, 50000),
+    'Debt Repayment': (500, 2000),
+}
+FALLBACK_THRESHOLDS = (1000, 5000)
+
+
+def goal_key(goal):
+    # 'Home Purchase' -> 'home_purchase', the key used for goal labels in translations.json
+    return goal.strip().lower().replace(' ', '_')
+
+
+class SuggestionRules:
+    """Goal advice compiled from the suggestion files into per-language lookup tables.
+
+    Every goal gets one row of tier thresholds and, per language, one row of
+    translated tier messages. Advice for one user is a bisect on that row;
+    arrays of balances are classified with one np.searchsorted per distinct
+    goal. The tables are rebuilt only when one of the JSON files, or
+    translations.json, changes on disk.
+
+    Translations use the keys <goal_key>_<tier> (e.g. home_purchase_low_balance)
+    and emergency_tip_<tier>; the English text from the JSON files is the fallback.
+    """
+
+    def __init__(self, suggestion_files=SUGGESTION_FILES, tips_file=EMERGENCY_TIPS_FILE):
+        self.suggestion_files = list(suggestion_files)
+        self.tips_file = tips_file
+        self.goals = []
+        self.thresholds = np.empty((0, len(TIERS) - 1))
+        self.messages = {}
+        self.tips = {}
+        self._rows = {}
+        self._stamp = None
+        self._catalog = None
+        self._lock = threading.Lock()
+
+    def _current_stamp(self):
+        if self._catalog is None:
+            self._catalog = get_catalog()
+        catalog = self._catalog
+        try:
+            catalog.refresh()
+        except FileNotFoundError:
+            pass
+        files = self.suggestion_files + [self.tips_file]
+        return tuple(os.stat(path).st_mtime_ns for path in files) + (catalog.mtime,)
+
+    def _compile(self, stamp):
+        rules = {}
+        for path in self.suggestion_files:
+            with open(path, encoding='utf-8') as f:
+                for goal, entry in json.load(f).items():
+                    rules.setdefault(goal, {}).update(entry)
+        with open(self.tips_file, encoding='utf-8') as f:
+            tips = {tier: entry['tip'] for tier, entry in json.load(f).items()}
+
+        goals = list(rules)
+        keys = [goal_key(goal) for goal in goals]
+        thresholds = np.array([sorted(rules[goal].get('thresholds', DEFAULT_THRESHOLDS.get(goal, FALLBACK_THRESHOLDS)))
+                               for goal in goals], dtype=np.float64).reshape(len(goals), len(TIERS) - 1)
+        # English straight from the JSON files is always available, even without translations.json
+        languages = {DEFAULT_LANGUAGE: {}, **self._catalog.languages}
+        messages, tip_rows = {}, {}
+        rows = {goal: row for row, goal in enumerate(goals)}
+        for language, translations in languages.items():
+            messages[language] = np.array([[translations.get(f'{key}_{tier}', rules[goal].get(tier, ''))
+                                            for tier in TIERS] for goal, key in zip(goals, keys)],
+                                          dtype=object).reshape(len(goals), len(TIERS))
+            tip_rows[language] = [translations.get(f'emergency_tip_{tier}', tips.get(tier, '')) for tier in TIERS]
+            # Goal labels as shown in any language map back to the goal
+            for row, key in enumerate(keys):
+                rows.setdefault(translations.get(key, goals[row]), row)
+
+        self.goals, self.thresholds, self.messages, self.tips = goals, thresholds, messages, tip_rows
+        self._rows = rows
+        self._stamp = stamp
+
+    def refresh(self):
+        stamp = self._current_stamp()
+        if stamp != self._stamp:
+            with self._lock:
+                if stamp != self._stamp:
+                    self._compile(stamp)
+
+    def resolve_goal(self, label):
+        # Canonical goal for a selectbox label in any language, or None
+        self.refresh()
+        row = self._rows.get(label)
+        return None if row is None else self.goals[row]
+
+    def advice(self, goal, balance, language=DEFAULT_LANGUAGE):
+        """(suggestion, emergency tip or None) for one user; goal may be a label in any language."""
+        self.refresh()
+        row = self._rows.get(goal)
+        if row is None:
+            return None, None
+        tier = bisect_right(self.thresholds[row].tolist(), balance)
+        language = language if language in self.messages else DEFAULT_LANGUAGE
+        tip = self.tips[language][tier] if self.goals[row] == 'Emergency Fund' else None
+        return self.messages[language][row, tier], tip
+
+    def _goal_rows(self, goals, shape):
+        # Row of every entry of goals (one label or an array of labels), -1 for unknown goals
+        if np.ndim(goals) == 0:
+            return np.full(shape, self._rows.get(goals, -1), dtype=np.int64)
+        import pandas as pd  # only needed for bulk classification, not for one user's advice
+        codes, labels = pd.factorize(np.asarray(goals).ravel())
+        lookup = np.array([self._rows.get(label, -1) for label in labels] + [-1], dtype=np.int64)
+        return lookup[codes].reshape(shape)
+
+    def _classify(self, balances, goals):
+        self.refresh()
+        balances = np.asarray(balances, dtype=np.float64)
+        rows = self._goal_rows(goals, balances.shape)
+        # Number of thresholds at or below the balance, the same answer bisect_right gives
+        tiers = (self.thresholds[rows] <= balances[..., None]).sum(axis=-1)
+        tiers[rows < 0] = -1
+        return rows, tiers
+
+    def classify(self, balances, goals):
+        """Tier index (into TIERS) of every balance, -1 where the goal is unknown.
+
+        goals is one label for all rows or an array of labels; labels are
+        factorized once and every row is compared against its goal's
+        thresholds in a single array operation.
+        """
+        return self._classify(balances, goals)[1]
+
+    def suggestions(self, balances, goals, language=DEFAULT_LANGUAGE):
+        # Advice text for many users at once; rows with an unknown goal get None
+        rows, tiers = self._classify(balances, goals)
+        messages = self.messages.get(language, self.messages[DEFAULT_LANGUAGE])
+        out = np.full(tiers.shape, None, dtype=object)
+        known = tiers >= 0
+        out[known] = messages[rows[known], tiers[known]]
+        return out
+
+
+@st.cache_resource
+def get_suggestion_rules():
+    return SuggestionRules()
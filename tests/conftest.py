@@ -0,0 +1,16 @@
+import os
+import sys
+
+import pytest
+
+# The app's modules live at the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def store(tmp_path):
+    from ledger_store import LedgerStore
+    from memory_budget import MemoryBudget
+    store = LedgerStore(str(tmp_path / 'finance.db'), memory=MemoryBudget(idle_seconds=3600))
+    yield store
+    store.flush()
@@ -0,0 +1,117 @@
+import threading
+from datetime import datetime
+
+DAY_MS = 86_400_000
+
+
+def test_append_through_forgotten_ledger_is_counted_once(store):
+    stale = store.ledger('u')
+    stale.append('Food', 100, datetime(2025, 1, 1))
+    store.flush()
+    assert stale.aggregates.count == 1
+
+    store.memory.evict(stale)
+    fresh = store.ledger('u')
+    assert fresh is not stale
+    assert fresh.aggregates.count == 1
+
+    # A fragment rerun of a session still holding the forgotten ledger
+    stale.append('Food', 50, datetime(2025, 1, 2))
+    store.flush()
+    for ledger in (stale, fresh, store.ledger('u')):
+        assert len(ledger) == 2
+        assert ledger.aggregates.count == 2
+        assert ledger.aggregates.total == 150
+
+
+def test_forget_keeps_unwritten_metrics(store):
+    ledger = store.ledger('u')
+    store.save_metrics('u', current_balance=10)
+    assert not store.forget(ledger)
+    store.flush()
+    assert store.forget(ledger)
+    store.save_metrics('u', total_savings=20)
+    store.flush()
+    metrics = store.load_metrics('u')
+    assert (metrics['current_balance'], metrics['total_savings']) == (10, 20)
+
+
+def test_spilled_ledger_reads_cold_rows(store):
+    ledger = store.ledger('u')
+    store.insert([('u', f'n{i % 3}', 1.0, i * DAY_MS) for i in range(1000)])
+    assert len(ledger.table()) == 1000
+    ledger.spill(ledger.nbytes // 4)
+    assert ledger._cold_before is not None
+    assert ledger.table().num_rows == 1000
+    assert ledger.table(0, 10 * DAY_MS).num_rows == 10
+    assert ledger.period_aggregates(0, 500 * DAY_MS).count == 500
+    assert ledger.aggregates.count == 1000
+
+
+def test_spilled_rows_are_paged_and_summed_in_sqlite(store, monkeypatch):
+    import numpy as np
+    from cash_flow import ledger_balance_series
+    from expense_table import query_expenses, query_ledger
+
+    ledger = store.ledger('u')
+    store.insert([('u', f'n{i % 7}', float(i % 13), i * DAY_MS // 3) for i in range(3000)])
+    ledger.append('n1', 5.0, datetime(1970, 1, 2))  # unwritten and dated among the spilled rows
+    full = ledger.table()
+    expected_balances = ledger_balance_series(ledger, 1000.0)
+    ledger.spill(ledger.nbytes // 4)
+    assert ledger._cold_before is not None
+    monkeypatch.setattr(store, 'expense_rows', None)  # none of these may read every spilled row
+
+    for sort_by in ('date', 'name', 'amount'):
+        for page in (0, 3):
+            rows, matching, total = query_ledger(ledger, 'N1', 2.0, None, sort_by, True, page, 25)
+            want, want_matching = query_expenses(full, 'N1', 2.0, None, sort_by, True, page, 25)
+            assert (matching, total) == (want_matching, full.num_rows)
+            assert rows.column(sort_by).to_pylist() == want.column(sort_by).to_pylist()
+
+    balances = ledger_balance_series(ledger, 1000.0)
+    assert np.allclose(balances.to_numpy(), expected_balances.to_numpy())
+
+    table, chunks = ledger.split(cold=lambda max_id, start, end: store.expense_chunks('u', max_id, start, end, 500))
+    chunks = list(chunks)
+    assert max(chunk.num_rows for chunk in chunks) == 500
+    assert table.num_rows + sum(chunk.num_rows for chunk in chunks) == full.num_rows
+
+
+def test_appends_and_evictions_from_many_threads(store):
+    appends, per_thread = 4, 200
+    stop = threading.Event()
+    errors = []
+
+    def append():
+        for i in range(per_thread):
+            store.ledger('u').append('Food', 1, datetime(2025, 1, 1 + i % 28))
+
+    def evict():
+        while not stop.is_set():
+            store.memory.evict(store.ledger('u'))
+
+    def read():
+        last = 0
+        while not stop.is_set():
+            version = store.ledger('u').version
+            if version < last:
+                errors.append((last, version))
+            last = version
+
+    writers = [threading.Thread(target=append) for _ in range(appends)]
+    others = [threading.Thread(target=evict), threading.Thread(target=read)]
+    for thread in writers + others:
+        thread.start()
+    for thread in writers:
+        thread.join()
+    stop.set()
+    for thread in others:
+        thread.join()
+    store.flush()
+
+    ledger = store.ledger('u')
+    assert not errors
+    assert len(ledger) == appends * per_thread
+    assert ledger.aggregates.count == appends * per_thread
+    assert ledger.table().num_rows == appends * per_thread
@@ -0,0 +1,69 @@
+import json
+import os
+import threading
+
+import streamlit as st
+
+# translations.json lives next to the dashboard scripts
+TRANSLATIONS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'translations.json')
+DEFAULT_LANGUAGE = 'en'
+
+# Display names shown in the language selectbox mapped to the keys used in translations.json
+LANGUAGE_CODES = {"English": "en", "Twi": "twi", "Ga": "ga", "Hausa": "hausa"}
+
+
+class TranslationCatalog:
+    """Process-wide translation catalog, rebuilt only when translations.json changes on disk.
+
+    Every language is stored as a flat dict that already contains the English
+    fallback, so a lookup never has to consult more than one dict.
+    """
+
+    def __init__(self, path=TRANSLATIONS_FILE):
+        self.path = path
+        self.mtime = None
+        self.languages = {}
+        self._lock = threading.Lock()
+
+    def _stat_mtime(self):
+        try:
+            return os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def _build(self, mtime):
+        with open(self.path, encoding='utf-8') as f:
+            raw = json.load(f)
+        fallback = raw.get(DEFAULT_LANGUAGE, {})
+        # Merge English underneath every language once, instead of on every lookup
+        self.languages = {code: {**fallback, **entries} for code, entries in raw.items()}
+        self.mtime = mtime
+
+    def refresh(self):
+        # One stat() per call; the JSON is only parsed again when the mtime moves
+        mtime = self._stat_mtime()
+        if mtime is None:
+            raise FileNotFoundError(self.path)
+        if mtime != self.mtime:
+            with self._lock:
+                if mtime != self.mtime:
+                    self._build(mtime)
+
+    def get(self, language):
+        self.refresh()
+        return self.languages.get(language) or self.languages.get(DEFAULT_LANGUAGE, {})
+
+
+@st.cache_resource
+def get_catalog(path=TRANSLATIONS_FILE):
+    return TranslationCatalog(path)
+
+
+# Load translations for a language (English is the fallback for missing keys and languages)
+def load_translations(language):
+    return get_catalog().get(language)
+
+
+# Translate a key with a single dict lookup; unknown keys are shown as-is
+def translate(key, translations):
+    return translations.get(key, key)